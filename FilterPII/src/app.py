@@ -1,9 +1,25 @@
-import json
+import asyncio
 import os
 from typing import List
 
+from commons.clients.async_rabbit_mq import AsyncRabbitMQClient
+from commons.clients.async_redis_storage import AsyncRedisStorage
+from commons.clients.codecs import decode_message
 from commons.clients.rabbit_mq import RabbitMQClient
 from commons.clients.redis_storage import RedisStorage
+from commons.entities.bounding_box_batch import select
+from commons.metrics import REGISTRY, Metrics, start_metrics_server
+from FilterPII.src.confidence import NOISE, PII, ConfidencePolicy
+from FilterPII.src.detectors import DetectorScanner, compile_scanner
+from FilterPII.src.fuzzy import matcher_factory
+from FilterPII.src.lines import LineMatcher, MatcherCache, term_set_digest
+from FilterPII.src.redaction import RedactionConfig, redact_image
+
+# Turn the flags of `_box_mask` into masks of the boxes to keep, of the boxes
+# containing PII and of the boxes to match
+_KEEP = bytes.maketrans(b"\x00\x01\x02", b"\x01\x00\x00")
+_IS_PII = bytes.maketrans(b"\x00\x01\x02", b"\x00\x01\x00")
+_MATCHED = bytes.maketrans(b"\x00\x01\x02", b"\x01\x01\x00")
 
 
 class FilterPIIService:
@@ -13,16 +29,64 @@ class FilterPIIService:
     The FilterPIIService listens to a RabbitMQ queue for incoming messages containing bounding boxes or PII terms,
     processes them, and publishes filtered results to another queue after excluding any bounding boxes containing PII.
 
+    With the "blocking" client (the default), messages are handled one at a
+    time by `_process_message`. With the "asyncio" client,
+    `_process_message_async` handles up to `prefetch_count` messages
+    concurrently on one event loop, each one waiting on Redis and RabbitMQ
+    without blocking the others.
+
+    PII terms are compiled into matchers kept in a bounded LRU cache, keyed by
+    the digest of the term set. A term list can also be registered once, with a
+    message holding a "term_list_id" and its "pii_terms" but no "img_id", and
+    then be referred to by jobs with a "term_list_id" in place of their
+    "pii_terms".
+
+    Built-in detectors (see `FilterPII.src.detectors`) also filter PII
+    recognized by its shape, such as CBUs, card numbers or emails. Jobs enable
+    them with a "detectors" list next to their PII terms, and otherwise use the
+    detectors of the service.
+
+    With a `RedactionConfig`, the original image of a single or streamed image
+    job (kept in Redis by PerformOCR under "<img_id>:image") is also rendered
+    with its PII bounding boxes blacked out, encoded once, and either published
+    to the `REDACTED_QUEUE` or stored under "<img_id>:redacted". The filtered
+    result then describes where to find it under "redacted_image".
+
+    The latency of each stage of a message (decoding, the Redis join, matching,
+    publishing...) is recorded in the "filter_stage_seconds" histogram of
+    `metrics`, and messages are counted in "filter_messages_total" by outcome.
+
     """
 
     FILTER_PII_QUEUE = "filter_pii_queue"
     FILTERED_QUEUE = "filtered_queue"
+    REDACTED_QUEUE = "redacted_queue"
+    IMAGE_TYPE = "image"
+    REDACTED_TYPE = "redacted"
+    STAGE_METRIC = "filter_stage_seconds"
+    MESSAGES_METRIC = "filter_messages_total"
+    LOW_CONFIDENCE_METRIC = "filter_low_confidence_boxes_total"
+    TERM_LIST_TYPE = "term_list"
+    TERM_LIST_DIGEST_TYPE = "term_list_digest"
 
     def __init__(
         self,
         connection_params="localhost",
         redis_host="localhost",
         redis_port=6379,
+        codec="json",
+        redis_ttl=86400,
+        redis_max_connections=None,
+        redis_socket_timeout=None,
+        client="blocking",
+        prefetch_count=None,
+        matcher_cache_size=128,
+        match_mode="exact",
+        max_edit_distance=2,
+        detectors=None,
+        redaction: RedactionConfig = None,
+        confidence: ConfidencePolicy = None,
+        metrics: Metrics = None,
     ):
         """
         Initializes the FilterPIIService with a RabbitMQ client and Redis storage.
@@ -35,45 +99,648 @@ class FilterPIIService:
             The hostname or IP address of the Redis server (default is "localhost").
         redis_port : int, optional
             The port number on which the Redis server is listening (default is 6379).
+        codec : str, optional
+            The codec used to serialize published results and data stored in
+            Redis (default is "json"). Incoming messages are decoded according
+            to their content type, whatever this setting.
+        redis_ttl : int, optional
+            The number of seconds after which an unmatched half of a job
+            expires from Redis (default is 86400).
+        redis_max_connections : int, optional
+            The maximum number of pooled Redis connections (default is None,
+            which means no limit).
+        redis_socket_timeout : float, optional
+            The number of seconds to wait for a Redis reply (default is None,
+            no timeout).
+        client : str, optional
+            The RabbitMQ and Redis clients to use: "blocking" or "asyncio"
+            (default is "blocking").
+        prefetch_count : int, optional
+            The maximum number of unacknowledged messages, which bounds the
+            number of messages handled concurrently by the "asyncio" client
+            (default is None, which means no limit).
+        matcher_cache_size : int, optional
+            The maximum number of compiled PII matchers kept in memory (default
+            is 128).
+        match_mode : str, optional
+            How PII terms are compared with the OCR text: "exact", "normalized"
+            (ignoring case, accents and digits read as letters) or "fuzzy"
+            (normalized, and within a bounded edit distance) (default is
+            "exact"). See `FilterPII.src.fuzzy`.
+        max_edit_distance : int, optional
+            The maximum number of edits between a PII term and the OCR text in
+            the "fuzzy" mode (default is 2).
+        detectors : list of str, optional
+            The built-in detectors run on jobs that do not choose their own,
+            from `FilterPII.src.detectors` (default is None, no detectors).
+        redaction : RedactionConfig, optional
+            How to render the redacted image of each job (default is None, no
+            redacted image).
+        confidence : ConfidencePolicy, optional
+            How to treat bounding boxes the OCR has little confidence in:
+            dropping noise before matching, and treating digits as PII (default
+            is None, every box is matched as usual).
+        metrics : Metrics, optional
+            The registry the service records its metrics in (default is
+            `REGISTRY`, the registry of the process).
+
+        Raises
+        ------
+        ValueError
+            If the client, the match mode or a detector is unknown.
         """
-        self.rabbitmq_client = RabbitMQClient(
-            connection_params, self.FILTER_PII_QUEUE
+        self.client = client
+        self.prefetch_count = prefetch_count
+        self.matchers = MatcherCache(
+            matcher_cache_size, matcher_factory(match_mode, max_edit_distance)
         )
-        self.redis_storage = RedisStorage(host=redis_host, port=redis_port)
+        self.scanner = compile_scanner(detectors or [])
+        self.redaction = redaction
+        self.confidence = confidence
+        self.metrics = metrics or REGISTRY
+
+        if client == "blocking":
+            self.rabbitmq_client = RabbitMQClient(
+                connection_params, self.FILTER_PII_QUEUE, codec=codec
+            )
+            self.redis_storage = RedisStorage(
+                host=redis_host,
+                port=redis_port,
+                codec=codec,
+                ttl=redis_ttl,
+                max_connections=redis_max_connections,
+                socket_timeout=redis_socket_timeout,
+                socket_connect_timeout=redis_socket_timeout,
+            )
+        elif client == "asyncio":
+            self.rabbitmq_client = AsyncRabbitMQClient(
+                connection_params, self.FILTER_PII_QUEUE, codec=codec
+            )
+            self.redis_storage = AsyncRedisStorage(
+                host=redis_host,
+                port=redis_port,
+                codec=codec,
+                ttl=redis_ttl,
+                max_connections=redis_max_connections,
+                socket_timeout=redis_socket_timeout,
+            )
+        else:
+            raise ValueError(f"Unknown client: {client}")
+
+    def _timed(self, stage):
+        """Helper to record the latency of a stage of a message."""
+        return self.metrics.time(self.STAGE_METRIC, stage=stage)
+
+    def _count(self, outcome):
+        """
+        Helper to count a settled message by outcome, "ok", "requeued" or
+        "error".
+        """
+        self.metrics.inc(self.MESSAGES_METRIC, outcome=outcome)
+
+    def _box_mask(
+        self, bounding_boxes, pii_terms, matcher=None, scanner=None
+    ) -> bytearray:
+        """
+        Helper to flag each bounding box, one byte per box, as kept, containing
+        PII or noise (see `FilterPII.src.confidence`). Noise is left out of
+        matching.
+        """
+        matcher = matcher or self.matchers.get(pii_terms)
+        scanner = scanner or self.scanner
+        if self.confidence is None:
+            mask = bytearray(len(bounding_boxes))
+        else:
+            mask = self.confidence.mask(bounding_boxes)
+            self._count_low_confidence(mask)
+        rows, boxes = range(len(bounding_boxes)), bounding_boxes
+        if NOISE in mask:
+            matched = mask.translate(_MATCHED)
+            rows = [index for index, flag in enumerate(matched) if flag]
+            boxes = select(bounding_boxes, matched)
+        for index in matcher.find(boxes) | scanner.find(boxes):
+            mask[rows[index]] = PII
+        return mask
+
+    def _count_low_confidence(self, mask):
+        """
+        Helper to count the boxes dropped as noise and the digits redacted by
+        the confidence policy.
+        """
+        for action, flag in (("dropped", NOISE), ("redacted", PII)):
+            count = mask.count(flag)
+            if count:
+                self.metrics.inc(
+                    self.LOW_CONFIDENCE_METRIC, count, action=action
+                )
 
     def _filter_bounding_boxes(
-        self, bounding_boxes, pii_terms: List[str]
+        self,
+        bounding_boxes,
+        pii_terms: List[str],
+        matcher: LineMatcher = None,
+        scanner: DetectorScanner = None,
     ) -> dict:
         """
         Filters bounding boxes to exclude those that contain PII terms.
 
-        This method iterates over bounding boxes and excludes any that contain the specified PII terms in the text.
+        The PII terms are compiled into a multi-pattern matcher (cached per
+        term set) that scans each text line once, rebuilt from the line indices
+        of the bounding boxes. A term matching across several consecutive
+        words, such as a full name, excludes every bounding box it covers. The
+        service's match mode selects how terms are compared with the text. The
+        enabled detectors scan the same lines for PII that is not among the
+        terms, such as card numbers or emails. With a confidence policy, noise
+        boxes are dropped before matching and low-confidence digits are
+        excluded as PII.
 
         Parameters
         ----------
-        bounding_boxes : list of dict
-            A list of bounding box dictionaries, each containing details like text and coordinates.
+        bounding_boxes : list of dict or BoundingBoxBatch
+            A list of bounding box dictionaries, each containing details like
+            text and coordinates, or a batch.
         pii_terms : list of str
             A list of PII terms to filter out from the bounding boxes.
+        matcher : LineMatcher, optional
+            The compiled matcher to use instead of `pii_terms` (default is
+            None).
+        scanner : DetectorScanner, optional
+            The detectors to run (default is None, the detectors of the
+            service).
+
+        Returns
+        -------
+        list of dict or BoundingBoxBatch
+            The bounding boxes excluding any that contain PII terms, as a batch
+            if they were given as one.
+        """
+        mask = self._box_mask(bounding_boxes, pii_terms, matcher, scanner)
+        return select(bounding_boxes, mask.translate(_KEEP))
+
+    def _is_registration(self, message):
+        """Helper to tell term list registrations from job messages."""
+        return "img_id" not in message and "term_list_id" in message
+
+    def _registration(self, message):
+        """
+        Builds the Redis entries of a term list registration, and compiles its
+        matcher.
+
+        Parameters
+        ----------
+        message : dict
+            The registration, with the "term_list_id" and its "pii_terms".
 
         Returns
         -------
-        list of dict
-            A filtered list of bounding boxes excluding any that contain PII terms.
+        list of tuple
+            The (key, data type, data) entries to store, without expiry.
         """
+        term_list_id, pii_terms = message["term_list_id"], message["pii_terms"]
+        self.matchers.get(pii_terms)
+        print(f"Registered term list {term_list_id}")
         return [
-            box
-            for box in bounding_boxes
-            if not any(pii in box["text"] for pii in pii_terms)
+            (term_list_id, self.TERM_LIST_TYPE, pii_terms),
+            (
+                term_list_id,
+                self.TERM_LIST_DIGEST_TYPE,
+                term_set_digest(pii_terms),
+            ),
         ]
 
+    def _term_list_id(self, pii_terms):
+        """
+        Helper to return the ID of a registered term list referred to by a job,
+        or None for inline terms.
+        """
+        if isinstance(pii_terms, dict):
+            return pii_terms.get("term_list_id")
+        return None
+
+    def _inline_terms(self, pii_terms):
+        """Helper to return the PII terms sent with a job."""
+        if isinstance(pii_terms, dict):
+            return pii_terms.get("pii_terms", [])
+        return pii_terms
+
+    def _pii_scanner(self, pii_terms):
+        """
+        Helper to return the scanner of the detectors a job enables, or of the
+        service's when it sets none.
+        """
+        if isinstance(pii_terms, dict) and "detectors" in pii_terms:
+            return compile_scanner(pii_terms["detectors"])
+        return self.scanner
+
+    def _pii_matcher(self, pii_terms):
+        """
+        Returns the compiled matcher of the PII terms of a job.
+
+        Registered term lists are looked up by the digest of their current
+        terms (a small Redis read), and their terms are only read and compiled
+        when the matcher is not cached.
+
+        Parameters
+        ----------
+        pii_terms : list of str or dict
+            The PII terms of the job, or a reference to a registered term list
+            ({"term_list_id": ...}).
+
+        Returns
+        -------
+        LineMatcher
+            The compiled matcher.
+
+        Raises
+        ------
+        KeyError
+            If the term list is not registered.
+        """
+        term_list_id = self._term_list_id(pii_terms)
+        if term_list_id is None:
+            return self.matchers.get(self._inline_terms(pii_terms))
+
+        digest = self.redis_storage.retrieve(
+            term_list_id, self.TERM_LIST_DIGEST_TYPE
+        )
+        matcher = digest and self.matchers.get_by_digest(digest)
+        if matcher:
+            return matcher
+        terms = self.redis_storage.retrieve(term_list_id, self.TERM_LIST_TYPE)
+        if terms is None:
+            raise KeyError(f"Unknown term list: {term_list_id}")
+        return self.matchers.get(terms)
+
+    async def _pii_matcher_async(self, pii_terms):
+        """
+        The asyncio counterpart of `_pii_matcher`. Matchers are compiled in a
+        thread, so the event loop keeps serving other messages meanwhile.
+        """
+        term_list_id = self._term_list_id(pii_terms)
+        if term_list_id is None:
+            return await asyncio.to_thread(
+                self.matchers.get, self._inline_terms(pii_terms)
+            )
+
+        digest = await self.redis_storage.retrieve(
+            term_list_id, self.TERM_LIST_DIGEST_TYPE
+        )
+        matcher = digest and self.matchers.get_by_digest(digest)
+        if matcher:
+            return matcher
+        terms = await self.redis_storage.retrieve(
+            term_list_id, self.TERM_LIST_TYPE
+        )
+        if terms is None:
+            raise KeyError(f"Unknown term list: {term_list_id}")
+        return await asyncio.to_thread(self.matchers.get, terms)
+
+    def _message_data(self, message, data_type):
+        """
+        Helper to read a half of a job from a message.
+
+        The PII half is the list of PII terms, unless the job refers to a
+        registered term list or chooses its detectors. It is then a dict with
+        the "pii_terms" or the "term_list_id", and the "detectors". The
+        bounding boxes of a chunk of a streamed image are marked as such, to be
+        told from the pages of a document once joined.
+        """
+        if data_type == "bounding_boxes" and "chunk" in message:
+            return {
+                "bounding_boxes": message["bounding_boxes"],
+                "chunked": True,
+            }
+        if data_type != "pii_terms" or (
+            "pii_terms" in message and "detectors" not in message
+        ):
+            return message[data_type]
+        rules = (
+            {"detectors": message["detectors"]}
+            if "detectors" in message
+            else {}
+        )
+        if "pii_terms" in message:
+            rules["pii_terms"] = message["pii_terms"]
+        elif "term_list_id" in message:
+            rules["term_list_id"] = message["term_list_id"]
+        return rules
+
+    def _message_halves(self, message):
+        """
+        Infers which half of a job a message carries, based on its keys.
+
+        Parameters
+        ----------
+        message : dict
+            The decoded message.
+
+        Returns
+        -------
+        tuple of (str, str) or None
+            The data type of the message and the data type of the other half,
+            or None for unknown messages.
+        """
+        if "bounding_boxes" in message:
+            return "bounding_boxes", "pii_terms"
+        if message.keys() & {"pii_terms", "term_list_id", "detectors"}:
+            return "pii_terms", "bounding_boxes"
+        return None
+
+    def _filter_halves(self, halves, matcher=None):
+        """
+        Filters the bounding boxes of a job with its PII terms and detectors.
+
+        Parameters
+        ----------
+        halves : dict
+            The "bounding_boxes" and "pii_terms" of the job.
+        matcher : LineMatcher, optional
+            The compiled matcher of the PII terms, required when they refer to
+            a registered term list (default is None).
+
+        Returns
+        -------
+        dict
+            The "filtered_boxes", and with redaction the "pii_boxes" to black
+            out.
+        """
+        bounding_boxes = halves["bounding_boxes"]
+        mask = self._box_mask(
+            bounding_boxes,
+            halves["pii_terms"],
+            matcher,
+            self._pii_scanner(halves["pii_terms"]),
+        )
+        filtered = {
+            "filtered_boxes": select(bounding_boxes, mask.translate(_KEEP))
+        }
+        if self.redaction is not None:
+            filtered["pii_boxes"] = select(
+                bounding_boxes, mask.translate(_IS_PII)
+            )
+        return filtered
+
+    def _assemble_chunks(self, chunks):
+        """
+        Merges the filtered chunks of a streamed image once every chunk is
+        filtered.
+
+        Parameters
+        ----------
+        chunks : dict
+            The result of `_filter_halves` for every chunk, by index (see
+            `RedisStorage.collect_part`).
+
+        Returns
+        -------
+        dict
+            The result of `_filter_halves` for the whole image, with the boxes
+            of every chunk in order.
+        """
+        return {
+            key: [
+                box for chunk in sorted(chunks) for box in chunks[chunk][key]
+            ]
+            for key in chunks[min(chunks)]
+        }
+
+    def _build_result(self, img_id, filtered, page=None, page_count=None):
+        """
+        Builds the filtered result of a job once both of its halves are
+        available and filtered.
+
+        Parameters
+        ----------
+        img_id : str
+            The ID of the image.
+        filtered : dict
+            The result of `_filter_halves`.
+        page : int, optional
+            The index of the page the bounding boxes belong to, for multi-page
+            documents (default is None).
+        page_count : int, optional
+            The number of pages of the document (default is None, a single
+            image).
+
+        Returns
+        -------
+        dict
+            The payload to publish to the `FILTERED_QUEUE`.
+        """
+        payload = {
+            "img_id": img_id,
+            "filtered_boxes": filtered["filtered_boxes"],
+        }
+        if page_count and page_count > 1:
+            payload["page"] = page
+            payload["page_count"] = page_count
+        return payload
+
+    def _redacts(self, count, chunked):
+        """
+        Helper to tell whether a filtered part gets a redacted image: single
+        and streamed images do, pages do not.
+        """
+        return self.redaction is not None and (chunked or count == 1)
+
+    def _redacted_info(self, img_id):
+        """
+        Helper to describe where the redacted image of a job was sent, for the
+        filtered result.
+        """
+        if self.redaction.output == "redis":
+            return {
+                "content_type": self.redaction.content_type,
+                "key": f"{img_id}:{self.REDACTED_TYPE}",
+            }
+        return {
+            "content_type": self.redaction.content_type,
+            "queue": self.REDACTED_QUEUE,
+        }
+
+    def _redact(self, img_id, pii_boxes):
+        """
+        Renders, encodes and sends the redacted image of a job.
+
+        The original image is taken out of Redis, so it is decoded once, here,
+        and not kept any longer than needed. Failures are printed rather than
+        raised: the filtered result is published without a redacted image.
+
+        Parameters
+        ----------
+        img_id : str
+            The ID of the image.
+        pii_boxes : list of dict
+            The bounding boxes to black out.
+
+        Returns
+        -------
+        dict or None
+            Where the redacted image was sent (see `_redacted_info`), or None
+            if it could not be rendered.
+        """
+        try:
+            image_data = self.redis_storage.retrieve_bytes(
+                img_id, self.IMAGE_TYPE, delete=True
+            )
+            if image_data is None:
+                print(f"No original image for img_id {img_id}, not redacting")
+                return None
+            redacted = redact_image(image_data, pii_boxes, self.redaction)
+            if self.redaction.output == "redis":
+                self.redis_storage.store_bytes(
+                    img_id, self.REDACTED_TYPE, redacted
+                )
+            else:
+                self.rabbitmq_client.publish_bytes(
+                    self.REDACTED_QUEUE,
+                    redacted,
+                    headers={"img_id": img_id},
+                    content_type=self.redaction.content_type,
+                )
+        except Exception as e:
+            print(f"Error redacting img_id {img_id}: {e}")
+            return None
+        return self._redacted_info(img_id)
+
+    async def _redact_async(self, img_id, pii_boxes):
+        """
+        The asyncio counterpart of `_redact`. The image is rendered in a
+        thread, so the event loop keeps serving other messages meanwhile.
+        """
+        try:
+            image_data = await self.redis_storage.retrieve_bytes(
+                img_id, self.IMAGE_TYPE, delete=True
+            )
+            if image_data is None:
+                print(f"No original image for img_id {img_id}, not redacting")
+                return None
+            redacted = await asyncio.to_thread(
+                redact_image, image_data, pii_boxes, self.redaction
+            )
+            if self.redaction.output == "redis":
+                await self.redis_storage.store_bytes(
+                    img_id, self.REDACTED_TYPE, redacted
+                )
+            else:
+                await self.rabbitmq_client.publish_bytes(
+                    self.REDACTED_QUEUE,
+                    redacted,
+                    headers={"img_id": img_id},
+                    content_type=self.redaction.content_type,
+                )
+        except Exception as e:
+            print(f"Error redacting img_id {img_id}: {e}")
+            return None
+        return self._redacted_info(img_id)
+
+    def _join_call(self, img_id, message, data_type, other_type):
+        """
+        Builds the Redis join of a message.
+
+        Bounding boxes are joined as parts of the job, one per page or chunk (a
+        single image is page 0 of 1), and PII terms as the half shared by every
+        part. See `RedisStorage.join_part` and `RedisStorage.join_shared`.
+
+        Parameters
+        ----------
+        img_id : str
+            The ID of the image.
+        message : dict
+            The decoded message.
+        data_type : str
+            The type of data carried by the message.
+        other_type : str
+            The type of the other half of the job.
+
+        Returns
+        -------
+        tuple of (callable, tuple)
+            The storage method to call (a coroutine function with the "asyncio"
+            client) and its arguments.
+        """
+        if data_type == "bounding_boxes":
+            return self.redis_storage.join_part, (
+                img_id,
+                data_type,
+                message.get("chunk", message.get("page", 0)),
+                self._message_data(message, data_type),
+                message.get("chunk_count", message.get("page_count", 1)),
+                other_type,
+            )
+        return self.redis_storage.join_shared, (
+            img_id,
+            data_type,
+            self._message_data(message, data_type),
+            other_type,
+        )
+
+    def _joined_parts(self, message, data_type, other_type, joined):
+        """
+        Lists the parts (pages or chunks) completed by the Redis join of a
+        message.
+
+        Parameters
+        ----------
+        message : dict
+            The decoded message.
+        data_type : str
+            The type of data carried by the message.
+        other_type : str
+            The type of the other half of the job.
+        joined : any
+            The reply of the join called with `_join_call`.
+
+        Returns
+        -------
+        list of tuple
+            The index, the part count, whether the part is a chunk of a
+            streamed image rather than a page, and the halves
+            ({"bounding_boxes": ..., "pii_terms": ...}) of every part that can
+            be filtered.
+        """
+        if data_type == "bounding_boxes":
+            if joined is None:
+                return []
+            count = message.get("chunk_count", message.get("page_count", 1))
+            others = {message.get("chunk", message.get("page", 0)): joined}
+        else:
+            others, count = joined
+
+        data = self._message_data(message, data_type)
+        parts = []
+        for part, other in sorted(others.items()):
+            halves = {data_type: data, other_type: other}
+            boxes = halves["bounding_boxes"]
+            chunked = isinstance(boxes, dict) and boxes.get("chunked", False)
+            if chunked:
+                halves["bounding_boxes"] = boxes["bounding_boxes"]
+            parts.append((part, count, chunked, halves))
+        return parts
+
     def _process_message(self, ch, method, properties, body):
         """
         Processes incoming messages from the RabbitMQ queue.
 
-        The method determines if the message contains bounding boxes or PII terms, stores them in Redis, and
-        once both are available, filters the bounding boxes to exclude those containing PII terms. The filtered
-        bounding boxes are then published to another RabbitMQ queue.
+        The method determines if the message contains bounding boxes or PII
+        terms and joins it in Redis with the other half of the job: the first
+        half to arrive is stored, and the second one atomically takes it out of
+        Redis, so exactly one replica sees both. That replica filters the
+        bounding boxes to exclude those containing PII terms and publishes the
+        filtered bounding boxes to another RabbitMQ queue.
+
+        Bounding boxes of multi-page documents come one message per page, with
+        "page" and "page_count" keys. The PII terms of the document apply to
+        every page, and each page is filtered and published on its own, with
+        its page index, as soon as both its bounding boxes and the PII terms
+        are available. Streamed images come one message per chunk, with "chunk"
+        and "chunk_count" keys, and are joined the same way. Each chunk is
+        filtered as soon as it is joined, and the replica that filters the last
+        one publishes the filtered bounding boxes of the whole image.
+
+        The term list a job refers to is looked up before the join, and the
+        message is requeued when it is not registered (yet), leaving the other
+        half of the job in Redis.
 
         Parameters
         ----------
@@ -84,79 +751,266 @@ class FilterPIIService:
         properties : object
             The properties of the RabbitMQ message.
         body : bytes
-            The body of the RabbitMQ message, which contains either bounding boxes or PII terms in JSON format.
+            The body of the RabbitMQ message, which contains either bounding
+            boxes or PII terms, serialized with the codec named by its content
+            type (JSON by default).
         """
         try:
-            message = json.loads(body)
+            with self._timed("decode"):
+                message = decode_message(properties, body)
+            if self._is_registration(message):
+                self.redis_storage.store_many(
+                    self._registration(message), expire=False
+                )
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                return
             img_id = message["img_id"]
 
             print(f"Processing message for img_id: {img_id}")
 
-            # Infer the message type based on keys
-            if "bounding_boxes" in message:
-                print(f"Message for img_id {img_id} contains bounding_boxes")
-                self.redis_storage.store(
-                    img_id, "bounding_boxes", message["bounding_boxes"]
+            halves = self._message_halves(message)
+            if halves is None:
+                print(
+                    f"Unknown message type for img_id {img_id}, discarding message."
                 )
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                return
+            data_type, other_type = halves
 
-                # Try to retrieve pii_terms from Redis
-                pii_terms = self.redis_storage.retrieve(img_id, "pii_terms")
-                bounding_boxes = message["bounding_boxes"]
+            print(f"Message for img_id {img_id} contains {data_type}")
 
-            elif "pii_terms" in message:
-                print(f"Message for img_id {img_id} contains pii_terms")
-                self.redis_storage.store(
-                    img_id, "pii_terms", message["pii_terms"]
-                )
+            # Resolve the PII terms before the join takes the other half out of
+            # Redis, so that a job referring to a term list not registered yet
+            # is retried rather than lost
+            matcher = None
+            if data_type == "pii_terms":
+                try:
+                    with self._timed("matcher"):
+                        matcher = self._pii_matcher(
+                            self._message_data(message, data_type)
+                        )
+                except KeyError:
+                    print(
+                        f"Term list of img_id {img_id} is not registered, "
+                        "requeueing the message"
+                    )
+                    ch.basic_nack(
+                        delivery_tag=method.delivery_tag, requeue=True
+                    )
+                    self._count("requeued")
+                    return
+
+            # Store this half of the job, or take the other half if it already
+            # arrived
+            join, args = self._join_call(
+                img_id, message, data_type, other_type
+            )
+            with self._timed("join"):
+                joined = join(*args)
 
-                # Try to retrieve bounding_boxes from Redis
-                bounding_boxes = self.redis_storage.retrieve(
-                    img_id, "bounding_boxes"
+            # Filter every page or chunk for which both bounding_boxes and
+            # pii_terms are available
+            for part, count, chunked, halves in self._joined_parts(
+                message, data_type, other_type, joined
+            ):
+                if data_type == "bounding_boxes":
+                    with self._timed("matcher"):
+                        matcher = self._pii_matcher(halves["pii_terms"])
+                with self._timed("filter"):
+                    filtered = self._filter_halves(halves, matcher)
+                if not chunked:
+                    payload = self._build_result(img_id, filtered, part, count)
+                else:
+                    # The chunk that completes a streamed image publishes the
+                    # whole of it
+                    with self._timed("collect"):
+                        chunks = self.redis_storage.collect_part(
+                            img_id, "filtered_boxes", part, filtered, count
+                        )
+                    if chunks is None:
+                        continue
+                    filtered = self._assemble_chunks(chunks)
+                    payload = self._build_result(img_id, filtered)
+                if self._redacts(count, chunked):
+                    with self._timed("redact"):
+                        redacted = self._redact(img_id, filtered["pii_boxes"])
+                    if redacted is not None:
+                        payload["redacted_image"] = redacted
+                with self._timed("publish"):
+                    self.rabbitmq_client.publish_message(
+                        self.FILTERED_QUEUE, payload
+                    )
+                print(
+                    f"Filtered bounding boxes for img_id {img_id} and sent to filtered_queue"
                 )
-                pii_terms = message["pii_terms"]
 
-            else:
+                print(f"Payload final result: {payload}")
+
+            # Acknowledge the message as successfully processed
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self._count("ok")
+
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self._count("error")
+
+    async def _process_message_async(self, ch, method, properties, body):
+        """
+        Processes incoming messages from the RabbitMQ queue with the asyncio
+        clients.
+
+        This is the asyncio counterpart of `_process_message`, with the same
+        steps and outcome. Redis and RabbitMQ calls are awaited, so other
+        messages are processed while this one waits on I/O. Compiling the
+        matcher, filtering and rendering the redacted image run in threads, so
+        they do not hold up the deliveries of other messages either. They still
+        share the GIL: the asyncio client makes the I/O of messages concurrent,
+        not their filtering, which scales with replicas.
+
+        Parameters
+        ----------
+        ch : object
+            The delivery channel provided by `AsyncRabbitMQClient`.
+        method : object
+            The delivery method of the message.
+        properties : object
+            The properties of the RabbitMQ message.
+        body : bytes
+            The body of the RabbitMQ message, which contains either bounding
+            boxes or PII terms, serialized with the codec named by its content
+            type (JSON by default).
+        """
+        try:
+            with self._timed("decode"):
+                message = decode_message(properties, body)
+            if self._is_registration(message):
+                for entry in self._registration(message):
+                    await self.redis_storage.store(*entry, expire=False)
+                await ch.basic_ack(delivery_tag=method.delivery_tag)
+                return
+            img_id = message["img_id"]
+
+            print(f"Processing message for img_id: {img_id}")
+
+            halves = self._message_halves(message)
+            if halves is None:
                 print(
                     f"Unknown message type for img_id {img_id}, discarding message."
                 )
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+                await ch.basic_ack(delivery_tag=method.delivery_tag)
                 return
+            data_type, other_type = halves
 
-            # If both bounding_boxes and pii_terms are available, proceed with filtering
-            if bounding_boxes and pii_terms:
-                filtered_boxes = self._filter_bounding_boxes(
-                    bounding_boxes, pii_terms
-                )
-                payload = {"img_id": img_id, "filtered_boxes": filtered_boxes}
+            print(f"Message for img_id {img_id} contains {data_type}")
 
-                self.rabbitmq_client.publish_message(
-                    self.FILTERED_QUEUE, payload
-                )
+            matcher = None
+            if data_type == "pii_terms":
+                try:
+                    with self._timed("matcher"):
+                        matcher = await self._pii_matcher_async(
+                            self._message_data(message, data_type)
+                        )
+                except KeyError:
+                    print(
+                        f"Term list of img_id {img_id} is not registered, "
+                        "requeueing the message"
+                    )
+                    await ch.basic_nack(
+                        delivery_tag=method.delivery_tag, requeue=True
+                    )
+                    self._count("requeued")
+                    return
+
+            # Store this half of the job, or take the other half if it already
+            # arrived
+            join, args = self._join_call(
+                img_id, message, data_type, other_type
+            )
+            with self._timed("join"):
+                joined = await join(*args)
+
+            for part, count, chunked, halves in self._joined_parts(
+                message, data_type, other_type, joined
+            ):
+                if data_type == "bounding_boxes":
+                    with self._timed("matcher"):
+                        matcher = await self._pii_matcher_async(
+                            halves["pii_terms"]
+                        )
+                with self._timed("filter"):
+                    filtered = await asyncio.to_thread(
+                        self._filter_halves, halves, matcher
+                    )
+                if not chunked:
+                    payload = self._build_result(img_id, filtered, part, count)
+                else:
+                    with self._timed("collect"):
+                        chunks = await self.redis_storage.collect_part(
+                            img_id, "filtered_boxes", part, filtered, count
+                        )
+                    if chunks is None:
+                        continue
+                    filtered = self._assemble_chunks(chunks)
+                    payload = self._build_result(img_id, filtered)
+                if self._redacts(count, chunked):
+                    with self._timed("redact"):
+                        redacted = await self._redact_async(
+                            img_id, filtered["pii_boxes"]
+                        )
+                    if redacted is not None:
+                        payload["redacted_image"] = redacted
+                with self._timed("publish"):
+                    await self.rabbitmq_client.publish_message(
+                        self.FILTERED_QUEUE, payload
+                    )
                 print(
                     f"Filtered bounding boxes for img_id {img_id} and sent to filtered_queue"
                 )
 
                 print(f"Payload final result: {payload}")
 
-                # Clean up Redis as the job is completed
-                self.redis_storage.delete(img_id)
-
-            # Acknowledge the message as successfully processed
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            await ch.basic_ack(delivery_tag=method.delivery_tag)
+            self._count("ok")
 
         except Exception as e:
             print(f"Error processing message: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            await ch.basic_nack(
+                delivery_tag=method.delivery_tag, requeue=False
+            )
+            self._count("error")
 
     def start(self):
         """
         Start the Filter PII Service to listen for OCR and PII messages.
 
-        This method begins consuming messages from the `FILTER_PII_QUEUE` and processes them
-        using the `_process_message` method.
+        This method begins consuming messages from the `FILTER_PII_QUEUE` and
+        processes them using the `_process_message` method, or
+        `_process_message_async` on an event loop with the "asyncio" client.
+        The statistics of the matcher cache, and the Redis latencies of the
+        "blocking" client, are exported with the metrics.
 
         """
-        self.rabbitmq_client.start(self._process_message)
+        self.metrics.register_collector(
+            "filter_matcher_cache", self.matchers.stats
+        )
+        if self.client == "blocking":
+            self.metrics.register_collector(
+                "filter_redis",
+                self.redis_storage.latency_stats,
+                label="operation",
+            )
+        if self.client == "asyncio":
+            asyncio.run(
+                self.rabbitmq_client.start(
+                    self._process_message_async,
+                    prefetch_count=self.prefetch_count,
+                )
+            )
+            return
+        self.rabbitmq_client.start(
+            self._process_message, prefetch_count=self.prefetch_count
+        )
         print(
             f"Service is running and listening for messages on {self.FILTER_PII_QUEUE}..."
         )
@@ -165,5 +1019,34 @@ class FilterPIIService:
 if __name__ == "__main__":
     connection_params = os.getenv("RABBITMQ_HOST", "rabbitmq")
     redis_host = os.getenv("REDIS_HOST", "redis")
-    filter_pii_service = FilterPIIService(connection_params, redis_host)
+    codec = os.getenv("MESSAGE_CODEC", "json")
+    redis_ttl = int(os.getenv("REDIS_TTL", "86400"))
+    redis_max_connections = os.getenv("REDIS_MAX_CONNECTIONS")
+    redis_socket_timeout = os.getenv("REDIS_SOCKET_TIMEOUT")
+    prefetch_count = os.getenv("FILTER_PREFETCH")
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
+    filter_pii_service = FilterPIIService(
+        connection_params,
+        redis_host,
+        codec=codec,
+        redis_ttl=redis_ttl,
+        redis_max_connections=(
+            int(redis_max_connections) if redis_max_connections else None
+        ),
+        redis_socket_timeout=(
+            float(redis_socket_timeout) if redis_socket_timeout else None
+        ),
+        client=os.getenv("FILTER_CLIENT", "blocking"),
+        prefetch_count=int(prefetch_count) if prefetch_count else None,
+        matcher_cache_size=int(os.getenv("FILTER_MATCHER_CACHE_SIZE", "128")),
+        match_mode=os.getenv("FILTER_MATCH_MODE", "exact"),
+        max_edit_distance=int(os.getenv("FILTER_MAX_EDIT_DISTANCE", "2")),
+        detectors=[
+            d for d in os.getenv("FILTER_DETECTORS", "").split(",") if d
+        ],
+        redaction=RedactionConfig.from_env(),
+        confidence=ConfidencePolicy.from_env(),
+    )
     filter_pii_service.start()
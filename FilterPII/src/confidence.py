@@ -0,0 +1,129 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+# Flags of the mask `ConfidencePolicy.mask` returns, one byte per bounding box:
+# boxes matched as usual, boxes treated as PII and noise boxes dropped before
+# matching
+KEEP, PII, NOISE = 0, 1, 2
+
+# Letters that OCR commonly reads in place of digits, the reverse of
+# `FilterPII.src.fuzzy.CONFUSABLES`
+DIGIT_LOOKALIKES = frozenset("OoIl|SBZ")
+
+
+def looks_like_digits(text: str, min_ratio: float = 0.5) -> bool:
+    """
+    Tells whether a word reads like a number, such as a fragment of an account
+    or document number.
+
+    Parameters
+    ----------
+    text : str
+        The text of the word.
+    min_ratio : float, optional
+        The share of its letters and digits that must be digits, or letters
+        commonly misread for digits (see `DIGIT_LOOKALIKES`) (default is 0.5).
+        At least one must be an actual digit.
+
+    Returns
+    -------
+    bool
+        Whether the word looks like digits.
+    """
+    characters = [c for c in text if c.isalnum() or c in DIGIT_LOOKALIKES]
+    digits = sum(c.isdigit() for c in characters)
+    lookalikes = sum(c in DIGIT_LOOKALIKES for c in characters)
+    return digits > 0 and digits + lookalikes >= min_ratio * len(characters)
+
+
+@dataclass(frozen=True)
+class ConfidencePolicy:
+    """
+    How FilterPII treats bounding boxes by the confidence of the OCR in their
+    text, from 0 to 100.
+
+    min_confidence: boxes below it are noise (e.g. specks read as "i"): they
+        are dropped before matching, so they neither cost matching time nor
+        split the lines PII terms are matched across, and are left out of the
+        filtered boxes.
+    redact_digits_below: boxes below it whose text looks like digits (see
+        `looks_like_digits`) are treated as PII as a precaution, since a
+        misread account number may match no term. None disables it.
+    digit_ratio: the `min_ratio` of `looks_like_digits`.
+
+    Boxes without a confidence, e.g. from an older PerformOCR, are matched as
+    usual.
+    """
+
+    min_confidence: float = 0.0
+    redact_digits_below: Optional[float] = None
+    digit_ratio: float = 0.5
+
+    def __post_init__(self):
+        for name in ("min_confidence", "redact_digits_below"):
+            value = getattr(self, name)
+            if value is not None and not 0 <= value <= 100:
+                raise ValueError(f"{name} must be between 0 and 100")
+        if not 0 <= self.digit_ratio <= 1:
+            raise ValueError("digit_ratio must be between 0 and 1")
+
+    @classmethod
+    def from_env(cls) -> Optional["ConfidencePolicy"]:
+        """
+        Reads the confidence policy from the environment.
+
+        The policy is enabled by `FILTER_MIN_CONFIDENCE`,
+        `FILTER_REDACT_DIGITS_BELOW` or both, and tuned by
+        `FILTER_DIGIT_RATIO`.
+
+        Returns
+        -------
+        ConfidencePolicy or None
+            The policy, or None when neither threshold is set.
+        """
+        min_confidence = os.getenv("FILTER_MIN_CONFIDENCE")
+        redact_digits_below = os.getenv("FILTER_REDACT_DIGITS_BELOW")
+        if not min_confidence and not redact_digits_below:
+            return None
+        return cls(
+            min_confidence=float(min_confidence or cls.min_confidence),
+            redact_digits_below=(
+                float(redact_digits_below) if redact_digits_below else None
+            ),
+            digit_ratio=float(
+                os.getenv("FILTER_DIGIT_RATIO", cls.digit_ratio)
+            ),
+        )
+
+    def mask(self, bounding_boxes) -> bytearray:
+        """
+        Flags the noise and the suspected PII among bounding boxes.
+
+        Parameters
+        ----------
+        bounding_boxes : list of dict or BoundingBoxBatch
+            The bounding boxes, with their confidence under "conf".
+
+        Returns
+        -------
+        bytearray
+            One flag per box: `NOISE` below `min_confidence`, `PII` for digits
+            below `redact_digits_below`, which takes precedence so they are
+            blacked out in the redacted image, and `KEEP` otherwise.
+        """
+        mask = bytearray(len(bounding_boxes))
+        for index, box in enumerate(bounding_boxes):
+            conf = box.get("conf")
+            # Tesseract reports -1 for what it did not recognize as a word
+            if conf is None or conf < 0:
+                continue
+            if (
+                self.redact_digits_below is not None
+                and conf < self.redact_digits_below
+                and looks_like_digits(box["text"], self.digit_ratio)
+            ):
+                mask[index] = PII
+            elif conf < self.min_confidence:
+                mask[index] = NOISE
+        return mask
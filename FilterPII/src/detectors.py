@@ -0,0 +1,252 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+from FilterPII.src.lines import (
+    _boxes_in_span,
+    _offsets,
+    group_lines,
+    normalize_whitespace,
+)
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def _digits(text: str) -> str:
+    return _NON_DIGITS.sub("", text)
+
+
+def _check_digit(digits: str, weights: Tuple[int, ...], modulus: int) -> int:
+    total = sum(int(digit) * weight for digit, weight in zip(digits, weights))
+    return (modulus - total % modulus) % modulus
+
+
+def is_valid_cbu(text: str) -> bool:
+    """
+    Returns whether a CBU or CVU has valid check digits, in its bank/branch
+    block and in its account block.
+    """
+    digits = _digits(text)
+    return (
+        len(digits) == 22
+        and _check_digit(digits[:7], (7, 1, 3, 9, 7, 1, 3), 10)
+        == int(digits[7])
+        and _check_digit(
+            digits[8:21], (3, 9, 7, 1, 3, 9, 7, 1, 3, 9, 7, 1, 3), 10
+        )
+        == int(digits[21])
+    )
+
+
+def is_valid_cuit(text: str) -> bool:
+    """Returns whether a CUIT or CUIL has a valid modulo 11 check digit."""
+    digits = _digits(text)
+    check = _check_digit(digits[:10], (5, 4, 3, 2, 7, 6, 5, 4, 3, 2), 11)
+    return len(digits) == 11 and check < 10 and check == int(digits[10])
+
+
+def is_valid_card(text: str) -> bool:
+    """Returns whether a payment card number passes the Luhn check."""
+    digits = _digits(text)
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        value = int(digit) * (2 if position % 2 else 1)
+        total += value - 9 if value > 9 else value
+    return 13 <= len(digits) <= 19 and total % 10 == 0
+
+
+def is_valid_phone(text: str) -> bool:
+    """
+    Returns whether a number looks like a phone number: 10 to 15 digits, or 8
+    with an international prefix, so that dates and short amounts are not taken
+    for phones.
+    """
+    count = len(_digits(text))
+    return (8 if text.startswith("+") else 10) <= count <= 15
+
+
+@dataclass(frozen=True)
+class Detector:
+    """
+    A class of PII recognized by its shape rather than by a known term.
+
+    Attributes
+    ----------
+    name : str
+        The name jobs enable the detector by.
+    pattern : str
+        The regular expression of candidate matches. It must not contain
+        capturing groups.
+    validator : callable, optional
+        Tells actual PII from candidates that only share its shape, such as
+        numbers with a wrong check digit.
+    """
+
+    name: str
+    pattern: str
+    validator: Optional[Callable[[str], bool]] = None
+
+
+# Built-in detectors, in the order they are tried when several match at the
+# same position
+DETECTORS = {
+    detector.name: detector
+    for detector in (
+        Detector("email", r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"),
+        Detector("cbu", r"(?<!\d)\d{8}[ -]?\d{14}(?!\d)", is_valid_cbu),
+        Detector("card", r"(?<!\d)\d(?:[ -]?\d){12,18}(?!\d)", is_valid_card),
+        Detector(
+            "cuit",
+            r"(?<!\d)(?:20|23|24|27|30|33|34)[ .-]?\d{8}[ .-]?\d(?!\d)",
+            is_valid_cuit,
+        ),
+        Detector(
+            "phone",
+            # Optional country code, mobile prefix and area code, then a
+            # subscriber number such as 4567-8901
+            r"(?<![\w+])(?:\+\d{1,3}[ .-]?)?(?:9[ .-]?)?"
+            r"(?:\(?\d{2,4}\)?[ .-]?)?\d{3,4}[ .-]?\d{4}(?!\d)",
+            is_valid_phone,
+        ),
+    )
+}
+
+
+class DetectorScanner:
+    """
+    Finds the matches of several detectors in one pass.
+
+    The patterns of the detectors are compiled into a single regular
+    expression, one named alternative per detector, so each text line is
+    scanned once however many detectors are enabled. Lines are rebuilt from the
+    bounding boxes like in `LineMatcher`, so a number that OCR split into
+    several words (e.g. a card number printed in groups of four digits) is
+    still found. A candidate rejected by its validator is tried against the
+    detectors that follow it before the scan moves on.
+
+    """
+
+    def __init__(self, detectors: List[Detector]):
+        """
+        Compiles the scanner for a list of detectors.
+
+        Parameters
+        ----------
+        detectors : list of Detector
+            The detectors to run, in order of precedence.
+        """
+        self.detectors = list(detectors)
+        self._regexes = [re.compile(d.pattern) for d in self.detectors]
+        self._combined = (
+            re.compile(
+                "|".join(
+                    f"(?P<d{index}>{detector.pattern})"
+                    for index, detector in enumerate(self.detectors)
+                )
+            )
+            if self.detectors
+            else None
+        )
+
+    def finditer(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """
+        Yields the validated matches of the detectors in a text.
+
+        Parameters
+        ----------
+        text : str
+            The text to scan.
+
+        Yields
+        ------
+        tuple of (str, int, int)
+            The name of the detector and the `(start, end)` offsets of each
+            match.
+        """
+        if self._combined is None:
+            return
+        position = 0
+        while True:
+            match = self._combined.search(text, position)
+            if match is None:
+                return
+            found = self._validate(text, match)
+            if found is None:
+                position = match.start() + 1
+                continue
+            yield found
+            position = max(found[2], found[1] + 1)
+
+    def _validate(self, text, match):
+        start = match.start()
+        for index in range(int(match.lastgroup[1:]), len(self.detectors)):
+            detector = self.detectors[index]
+            candidate = self._regexes[index].match(text, start)
+            if candidate is None:
+                continue
+            if detector.validator is None or detector.validator(
+                candidate.group()
+            ):
+                return detector.name, start, candidate.end()
+        return None
+
+    def find(self, bounding_boxes) -> Set[int]:
+        """
+        Returns the indices of the bounding boxes covered by a detector match.
+
+        Parameters
+        ----------
+        bounding_boxes : list of dict
+            The bounding boxes to scan.
+
+        Returns
+        -------
+        set of int
+            The indices into `bounding_boxes` of every box that is part of a
+            match.
+        """
+        matched = set()
+        if self._combined is None:
+            return matched
+        for line in group_lines(bounding_boxes):
+            texts = [
+                normalize_whitespace(bounding_boxes[i]["text"]) for i in line
+            ]
+            starts, ends = _offsets([texts], separator=1)
+            for _, start, end in self.finditer(" ".join(texts)):
+                matched.update(
+                    line[i] for i in _boxes_in_span(starts, ends, start, end)
+                )
+        return matched
+
+
+@lru_cache(maxsize=128)
+def _compile(names: Tuple[str, ...]) -> DetectorScanner:
+    return DetectorScanner([DETECTORS[name] for name in names])
+
+
+def compile_scanner(names: List[str]) -> DetectorScanner:
+    """
+    Returns a compiled scanner for a list of built-in detectors, reusing a
+    cached one when the same list was seen before.
+
+    Parameters
+    ----------
+    names : list of str
+        The names of the detectors to enable, from `DETECTORS`.
+
+    Returns
+    -------
+    DetectorScanner
+        The scanner, which runs the detectors in the order of `DETECTORS`.
+
+    Raises
+    ------
+    ValueError
+        If a detector is unknown.
+    """
+    unknown = set(names) - DETECTORS.keys()
+    if unknown:
+        raise ValueError(f"Unknown detectors: {', '.join(sorted(unknown))}")
+    return _compile(tuple(name for name in DETECTORS if name in names))
@@ -0,0 +1,366 @@
+import re
+import unicodedata
+from collections import defaultdict
+from functools import partial
+from typing import Callable, List, Set, Tuple
+
+from FilterPII.src.lines import LineMatcher, normalize_whitespace
+
+# Characters that OCR commonly reads in place of one another, folded into the
+# same letter
+CONFUSABLES = str.maketrans(
+    {"0": "o", "1": "l", "|": "l", "2": "z", "5": "s", "8": "b"}
+)
+
+# Length of a term, in letters and digits, that allows one edit in fuzzy
+# matching
+CHARS_PER_EDIT = 5
+
+# Length of the substrings counted to rule out candidate terms before computing
+# their edit distance
+QGRAM = 3
+
+# What `str.isalnum` rejects: `\w` matches the characters it accepts, and the
+# underscore
+_NOT_ALNUM = re.compile(r"[\W_]+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Folds the differences OCR errors commonly introduce into a text: accents
+    and other diacritics, case, compatibility characters (e.g. ligatures) and
+    digits read as letters (see `CONFUSABLES`).
+
+    Parameters
+    ----------
+    text : str
+        The text to normalize.
+
+    Returns
+    -------
+    str
+        The normalized text, with every run of whitespace collapsed into a
+        single space.
+    """
+    if not text.isascii():
+        # ASCII text has neither compatibility characters nor diacritics
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return normalize_whitespace(text.casefold().translate(CONFUSABLES))
+
+
+def _key(text: str) -> str:
+    # The letters and digits of a normalized text, which fuzzy matching
+    # compares
+    return _NOT_ALNUM.sub("", text)
+
+
+def _split_qgrams(key: str) -> List[str]:
+    return [key[i : i + QGRAM] for i in range(len(key) - QGRAM + 1)]
+
+
+def _segments(length: int, distance: int) -> List[Tuple[int, int]]:
+    """
+    Helper to split a term key of `length` characters into `distance + 1`
+    segments, as `(start, size)` pairs, the longer segments last.
+    """
+    count = distance + 1
+    size, longer = divmod(length, count)
+    segments, start = [], 0
+    for index in range(count):
+        segment_size = size + (index >= count - longer)
+        segments.append((start, segment_size))
+        start += segment_size
+    return segments
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    Computes the Levenshtein distance between two strings with Hyyrö's
+    bit-parallel algorithm, which keeps a column of the distance matrix in two
+    integers, one bit per character of `b`, and updates it with a few integer
+    operations per character of `a`.
+
+    Parameters
+    ----------
+    a, b : str
+        The strings to compare.
+
+    Returns
+    -------
+    int
+        The minimum number of insertions, deletions and substitutions turning
+        `a` into `b`.
+    """
+    if not b:
+        return len(a)
+    # Bit i of the mask of a character is set where b[i] is that character
+    masks = {}
+    for i, char in enumerate(b):
+        masks[char] = masks.get(char, 0) | 1 << i
+    full, last = (1 << len(b)) - 1, 1 << (len(b) - 1)
+
+    # The vertical deltas of the column (+1 and -1), and its last cell
+    positive, negative, distance = full, 0, len(b)
+    for char in a:
+        equal = masks.get(char, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        up = negative | ~(horizontal | positive) & full
+        down = positive & horizontal
+        if up & last:
+            distance += 1
+        elif down & last:
+            distance -= 1
+        up = (up << 1 | 1) & full
+        down = down << 1 & full
+        positive = down | ~(vertical | up) & full
+        negative = up & vertical
+    return distance
+
+
+def within_distance(a: str, b: str, max_distance: int) -> bool:
+    """
+    Returns whether the Levenshtein distance between two strings is at most
+    `max_distance` (see `edit_distance`).
+
+    Parameters
+    ----------
+    a, b : str
+        The strings to compare.
+    max_distance : int
+        The maximum number of insertions, deletions and substitutions.
+
+    Returns
+    -------
+    bool
+        True if `a` can be turned into `b` with at most `max_distance` edits.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    return edit_distance(a, b) <= max_distance
+
+
+class NormalizedLineMatcher(LineMatcher):
+    """
+    A `LineMatcher` that compares PII terms and bounding box texts after
+    `normalize_text`, so that "OPERACIÓN", "operacion" and "0peracion" all
+    match the term "Operación".
+
+    """
+
+    def normalize(self, text: str) -> str:
+        return normalize_text(text)
+
+
+class FuzzyLineMatcher(NormalizedLineMatcher):
+    """
+    A `NormalizedLineMatcher` that also matches runs of consecutive words
+    within a bounded edit distance of a PII term, such as "operacién" for
+    "operación".
+
+    Words are compared by their letters and digits only, joined without
+    separators, so a term also matches when OCR split or merged its words or
+    added punctuation. A term allows one edit per `CHARS_PER_EDIT` letters and
+    digits, up to `max_distance`, so short terms, which would match many
+    unrelated words, are only matched exactly.
+
+    Candidate terms are looked up in an index of their segments: a term
+    allowing `k` edits is split into `k + 1` segments, at least one of which
+    any run of words within `k` edits of it contains unchanged, shifted by at
+    most `k` characters (see `_build_probes`). Each run of words is thus looked
+    up with a few dictionary lookups per term length, however many terms there
+    are, and distances are only computed for the terms found.
+
+    """
+
+    def __init__(self, pii_terms: List[str], max_distance: int = 2):
+        """
+        Compiles the exact matchers and the fuzzy index for a list of PII
+        terms.
+
+        Parameters
+        ----------
+        pii_terms : list of str
+            The PII terms to match.
+        max_distance : int, optional
+            The maximum number of edits allowed for the longest terms (default
+            is 2).
+        """
+        super().__init__(pii_terms)
+        self.max_distance = max_distance
+
+        self._keys, self._qgrams = [], []
+        # Equal q-grams of different terms are stored once
+        qgrams = {}
+        # For each term key length, the start, size and index of each segment
+        self._segments = {}
+        self._max_words = self._max_length = 0
+        self._min_length = None
+        for term in dict.fromkeys(self.normalize(t) for t in pii_terms):
+            key = _key(term)
+            distance = min(max_distance, len(key) // CHARS_PER_EDIT)
+            if not distance:
+                continue
+            term_id = len(self._keys)
+            self._keys.append(key)
+            self._qgrams.append(
+                tuple(qgrams.setdefault(q, q) for q in _split_qgrams(key))
+            )
+            if len(key) not in self._segments:
+                self._segments[len(key)] = [
+                    (start, size, defaultdict(list))
+                    for start, size in _segments(len(key), distance)
+                ]
+            for start, size, index in self._segments[len(key)]:
+                index[key[start : start + size]].append(term_id)
+            self._max_words = max(self._max_words, len(term.split()))
+            self._max_length = max(self._max_length, len(key) + distance)
+            self._min_length = min(
+                self._min_length or len(key), len(key) - distance
+            )
+        # For each window length, the slices to look up (see `_build_probes`)
+        self._probes = self._build_probes()
+
+    def _find_in_lines(self, lines: List[List[str]]) -> Set[int]:
+        found = super()._find_in_lines(lines)
+        if not self._keys:
+            return found
+
+        position = 0
+        for texts in lines:
+            found.update(position + i for i in self._find_in_line(texts))
+            position += len(texts)
+        return found
+
+    def _find_in_line(self, texts: List[str]) -> Set[int]:
+        """
+        Helper to match the runs of words of a line within the edit distance of
+        a term.
+        """
+        found = set()
+        keys = [_key(text) for text in texts]
+        # A term may be split into one more word than it has
+        for first in range(len(keys)):
+            if not keys[first]:
+                continue
+            window = ""
+            for last in range(
+                first, min(len(keys), first + self._max_words + 1)
+            ):
+                window += keys[last]
+                if len(window) > self._max_length:
+                    break
+                if (
+                    keys[last]
+                    and len(window) >= self._min_length
+                    and self._matches(window)
+                ):
+                    found.update(range(first, last + 1))
+        return found
+
+    def _matches(self, window: str) -> bool:
+        """
+        Helper to tell whether a run of words is within the edit distance of a
+        term.
+
+        Two strings within `k` edits share at least `max(m, n) - QGRAM + 1 - k
+        * QGRAM` of their substrings of `QGRAM` characters, since an edit
+        changes at most `QGRAM` of them. Candidates sharing fewer with the
+        window are ruled out without computing their distance.
+        """
+        qgrams = None
+        for term_id, distance in self._candidates(window):
+            key = self._keys[term_id]
+            if qgrams is None:
+                qgrams = set(_split_qgrams(window))
+            shared = sum(map(qgrams.__contains__, self._qgrams[term_id]))
+            if (
+                shared
+                < max(len(key), len(window)) + 1 - (distance + 1) * QGRAM
+            ):
+                continue
+            if within_distance(window, key, distance):
+                return True
+        return False
+
+    def _candidates(self, window: str):
+        """
+        Helper to yield the terms that may be within their edit distance of a
+        run of words, with that distance.
+        """
+        for start, end, index, distance in self._probes.get(len(window), ()):
+            for term_id in index.get(window[start:end], ()):
+                yield term_id, distance
+
+    def _build_probes(self) -> dict:
+        """
+        Helper to list, for each window length, the slices of a window to look
+        up in the index of each segment.
+
+        A term of length `m` allowing `k` edits is only compared with windows
+        of `m - k` to `m + k` characters. Of its `k + 1` segments, one is
+        unchanged in any window within `k` edits, and if it is the `i`-th one,
+        at most `i` edits come before it and at most `k - i` after it. Its
+        offset in the window thus differs from its offset in the term by at
+        most `i`, and from the difference in length by at most `k - i`.
+        """
+        probes = {}
+        for length in range(self._min_length or 0, self._max_length + 1):
+            for term_length in range(
+                length - self.max_distance, length + self.max_distance + 1
+            ):
+                segments = self._segments.get(term_length, ())
+                distance = len(segments) - 1
+                delta = length - term_length
+                if abs(delta) > distance:
+                    continue
+                for i, (start, size, index) in enumerate(segments):
+                    for shift in range(
+                        max(-i, delta - distance + i),
+                        min(i, delta + distance - i) + 1,
+                    ):
+                        if 0 <= start + shift <= length - size:
+                            probes.setdefault(length, []).append(
+                                (
+                                    start + shift,
+                                    start + shift + size,
+                                    index,
+                                    distance,
+                                )
+                            )
+        return probes
+
+
+def matcher_factory(
+    match_mode: str = "exact", max_distance: int = 2
+) -> Callable[[List[str]], LineMatcher]:
+    """
+    Returns the function compiling the line matcher of a match mode, to be used
+    as a `MatcherCache` factory.
+
+    Parameters
+    ----------
+    match_mode : str, optional
+        "exact" (`LineMatcher`), "normalized" (`NormalizedLineMatcher`) or
+        "fuzzy" (`FuzzyLineMatcher`) (default is "exact").
+    max_distance : int, optional
+        The maximum edit distance of the "fuzzy" mode (default is 2).
+
+    Returns
+    -------
+    callable
+        Compiles the matcher of a list of PII terms.
+
+    Raises
+    ------
+    ValueError
+        If the match mode is unknown.
+    """
+    if match_mode == "exact":
+        return LineMatcher
+    if match_mode == "normalized":
+        return NormalizedLineMatcher
+    if match_mode == "fuzzy":
+        return partial(FuzzyLineMatcher, max_distance=max_distance)
+    raise ValueError(f"Unknown match mode: {match_mode}")
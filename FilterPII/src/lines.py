@@ -0,0 +1,343 @@
+import hashlib
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate, chain
+from operator import add
+from typing import Callable, List, Optional, Set, Tuple
+
+from commons.entities.bounding_box_batch import BoundingBoxBatch
+from FilterPII.src.matcher import compile_matcher
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Joins the texts of all the boxes to normalize them in a single call
+_TEXT_SEPARATOR = "\x00"
+
+LINE_KEYS = ("block_num", "par_num", "line_num")
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapses every run of whitespace into a single space."""
+    return _WHITESPACE.sub(" ", text)
+
+
+def group_lines(bounding_boxes) -> List[List[int]]:
+    """
+    Rebuilds the text lines of an OCR result from Tesseract's
+    block/par/line/word indices.
+
+    Boxes that share the same block, paragraph and line number form a line,
+    ordered by word number. Boxes without line indices (e.g. produced by an
+    older PerformOCR) are treated as lines on their own.
+
+    Parameters
+    ----------
+    bounding_boxes : list of dict or BoundingBoxBatch
+        The bounding boxes of an image, in the order Tesseract emitted them.
+
+    Returns
+    -------
+    list of list of int
+        The indices into `bounding_boxes` of each line, in reading order.
+    """
+    blocks, pars, line_nums, word_nums = _layout(bounding_boxes)
+    lines = {}
+    for index, line_id in enumerate(zip(blocks, pars, line_nums)):
+        if None in line_id:
+            line_id = index
+        lines.setdefault(line_id, []).append(index)
+
+    if None in word_nums:
+        word_nums = [word_num or 0 for word_num in word_nums]
+    for indices in lines.values():
+        if len(indices) > 1:
+            indices.sort(key=word_nums.__getitem__)
+    return list(lines.values())
+
+
+def _layout(bounding_boxes) -> List[list]:
+    """
+    Helper to read the line indices and word numbers of the boxes, one list per
+    field.
+    """
+    keys = LINE_KEYS + ("word_num",)
+    if isinstance(bounding_boxes, BoundingBoxBatch):
+        return [bounding_boxes.values(key) for key in keys]
+    return [[box.get(key) for box in bounding_boxes] for key in keys]
+
+
+def _texts(bounding_boxes) -> List[str]:
+    """
+    Helper to read the texts of the boxes, straight from the column of a batch.
+    """
+    if isinstance(bounding_boxes, BoundingBoxBatch):
+        return bounding_boxes.texts
+    return [box["text"] for box in bounding_boxes]
+
+
+def _boxes_in_span(starts, ends, start, end) -> range:
+    # Boxes overlapping text[start:end], given the sorted offsets of each box
+    # in the line text
+    return range(bisect_right(ends, start), bisect_left(starts, end))
+
+
+class LineMatcher:
+    """
+    Finds PII terms spanning one or more consecutive words of a line.
+
+    The lines of a document are scanned in one pass with two matchers (see
+    `compile_matcher`): one over the words joined by single spaces, which
+    matches phrase terms such as "Jose Antonio Camargo", and one over the words
+    joined without separators, which matches terms that Tesseract split into
+    several words (e.g. long account numbers). The latter only counts matches
+    that start and end on word boundaries, so a term is never matched across
+    arbitrary word fragments.
+
+    """
+
+    def __init__(self, pii_terms: List[str]):
+        """
+        Compiles the matchers for a list of PII terms.
+
+        Parameters
+        ----------
+        pii_terms : list of str
+            The PII terms to match. Whitespace inside a term matches the gap
+            between two words.
+        """
+        terms = [self.normalize(term) for term in pii_terms]
+        self.spaced = compile_matcher(terms)
+        self.compact = compile_matcher(
+            [
+                compact
+                for compact in (_WHITESPACE.sub("", t) for t in terms)
+                if compact
+            ]
+        )
+
+    def normalize(self, text: str) -> str:
+        """
+        Normalizes a PII term or the text of a bounding box before matching.
+        Subclasses may fold more differences, as long as whitespace still
+        separates words.
+
+        Parameters
+        ----------
+        text : str
+            The text to normalize.
+
+        Returns
+        -------
+        str
+            The text with every run of whitespace collapsed into a single
+            space.
+        """
+        return normalize_whitespace(text)
+
+    def find(self, bounding_boxes) -> Set[int]:
+        """
+        Returns the indices of the bounding boxes covered by a PII match.
+
+        Parameters
+        ----------
+        bounding_boxes : list of dict or BoundingBoxBatch
+            The bounding boxes to scan.
+
+        Returns
+        -------
+        set of int
+            The indices into `bounding_boxes` of every box that is part of a
+            match.
+        """
+        if self.spaced.matches_empty:
+            return set(range(len(bounding_boxes)))
+
+        lines = group_lines(bounding_boxes)
+        texts = self._normalize_texts(_texts(bounding_boxes))
+        order = [index for line in lines for index in line]
+        words = [[texts[index] for index in line] for line in lines]
+        return {order[position] for position in self._find_in_lines(words)}
+
+    def _normalize_texts(self, texts: List[str]) -> List[str]:
+        """
+        Helper to normalize the texts of all the boxes at once, as one text
+        split back on a separator.
+        """
+        normalized = self.normalize(_TEXT_SEPARATOR.join(texts))
+        normalized = normalized.split(_TEXT_SEPARATOR)
+        if len(normalized) != len(texts):
+            # A text contains the separator
+            return list(map(self.normalize, texts))
+        return normalized
+
+    def _find_in_lines(self, lines: List[List[str]]) -> Set[int]:
+        """
+        Helper to match the words of every line, as the text of the whole
+        document scanned in one pass, with the lines separated by newlines,
+        which no normalized term contains.
+
+        Returns the positions of the matched words, counting the words of all
+        the lines in order.
+        """
+        found = set()
+        count = sum(map(len, lines))
+
+        spans = list(self.spaced.finditer("\n".join(map(" ".join, lines))))
+        if spans:
+            starts, ends = _offsets(lines, separator=1)
+            for start, end in spans:
+                found.update(_boxes_in_span(starts, ends, start, end))
+
+        if count > len(lines):
+            spans = list(self.compact.finditer("\n".join(map("".join, lines))))
+        else:
+            spans = []
+        if spans:
+            starts, ends = _offsets(lines, separator=0)
+            for start, end in spans:
+                first = bisect_left(starts, start)
+                last = bisect_left(ends, end)
+                if (
+                    first < last < count
+                    and starts[first] == start
+                    and ends[last] == end
+                ):
+                    found.update(range(first, last + 1))
+        return found
+
+
+def _offsets(
+    lines: List[List[str]], separator: int
+) -> Tuple[List[int], List[int]]:
+    """
+    Helper to return the start and end offsets of every word of the lines, in
+    the text of the lines joined by newlines, with their words joined by
+    `separator` characters.
+    """
+    lengths = list(map(len, chain.from_iterable(lines)))
+    gaps = [separator] * len(lengths)
+    for end in accumulate(map(len, lines)):
+        if end:
+            gaps[end - 1] = 1
+    starts = list(accumulate(map(add, lengths, gaps), initial=0))
+    del starts[-1]
+    return starts, list(map(add, starts, lengths))
+
+
+def term_set_digest(pii_terms: List[str]) -> str:
+    """
+    Digests a list of PII terms into a key that ignores their order, duplicates
+    and whitespace differences, which do not change what the terms match.
+
+    Parameters
+    ----------
+    pii_terms : list of str
+        The PII terms.
+
+    Returns
+    -------
+    str
+        The hex digest of the normalized term set.
+    """
+    normalized = sorted({normalize_whitespace(term) for term in pii_terms})
+    return hashlib.blake2b(
+        "\x00".join(normalized).encode(), digest_size=16
+    ).hexdigest()
+
+
+class MatcherCache:
+    """
+    A bounded LRU cache of compiled line matchers, keyed by the digest of their
+    term set (see `term_set_digest`).
+
+    Term lists sent over and over, in any order, are compiled once, as long as
+    they stay among the `max_entries` most recently used ones. The cache is
+    thread-safe.
+
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        factory: Callable[[List[str]], LineMatcher] = LineMatcher,
+    ):
+        """
+        Initializes the MatcherCache.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The maximum number of compiled matchers kept (default is 128).
+        factory : callable, optional
+            Compiles the matcher of a list of PII terms (default is
+            `LineMatcher`, exact matching).
+        """
+        self.max_entries = max_entries
+        self.factory = factory
+        self._matchers = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, pii_terms: List[str]) -> LineMatcher:
+        """
+        Returns the compiled matcher of a list of PII terms, compiling it on a
+        miss.
+
+        Parameters
+        ----------
+        pii_terms : list of str
+            The PII terms to match.
+
+        Returns
+        -------
+        LineMatcher
+            The compiled matcher for `pii_terms`.
+        """
+        digest = term_set_digest(pii_terms)
+        matcher = self.get_by_digest(digest)
+        if matcher is not None:
+            return matcher
+
+        matcher = self.factory(pii_terms)
+        with self._lock:
+            self._stats["misses"] += 1
+            self._matchers[digest] = matcher
+            while len(self._matchers) > self.max_entries:
+                self._matchers.popitem(last=False)
+        return matcher
+
+    def get_by_digest(self, digest: str) -> Optional[LineMatcher]:
+        """
+        Returns the compiled matcher of a term set digest, if it is cached.
+
+        Parameters
+        ----------
+        digest : str
+            The digest of the term set, see `term_set_digest`.
+
+        Returns
+        -------
+        LineMatcher or None
+            The cached matcher, or None if it is not cached.
+        """
+        with self._lock:
+            matcher = self._matchers.get(digest)
+            if matcher is not None:
+                self._matchers.move_to_end(digest)
+                self._stats["hits"] += 1
+            return matcher
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters of the cache since it was created.
+
+        Returns
+        -------
+        dict
+            The number of "hits", "misses" (compilations) and cached matchers
+            ("entries").
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._matchers))
@@ -0,0 +1,269 @@
+import re
+from collections import deque
+from typing import Iterator, List, Sequence, Tuple, Union
+
+# Total length of the terms up to which they are matched with a regular
+# expression rather than an automaton (see `compile_matcher`)
+REGEX_MAX_CHARS = 20_000
+
+
+def _trie_pattern(terms: Sequence[str]) -> str:
+    """
+    Helper to build a regular expression matching any of the terms, shaped
+    like their trie, so a text is scanned in C whatever the number of terms.
+    Shorter terms are optional groups after the shared prefix, so the
+    longest term starting at a position is matched first.
+    """
+    root = {}
+    for term in terms:
+        node = root
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def pattern(node):
+        chain = []
+        while "" not in node and len(node) == 1:
+            ((char, node),) = node.items()
+            chain.append(re.escape(char))
+        branches = [
+            re.escape(char) + pattern(child)
+            for char, child in node.items()
+            if char
+        ]
+        if not branches:
+            return "".join(chain)
+        body = branches[0]
+        if len(branches) > 1:
+            body = "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return "".join(chain) + body
+
+    return pattern(root)
+
+
+class RegexMatcher:
+    """
+    A multi-pattern substring matcher built on a compiled regular
+    expression, with the interface of `AhoCorasickMatcher`.
+
+    The expression is shaped like the trie of the terms (see
+    `_trie_pattern`), so the `re` engine scans texts at C speed. Only the
+    occurrences found run Python code: each is reported with the shorter
+    terms that start at the same offset, which are prefixes of it.
+
+    """
+
+    def __init__(self, terms: Sequence[str]):
+        """
+        Compiles the regular expression for the given terms.
+
+        Parameters
+        ----------
+        terms : sequence of str
+            The terms to search for. Duplicates are ignored.
+        """
+        self.terms = list(dict.fromkeys(terms))
+        self.matches_empty = "" in self.terms
+
+        words = set(self.terms)
+        words.discard("")
+        # The lengths of the terms each term starts with, itself included
+        sizes = sorted(set(map(len, words)))
+        self._lengths = {
+            term: tuple(
+                size
+                for size in sizes
+                if size <= len(term) and term[:size] in words
+            )
+            for term in words
+        }
+        self._regex = re.compile(_trie_pattern(words)) if words else None
+
+    def search(self, text: str) -> bool:
+        """
+        Returns whether any of the terms occurs in the text.
+
+        Parameters
+        ----------
+        text : str
+            The text to scan.
+
+        Returns
+        -------
+        bool
+            True if at least one term is a substring of `text`.
+        """
+        if self.matches_empty:
+            return True
+        return self._regex is not None and bool(self._regex.search(text))
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Yields the span of every term occurrence in the text, overlapping
+        occurrences included.
+
+        Parameters
+        ----------
+        text : str
+            The text to scan.
+
+        Yields
+        ------
+        tuple of (int, int)
+            The `(start, end)` offsets of each occurrence, such that
+            `text[start:end]` is a term. The empty term is never reported.
+        """
+        if self._regex is None:
+            return
+        search = self._regex.search
+        match = search(text)
+        while match:
+            start = match.start()
+            for length in self._lengths[match.group()]:
+                yield start, start + length
+            match = search(text, start + 1)
+
+
+class AhoCorasickMatcher:
+    """
+    A multi-pattern substring matcher built on an Aho-Corasick automaton.
+
+    The automaton is compiled once from a list of terms and then scans any text
+    in a single pass, regardless of how many terms it was built from. Matching
+    follows the same semantics as Python's `term in text` operator, including
+    the empty term, which matches every text.
+
+    """
+
+    def __init__(self, terms: Sequence[str]):
+        """
+        Compiles the automaton for the given terms.
+
+        Parameters
+        ----------
+        terms : sequence of str
+            The terms to search for. Duplicates are ignored.
+        """
+        self.terms = list(dict.fromkeys(terms))
+        self.matches_empty = "" in self.terms
+
+        # Trie transitions, failure links and the lengths of the terms ending
+        # at each node
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for term in self.terms:
+            if term:
+                self._add(term)
+        self._build_failure_links()
+
+    def _add(self, term: str):
+        node = 0
+        for char in term:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = next_node
+        if len(term) not in self._out[node]:
+            self._out[node] += (len(term),)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def _step(self, node: int, char: str) -> int:
+        goto, fail = self._goto, self._fail
+        while node and char not in goto[node]:
+            node = fail[node]
+        return goto[node].get(char, 0)
+
+    def search(self, text: str) -> bool:
+        """
+        Returns whether any of the terms occurs in the text.
+
+        Parameters
+        ----------
+        text : str
+            The text to scan.
+
+        Returns
+        -------
+        bool
+            True if at least one term is a substring of `text`.
+        """
+        if self.matches_empty:
+            return True
+        node = 0
+        out = self._out
+        for char in text:
+            node = self._step(node, char)
+            if out[node]:
+                return True
+        return False
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Yields the span of every term occurrence in the text, overlapping
+        occurrences included.
+
+        Parameters
+        ----------
+        text : str
+            The text to scan.
+
+        Yields
+        ------
+        tuple of (int, int)
+            The `(start, end)` offsets of each occurrence, such that
+            `text[start:end]` is a term. The empty term is never reported.
+        """
+        node = 0
+        out = self._out
+        for end, char in enumerate(text, start=1):
+            node = self._step(node, char)
+            for length in out[node]:
+                yield end - length, end
+
+
+def compile_matcher(
+    pii_terms: List[str],
+) -> Union[RegexMatcher, AhoCorasickMatcher]:
+    """
+    Compiles the matcher of a list of PII terms. Compiled matchers are
+    cached by `MatcherCache` (see `FilterPII.src.lines`), which holds the
+    only reference to them.
+
+    Term lists of up to `REGEX_MAX_CHARS` characters, the usual case, get a
+    `RegexMatcher`, which scans at C speed. Longer lists get an
+    `AhoCorasickMatcher` instead, since the `re` module keeps its own cache of
+    compiled expressions, which would hold large ones after `MatcherCache`
+    evicted them.
+
+    Parameters
+    ----------
+    pii_terms : list of str
+        The PII terms to match.
+
+    Returns
+    -------
+    RegexMatcher or AhoCorasickMatcher
+        The compiled matcher for `pii_terms`.
+    """
+    if sum(map(len, pii_terms)) <= REGEX_MAX_CHARS:
+        return RegexMatcher(pii_terms)
+    return AhoCorasickMatcher(pii_terms)
@@ -0,0 +1,128 @@
+import io
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from PIL import Image, ImageDraw
+
+# Output formats: the Pillow format name and the content type of the encoded
+# image
+FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+# Modes each format can encode as-is, other modes are converted first
+_MODES = {
+    "PNG": ("1", "L", "LA", "P", "RGB", "RGBA", "I;16"),
+    "JPEG": ("L", "RGB", "CMYK"),
+    "WEBP": ("RGB", "RGBA"),
+}
+
+
+@dataclass(frozen=True)
+class RedactionConfig:
+    """
+    Settings of the redacted image rendered by FilterPII.
+
+    format: "png", "jpeg" or "webp".
+    quality: the encoder quality of JPEG and WebP, from 1 to 100. PNG is
+        lossless and ignores it.
+    output: "queue" to publish the redacted image to the `REDACTED_QUEUE`, or
+        "redis" to store it under "<img_id>:redacted".
+    """
+
+    format: str = "png"
+    quality: int = 85
+    output: str = "queue"
+
+    def __post_init__(self):
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown redaction format: {self.format}")
+        if self.output not in ("queue", "redis"):
+            raise ValueError(f"Unknown redaction output: {self.output}")
+
+    @property
+    def content_type(self) -> str:
+        """The content type of the encoded image."""
+        return FORMATS[self.format][1]
+
+    @classmethod
+    def from_env(cls) -> Optional["RedactionConfig"]:
+        """
+        Reads the redaction settings from the environment.
+
+        Redaction is enabled by `FILTER_REDACT=1`, and tuned by
+        `FILTER_REDACT_FORMAT`, `FILTER_REDACT_QUALITY` and
+        `FILTER_REDACT_OUTPUT`.
+
+        Returns
+        -------
+        RedactionConfig or None
+            The settings, or None when redaction is disabled.
+        """
+        if os.getenv("FILTER_REDACT", "0").lower() not in ("1", "true"):
+            return None
+        return cls(
+            format=os.getenv("FILTER_REDACT_FORMAT", cls.format).lower(),
+            quality=int(os.getenv("FILTER_REDACT_QUALITY", cls.quality)),
+            output=os.getenv("FILTER_REDACT_OUTPUT", cls.output),
+        )
+
+
+def redact_image(
+    image_data: bytes, bounding_boxes: List[dict], config: RedactionConfig
+) -> bytes:
+    """
+    Draws a black rectangle over every bounding box of an image, and encodes
+    the result once.
+
+    Parameters
+    ----------
+    image_data : bytes
+        The raw bytes of the original image.
+    bounding_boxes : list of dict
+        The bounding boxes to black out, with their "left", "top", "right" and
+        "bottom" in pixels of the original image.
+    config : RedactionConfig
+        The output format and quality.
+
+    Returns
+    -------
+    bytes
+        The encoded redacted image.
+    """
+    pil_format = FORMATS[config.format][0]
+    with Image.open(io.BytesIO(image_data)) as original:
+        if original.mode in _MODES[pil_format]:
+            image = original.copy()
+        else:
+            image = original.convert(
+                "RGBA"
+                if "A" in original.getbands() and pil_format != "JPEG"
+                else "RGB"
+            )
+    try:
+        draw = ImageDraw.Draw(image)
+        # Palette images get black added to their palette if they lack it
+        for box in bounding_boxes:
+            if box["right"] > box["left"] and box["bottom"] > box["top"]:
+                draw.rectangle(
+                    (
+                        box["left"],
+                        box["top"],
+                        box["right"] - 1,
+                        box["bottom"] - 1,
+                    ),
+                    fill="black",
+                )
+
+        output = io.BytesIO()
+        if pil_format == "PNG":
+            image.save(output, pil_format)
+        else:
+            image.save(output, pil_format, quality=config.quality)
+        return output.getvalue()
+    finally:
+        image.close()
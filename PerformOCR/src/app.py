@@ -1,9 +1,25 @@
 import base64
+import itertools
 import json
+import multiprocessing
 import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
 
 from commons.clients.rabbit_mq import RabbitMQClient
-from PerformOCR.src.utils import detect_text
+from commons.clients.redis_storage import RedisStorage
+from commons.entities.bounding_box_batch import BoundingBoxBatch, as_batch
+from commons.metrics import REGISTRY, Metrics, start_metrics_server
+from PerformOCR.src.cache import OCRCache
+from PerformOCR.src.pages import detect_page, document_pages, iter_pages
+from PerformOCR.src.streaming import StreamingConfig
+from PerformOCR.src.utils import (
+    STAGE_METRIC,
+    detect_text,
+    detect_text_chunks,
+    run_with_timings,
+)
 
 
 class PerformOCRService:
@@ -13,14 +29,61 @@ class PerformOCRService:
     The PerformOCR class listens to a RabbitMQ queue for incoming image messages,
     decodes the image, runs OCR on it, and sends the detected bounding boxes to another queue for further processing.
 
+    Images are processed one at a time inside the consumer callback by default.
+    When `workers` is set, the service prefetches several messages and runs OCR
+    on a process pool instead, acknowledging each message from the connection
+    thread once its OCR has finished.
+
+    Multi-page TIFF and PDF documents are processed page by page, decoding one
+    page at a time, and the bounding boxes of each page are published on their
+    own with the page index and the page count. With a pool, the pages of a
+    document are recognized in parallel.
+
+    With an `OCRCache`, images (and pages) seen before are not recognized
+    again: their cached bounding boxes are published right away.
+
+    With a `StreamingConfig`, images processed inline are recognized in
+    horizontal bands, and the bounding boxes of each band are published as soon
+    as it is recognized, as a "chunk" of the image with the "chunk_count", so
+    that FilterPII filters the first chunks while the next ones are being
+    recognized.
+
+    With an `image_store`, the original bytes of single images are kept in
+    Redis under "<img_id>:image" (expiring after the TTL of the store) before
+    their bounding boxes are published, so that FilterPII can render the
+    redacted image without fetching and decoding it again. Images larger than
+    `image_store_max_bytes` are not kept.
+
+    With a `min_confidence`, the words recognized with a lower confidence are
+    left out of the published bounding boxes, which makes the messages smaller.
+    They are still cached, so the threshold can change without recognizing
+    images again.
+
+    The latency of each stage of a message (decoding, OCR, publishing...) is
+    recorded in the "ocr_stage_seconds" histogram of `metrics`, and messages
+    are counted in "ocr_messages_total" by outcome.
+
     """
 
     OCR_QUEUE = "ocr_queue"
     FILTER_PII_QUEUE = "filter_pii_queue"
+    IMAGE_CONTENT_TYPE = "application/octet-stream"
+    IMAGE_TYPE = "image"
+    STAGE_METRIC = STAGE_METRIC
+    MESSAGES_METRIC = "ocr_messages_total"
 
     def __init__(
         self,
         connection_params="localhost",
+        workers: int = None,
+        prefetch_count: int = None,
+        codec: str = "json",
+        cache: OCRCache = None,
+        streaming: StreamingConfig = None,
+        image_store: RedisStorage = None,
+        image_store_max_bytes: int = 20 * 1024 * 1024,
+        metrics: Metrics = None,
+        min_confidence: float = None,
     ):
         """
         Initializes the PerformOCR class with a RabbitMQ connection.
@@ -29,17 +92,247 @@ class PerformOCRService:
         ----------
         connection_params : str, optional
             The connection string to connect to RabbitMQ (default is "localhost").
+        workers : int, optional
+            The number of OCR worker processes (default is None, which runs OCR
+            in the consumer callback).
+        prefetch_count : int, optional
+            The maximum number of unacknowledged messages to prefetch (default
+            is None, which uses twice the number of workers when a pool is used
+            and no limit otherwise).
+        codec : str, optional
+            The codec used to serialize the published bounding boxes (default
+            is "json").
+        cache : OCRCache, optional
+            The cache of OCR results (default is None, no caching).
+        streaming : StreamingConfig, optional
+            How to split images into bands streamed to FilterPII (default is
+            None, no streaming). Only images processed inline are streamed:
+            with a pool, images are recognized in parallel already.
+        image_store : RedisStorage, optional
+            The storage the original images are kept in for redaction (default
+            is None, not kept).
+        image_store_max_bytes : int, optional
+            The size of the largest image kept in the `image_store` (default is
+            20 MiB).
+        metrics : Metrics, optional
+            The registry the service records its metrics in (default is
+            `REGISTRY`, the registry of the process).
+        min_confidence : float, optional
+            The OCR confidence, from 0 to 100, below which a word is not
+            published (default is None, every word is published). Words without
+            a confidence are always published.
+
+        Raises
+        ------
+        ValueError
+            If `min_confidence` is not between 0 and 100.
         """
+        if min_confidence is not None and not 0 <= min_confidence <= 100:
+            raise ValueError("min_confidence must be between 0 and 100")
         self.rabbitmq_client = RabbitMQClient(
-            connection_params, self.OCR_QUEUE
+            connection_params, self.OCR_QUEUE, codec=codec
+        )
+        self.workers = workers
+        self.prefetch_count = prefetch_count
+        self.cache = cache
+        self.streaming = streaming
+        self.image_store = image_store
+        self.image_store_max_bytes = image_store_max_bytes
+        self.metrics = metrics or REGISTRY
+        self.min_confidence = min_confidence
+        self._pool = None
+
+    def _timed(self, stage):
+        """Helper to record the latency of a stage of a message."""
+        return self.metrics.time(self.STAGE_METRIC, stage=stage)
+
+    def _count(self, outcome):
+        """Helper to count a settled message by outcome, "ok" or "error"."""
+        self.metrics.inc(self.MESSAGES_METRIC, outcome=outcome)
+
+    def _decode_message(self, properties, body):
+        """
+        Decodes an image message into its img_id and raw image bytes.
+
+        Binary messages (`IMAGE_CONTENT_TYPE`) carry the raw image bytes as the
+        body and the img_id in the headers, so the body is used as-is without
+        decoding or copying. Any other message is read in the legacy JSON
+        format, with the image base64-encoded under "image_data".
+
+        Parameters
+        ----------
+        properties : object
+            The properties of the RabbitMQ message.
+        body : bytes
+            The body of the RabbitMQ message.
+
+        Returns
+        -------
+        tuple of (str, bytes)
+            The img_id of the message and the image data.
+        """
+        if (
+            getattr(properties, "content_type", None)
+            == self.IMAGE_CONTENT_TYPE
+        ):
+            return (properties.headers or {}).get("img_id"), body
+
+        message = json.loads(body)
+        return message.get("img_id"), base64.b64decode(message["image_data"])
+
+    def _keep_image(self, img_id, image_data):
+        """
+        Keeps the original bytes of an image in the `image_store`, when there
+        is one and the image is small enough. The store is best effort: its
+        errors are printed, and the image is then not redacted.
+
+        Parameters
+        ----------
+        img_id : str
+            The ID of the image.
+        image_data : bytes
+            The raw image bytes.
+        """
+        if self.image_store is None:
+            return
+        if len(image_data) > self.image_store_max_bytes:
+            print(
+                f"Image {img_id} is larger than {self.image_store_max_bytes} "
+                "bytes, not keeping it"
+            )
+            return
+        try:
+            with self._timed("image_store"):
+                self.image_store.store_bytes(
+                    img_id, self.IMAGE_TYPE, image_data
+                )
+        except Exception as e:
+            print(f"Error keeping image {img_id}: {e}")
+
+    def _cache_key(self, image_data):
+        """
+        Helper to compute the cache key of an image, or None without a cache.
+        """
+        return self.cache.key(image_data) if self.cache else None
+
+    def _cached(self, img_id, cache_key, page=None):
+        """
+        Looks up the cached OCR result of an image, or of one page of a
+        document.
+
+        Parameters
+        ----------
+        img_id : str
+            The ID of the image.
+        cache_key : str or None
+            The cache key of the image, or None without a cache.
+        page : int, optional
+            The index of the page, for multi-page documents (default is None).
+
+        Returns
+        -------
+        BoundingBoxBatch or None
+            The cached bounding boxes, or None on a miss.
+        """
+        if cache_key is None:
+            return None
+        if page is not None:
+            cache_key = f"{cache_key}:{page}"
+        with self._timed("cache"):
+            bounding_boxes = self.cache.get(cache_key)
+        if bounding_boxes is not None:
+            print(
+                f"OCR cache hit for img_id {img_id}, skipping OCR "
+                f"({self.cache.stats()})"
+            )
+        return bounding_boxes
+
+    def _remember(self, cache_key, bounding_boxes, page=None):
+        """
+        Helper to cache the OCR result of an image, or of one page of a
+        document, when there is a cache.
+        """
+        if cache_key is None:
+            return
+        if page is not None:
+            cache_key = f"{cache_key}:{page}"
+        self.cache.put(cache_key, bounding_boxes)
+
+    def _confident(self, bounding_boxes):
+        """
+        Helper to drop the boxes below `min_confidence`, keeping those without
+        a confidence.
+        """
+        conf = bounding_boxes.columns.get("conf")
+        if not self.min_confidence or conf is None:
+            return bounding_boxes
+        # Tesseract reports -1 for what it did not recognize as a word
+        return bounding_boxes.compress(
+            [not 0 <= value < self.min_confidence for value in conf]
+        )
+
+    def _publish_bounding_boxes(
+        self,
+        img_id,
+        bounding_boxes,
+        page=None,
+        page_count=None,
+        chunk=None,
+        chunk_count=None,
+    ):
+        """
+        Publishes the bounding boxes detected for an image to the
+        `FILTER_PII_QUEUE`.
+
+        Parameters
+        ----------
+        img_id : str
+            The ID of the image the bounding boxes belong to.
+        bounding_boxes : BoundingBoxBatch or list of TextBoundingBox
+            The bounding boxes detected in the image.
+        page : int, optional
+            The index of the page of a document the bounding boxes belong to
+            (default is None, a single image).
+        page_count : int, optional
+            The number of pages of the document. Documents of a single page are
+            published as single images.
+        chunk : int, optional
+            The index of the band of a streamed image the bounding boxes belong
+            to (default is None, the whole image).
+        chunk_count : int, optional
+            The number of bands of the streamed image. Images of a single band
+            are published whole.
+        """
+        # The client's codec serializes the batch straight from its columns
+        payload = {
+            "img_id": img_id,
+            "bounding_boxes": self._confident(as_batch(bounding_boxes)),
+        }
+        if page_count and page_count > 1:
+            payload["page"] = page
+            payload["page_count"] = page_count
+        if chunk_count and chunk_count > 1:
+            payload["chunk"] = chunk
+            payload["chunk_count"] = chunk_count
+
+        # Publish the results to the filter_pii_queue
+        with self._timed("publish"):
+            self.rabbitmq_client.publish_message(
+                self.FILTER_PII_QUEUE, payload
+            )
+        print(
+            "Processed image and sent bounding boxes to filter_pii_queue for "
+            f"img_id {img_id}"
         )
 
     def process_image_message(self, ch, method, properties, body):
         """
         Processes an incoming RabbitMQ message, decodes the image, runs OCR, and publishes bounding boxes.
 
-        This method decodes the base64-encoded image data received in the message, extracts text bounding boxes
-        using the `detect_text` function, and then publishes the results to the `FILTER_PII_QUEUE`.
+        This method reads the image data received in the message (raw bytes, or
+        base64-encoded JSON from older producers), extracts text bounding boxes
+        using the `detect_text` function, and then publishes the results to the
+        `FILTER_PII_QUEUE`.
 
         Parameters
         ----------
@@ -50,37 +343,363 @@ class PerformOCRService:
         properties : object
             The properties of the RabbitMQ message.
         body : bytes
-            The body of the RabbitMQ message, which contains the image data in base64-encoded format.
+            The body of the RabbitMQ message, which contains the raw image
+            bytes or the image data in base64-encoded JSON format.
 
         """
         try:
-            # Decode the message body
-            message = json.loads(body)
-            image_data = base64.b64decode(message["image_data"])
+            with self._timed("decode"):
+                img_id, image_data = self._decode_message(properties, body)
+                page_count = document_pages(image_data)
+            cache_key = self._cache_key(image_data)
+            if page_count is None:
+                self._keep_image(img_id, image_data)
+                bounding_boxes = self._cached(img_id, cache_key)
+                if bounding_boxes is not None:
+                    self._publish_bounding_boxes(img_id, bounding_boxes)
+                elif self.streaming is not None:
+                    self._stream_bounding_boxes(img_id, image_data, cache_key)
+                else:
+                    # Detect text in the image and get bounding boxes
+                    with self._timed("ocr"):
+                        bounding_boxes = detect_text(image_data)
+                    self._remember(cache_key, bounding_boxes)
+                    self._publish_bounding_boxes(img_id, bounding_boxes)
+            else:
+                for page, image in enumerate(iter_pages(image_data)):
+                    bounding_boxes = self._cached(img_id, cache_key, page)
+                    if bounding_boxes is None:
+                        with self._timed("ocr"):
+                            bounding_boxes = detect_text(image)
+                        self._remember(cache_key, bounding_boxes, page)
 
-            # Detect text in the image and get bounding boxes
-            bounding_boxes = detect_text(image_data)
+                    self._publish_bounding_boxes(
+                        img_id, bounding_boxes, page, page_count
+                    )
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self._count("ok")
 
-            # Serialize bounding boxes for the message queue
-            bounding_boxes_json = [box.__dict__ for box in bounding_boxes]
-            payload = {
-                "img_id": message.get("img_id"),
-                "bounding_boxes": bounding_boxes_json,
-            }
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self._count("error")
 
-            # Publish the results to the filter_pii_queue
-            self.rabbitmq_client.publish_message(
-                self.FILTER_PII_QUEUE, payload
+    def _stream_bounding_boxes(self, img_id, image_data, cache_key=None):
+        """
+        Recognizes an image band by band, publishing the bounding boxes of each
+        band as soon as it is recognized.
+
+        Parameters
+        ----------
+        img_id : str
+            The ID of the image.
+        image_data : bytes
+            The raw image bytes.
+        cache_key : str, optional
+            The key under which to cache the result of the whole image (default
+            is None, not cached).
+        """
+        bounding_boxes = BoundingBoxBatch()
+        chunks = detect_text_chunks(image_data, self.streaming)
+        for chunk in itertools.count():
+            # Each band is recognized when it is asked for
+            with self._timed("ocr_band"):
+                chunk_count, boxes = next(chunks, (None, None))
+            if boxes is None:
+                break
+            self._publish_bounding_boxes(
+                img_id, boxes, chunk=chunk, chunk_count=chunk_count
             )
-            print(
-                f"Processed image and sent bounding boxes to filter_pii_queue for img_id {message.get('img_id')}"
+            bounding_boxes.extend(boxes)
+        self._remember(cache_key, bounding_boxes)
+
+    def submit_image_message(self, ch, method, properties, body):
+        """
+        Decodes an incoming RabbitMQ message and submits its image to the OCR
+        worker pool.
+
+        The consumer callback returns right away, so the connection keeps
+        receiving prefetched messages while the workers run OCR. The message is
+        published and acknowledged by `_on_ocr_done` once OCR finishes.
+
+        Parameters
+        ----------
+        ch : object
+            The channel object provided by RabbitMQ when consuming messages.
+        method : object
+            The delivery method used by RabbitMQ for the message.
+        properties : object
+            The properties of the RabbitMQ message.
+        body : bytes
+            The body of the RabbitMQ message, which contains the raw image
+            bytes or the image data in base64-encoded JSON format.
+
+        """
+        try:
+            with self._timed("decode"):
+                img_id, image_data = self._decode_message(properties, body)
+                page_count = document_pages(image_data)
+            cache_key = self._cache_key(image_data)
+            if page_count is None:
+                self._keep_image(img_id, image_data)
+            bounding_boxes = (
+                self._cached(img_id, cache_key) if page_count is None else None
+            )
+            if bounding_boxes is not None:
+                self._publish_bounding_boxes(img_id, bounding_boxes)
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                self._count("ok")
+                return
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self._count("error")
+            return
+
+        connection = self.rabbitmq_client.connection
+        if page_count is None:
+            future = self._submit(detect_text, image_data)
+            future.add_done_callback(
+                lambda done: connection.add_callback_threadsafe(
+                    partial(
+                        self._on_ocr_done, ch, method, img_id, done, cache_key
+                    )
+                )
+            )
+            return
+
+        # Each worker decodes and recognizes its own page, and the message is
+        # settled once every page is done
+        document = {"pending": page_count, "failed": False}
+        for page in range(page_count):
+            bounding_boxes = self._cached(img_id, cache_key, page)
+            if bounding_boxes is not None:
+                future = Future()
+                future.set_result(bounding_boxes)
+                self._on_page_done(
+                    ch, method, img_id, page, page_count, document, future
+                )
+                continue
+
+            future = self._submit(detect_page, image_data, page)
+            future.add_done_callback(
+                lambda done, page=page: connection.add_callback_threadsafe(
+                    partial(
+                        self._on_page_done,
+                        ch,
+                        method,
+                        img_id,
+                        page,
+                        page_count,
+                        document,
+                        done,
+                        cache_key,
+                    )
+                )
+            )
+
+    def _submit(self, fn, *args):
+        """
+        Helper to submit OCR to the pool, recording the time until its result
+        is ready (including the time spent waiting for a worker) as the "pool"
+        stage. The stages timed by the worker are merged into `metrics`, and
+        the returned future holds the result of `fn` alone.
+        """
+        start = time.perf_counter()
+        result = Future()
+
+        def done(future):
+            self.metrics.observe(
+                self.STAGE_METRIC, time.perf_counter() - start, stage="pool"
             )
+            try:
+                value, histograms = future.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            try:
+                self.metrics.merge_histograms(histograms)
+            except ValueError as e:
+                print(f"Error merging the metrics of an OCR worker: {e}")
+            result.set_result(value)
+
+        self._pool.submit(run_with_timings, fn, *args).add_done_callback(done)
+        return result
+
+    def _on_ocr_done(self, ch, method, img_id, future: Future, cache_key=None):
+        """
+        Publishes the OCR result of a pooled image and acknowledges its
+        message.
+
+        Pika channels are not thread-safe, so this method is scheduled on the
+        connection thread through `add_callback_threadsafe` instead of running
+        in the pool's callback thread.
+
+        Parameters
+        ----------
+        ch : object
+            The channel object the message was delivered on.
+        method : object
+            The delivery method used by RabbitMQ for the message.
+        img_id : str
+            The ID of the image.
+        future : concurrent.futures.Future
+            The future holding the result of `detect_text`.
+        cache_key : str, optional
+            The key under which to cache the result (default is None, not
+            cached).
+        """
+        try:
+            bounding_boxes = future.result()
+            self._remember(cache_key, bounding_boxes)
+            self._publish_bounding_boxes(img_id, bounding_boxes)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self._count("ok")
 
         except Exception as e:
             print(f"Error processing message: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self._count("error")
+
+    def _on_page_done(
+        self,
+        ch,
+        method,
+        img_id,
+        page,
+        page_count,
+        document,
+        future,
+        cache_key=None,
+    ):
+        """
+        Publishes the OCR result of one page of a pooled document, and settles
+        its message after the last page.
+
+        Like `_on_ocr_done`, this method runs on the connection thread. The
+        message is acknowledged if every page was published, and rejected
+        otherwise.
+
+        Parameters
+        ----------
+        ch : object
+            The channel object the message was delivered on.
+        method : object
+            The delivery method used by RabbitMQ for the message.
+        img_id : str
+            The ID of the document.
+        page : int
+            The index of the page.
+        page_count : int
+            The number of pages of the document.
+        document : dict
+            The state shared by the pages of the document: the number of
+            "pending" pages, and whether any page "failed".
+        future : concurrent.futures.Future
+            The future holding the result of `detect_page`.
+        cache_key : str, optional
+            The key under which to cache the result of the document (default is
+            None, not cached).
+        """
+        try:
+            bounding_boxes = future.result()
+            self._remember(cache_key, bounding_boxes, page)
+            self._publish_bounding_boxes(
+                img_id, bounding_boxes, page, page_count
+            )
+        except Exception as e:
+            print(f"Error processing page {page} of img_id {img_id}: {e}")
+            document["failed"] = True
+
+        document["pending"] -= 1
+        if document["pending"]:
+            return
+        if document["failed"]:
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            self._count("error")
+        else:
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self._count("ok")
+
+    def start(self):
+        """
+        Start the PerformOCR Service to listen for image messages.
+
+        When `workers` is set, a process pool of that size is started and
+        messages are consumed with `submit_image_message`, otherwise they are
+        processed inline with `process_image_message`. The statistics of the
+        OCR cache are exported with the metrics.
+
+        """
+        if self.cache is not None:
+            self.metrics.register_collector("ocr_cache", self.cache.stats)
+        if self.workers:
+            # Spawned workers do not inherit the AMQP socket of the parent
+            # process
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self.rabbitmq_client.start(
+                self.submit_image_message,
+                prefetch_count=self.prefetch_count or 2 * self.workers,
+            )
+        else:
+            self.rabbitmq_client.start(
+                self.process_image_message,
+                prefetch_count=self.prefetch_count,
+            )
+
+
+def _int_env(name, default=None):
+    value = os.getenv(name)
+    if not value:
+        return default
+    if value == "auto":
+        return os.cpu_count()
+    return int(value)
 
 
 if __name__ == "__main__":
     connection_params = os.getenv("RABBITMQ_HOST", "rabbitmq")
-    ocr_service = PerformOCRService(connection_params)
-    ocr_service.rabbitmq_client.start(ocr_service.process_image_message)
+    cache_size = _int_env("OCR_CACHE_SIZE", 0)
+    cache_redis_host = os.getenv("OCR_CACHE_REDIS_HOST")
+    cache = None
+    if cache_size or cache_redis_host:
+        cache = OCRCache(
+            max_entries=cache_size,
+            storage=(
+                RedisStorage(
+                    host=cache_redis_host,
+                    ttl=_int_env("OCR_CACHE_TTL", 86400),
+                )
+                if cache_redis_host
+                else None
+            ),
+        )
+    image_store_host = os.getenv("OCR_IMAGE_STORE_HOST")
+    min_confidence = os.getenv("OCR_MIN_CONFIDENCE")
+    metrics_port = _int_env("METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    ocr_service = PerformOCRService(
+        connection_params,
+        workers=_int_env("OCR_WORKERS"),
+        prefetch_count=_int_env("OCR_PREFETCH"),
+        codec=os.getenv("MESSAGE_CODEC", "json"),
+        cache=cache,
+        streaming=StreamingConfig.from_env(),
+        image_store=(
+            RedisStorage(
+                host=image_store_host,
+                ttl=_int_env("OCR_IMAGE_STORE_TTL", 600),
+            )
+            if image_store_host
+            else None
+        ),
+        image_store_max_bytes=_int_env(
+            "OCR_IMAGE_STORE_MAX_BYTES", 20 * 1024 * 1024
+        ),
+        min_confidence=float(min_confidence) if min_confidence else None,
+    )
+    ocr_service.start()
@@ -0,0 +1,312 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from functools import lru_cache
+
+import pytesseract
+from PIL import Image
+
+OCR_DATA_KEYS = (
+    "level",
+    "page_num",
+    "block_num",
+    "par_num",
+    "line_num",
+    "word_num",
+    "left",
+    "top",
+    "width",
+    "height",
+    "conf",
+    "text",
+)
+
+
+def parse_tsv(tsv: str) -> dict:
+    """
+    Parses the TSV output of Tesseract into columns.
+
+    The rows are split and transposed in bulk, and each numeric column is
+    converted in a single pass into an `array`, rather than cell by cell into
+    lists as `pytesseract.Output.DICT` does.
+
+    Parameters
+    ----------
+    tsv : str
+        The TSV output, with a header row naming the columns (see
+        `OCR_DATA_KEYS`).
+
+    Returns
+    -------
+    dict
+        The columns keyed by the header: "text" as a list of str, "conf" as an
+        `array("d")` (-1 on rows that are not words) and every other one as an
+        `array("q")`.
+    """
+    lines = tsv.splitlines()
+    if not lines:
+        return {}
+    header = lines[0].split("\t")
+    rows = [line.split("\t") for line in lines[1:] if line]
+    for row in rows:
+        # The text of the last row may be missing along with its tab
+        row.extend([""] * (len(header) - len(row)))
+
+    columns = {}
+    for key, values in zip(header, zip(*rows) if rows else [()] * len(header)):
+        if key == "text":
+            columns[key] = list(values)
+        elif key == "conf":
+            columns[key] = array("d", map(float, values))
+        else:
+            columns[key] = array("q", map(int, values))
+    return columns
+
+
+class OCRBackend(ABC):
+    """
+    Interface of an OCR engine used by `detect_text`.
+
+    A backend turns a PIL image into word-level OCR data laid out like
+    `pytesseract.image_to_data` with `output_type=pytesseract.Output.DICT`: a
+    dict of parallel columns (lists or arrays) keyed by `OCR_DATA_KEYS`.
+    Backends are long-lived, so any model loading should happen once in
+    `__init__` rather than per image.
+
+    """
+
+    name = None
+
+    @abstractmethod
+    def image_to_data(self, image: Image.Image) -> dict:
+        """
+        Runs OCR on an image.
+
+        Parameters
+        ----------
+        image : PIL.Image.Image
+            The image to recognize.
+
+        Returns
+        -------
+        dict
+            The word-level OCR data, as parallel columns keyed by
+            `OCR_DATA_KEYS`.
+        """
+
+    def close(self):
+        """Releases the resources held by the engine."""
+
+
+class PytesseractBackend(OCRBackend):
+    """
+    OCR backend that runs the `tesseract` command line through pytesseract.
+
+    Every call writes the image to a temporary file and starts a new
+    `tesseract` process, which reloads the language model. It needs nothing
+    beyond the `tesseract` binary, so it is the fallback backend. Its TSV
+    output is parsed into columns by `parse_tsv`.
+
+    """
+
+    name = "pytesseract"
+
+    def __init__(self, lang: str = "eng"):
+        """
+        Initializes the backend.
+
+        Parameters
+        ----------
+        lang : str, optional
+            The Tesseract language(s) to recognize (default is "eng").
+        """
+        self.lang = lang
+
+    def image_to_data(self, image: Image.Image) -> dict:
+        return parse_tsv(
+            pytesseract.image_to_data(
+                image, lang=self.lang, output_type=pytesseract.Output.STRING
+            )
+        )
+
+
+class TesserocrBackend(OCRBackend):
+    """
+    OCR backend that keeps a libtesseract API handle open through tesserocr.
+
+    The language model is loaded once when the backend is created, and images
+    are handed to Tesseract in memory, without temporary files or subprocesses.
+
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str = "eng"):
+        """
+        Initializes the Tesseract API handle.
+
+        Parameters
+        ----------
+        lang : str, optional
+            The Tesseract language(s) to load (default is "eng").
+
+        Raises
+        ------
+        ImportError
+            If tesserocr is not installed.
+        RuntimeError
+            If Tesseract fails to load the language model, e.g. when its
+            tessdata directory is missing.
+        """
+        import tesserocr
+
+        self._tesserocr = tesserocr
+        self._api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def image_to_data(self, image: Image.Image) -> dict:
+        RIL = self._tesserocr.RIL
+        ocr_data = {key: [] for key in OCR_DATA_KEYS}
+
+        self._api.SetImage(image)
+        self._api.Recognize()
+        iterator = self._api.GetIterator()
+        if iterator is None:
+            return ocr_data
+
+        block_num = par_num = line_num = word_num = 0
+        for word in self._tesserocr.iterate_level(iterator, RIL.WORD):
+            # Number words the same way Tesseract's TSV output does
+            if word.IsAtBeginningOf(RIL.BLOCK):
+                block_num, par_num = block_num + 1, 0
+            if word.IsAtBeginningOf(RIL.PARA):
+                par_num, line_num = par_num + 1, 0
+            if word.IsAtBeginningOf(RIL.TEXTLINE):
+                line_num, word_num = line_num + 1, 0
+            word_num += 1
+
+            bounding_box = word.BoundingBox(RIL.WORD)
+            if bounding_box is None:
+                continue
+            left, top, right, bottom = bounding_box
+
+            for key, value in (
+                ("level", 5),
+                ("page_num", 1),
+                ("block_num", block_num),
+                ("par_num", par_num),
+                ("line_num", line_num),
+                ("word_num", word_num),
+                ("left", left),
+                ("top", top),
+                ("width", right - left),
+                ("height", bottom - top),
+                ("conf", word.Confidence(RIL.WORD)),
+                ("text", word.GetUTF8Text(RIL.WORD)),
+            ):
+                ocr_data[key].append(value)
+
+        return ocr_data
+
+    def close(self):
+        self._api.End()
+
+
+BACKENDS = {
+    PytesseractBackend.name: PytesseractBackend,
+    TesserocrBackend.name: TesserocrBackend,
+}
+
+_local = threading.local()
+
+
+def _create_backend(name: str) -> OCRBackend:
+    lang = os.getenv("OCR_LANG", "eng")
+    if name == "auto":
+        try:
+            return TesserocrBackend(lang=lang)
+        except ImportError:
+            print("tesserocr is not installed, falling back to pytesseract")
+            return PytesseractBackend(lang=lang)
+        except RuntimeError as e:
+            print(
+                f"tesserocr failed to start ({e}), falling back to pytesseract"
+            )
+            return PytesseractBackend(lang=lang)
+    if name in BACKENDS:
+        return BACKENDS[name](lang=lang)
+    raise ValueError(f"Unknown OCR backend: {name}")
+
+
+def get_backend(name: str = None) -> OCRBackend:
+    """
+    Returns the long-lived OCR backend of the current worker, creating it on
+    first use.
+
+    Backends are kept per thread, since a Tesseract API handle must not be
+    shared between threads, so each pool worker loads its engine once and
+    reuses it for every image.
+
+    Parameters
+    ----------
+    name : str, optional
+        The backend to use: "pytesseract", "tesserocr", or "auto" to use
+        tesserocr when it is installed (default is the `OCR_BACKEND`
+        environment variable, or "pytesseract" when unset).
+
+    Returns
+    -------
+    OCRBackend
+        The backend instance.
+
+    Raises
+    ------
+    ValueError
+        If the backend name is unknown.
+    """
+    name = name or os.getenv("OCR_BACKEND", PytesseractBackend.name)
+    backends = _local.__dict__.setdefault("backends", {})
+    if name not in backends:
+        backends[name] = _create_backend(name)
+    return backends[name]
+
+
+def engine_version(name: str = None) -> str:
+    """
+    Describes the OCR engine a backend runs, without creating the backend.
+
+    The description changes whenever the engine, its version or its language
+    changes, so it can key results computed with it.
+
+    Parameters
+    ----------
+    name : str, optional
+        The backend name, as accepted by `get_backend` (default is the
+        `OCR_BACKEND` environment variable, or "pytesseract" when unset).
+
+    Returns
+    -------
+    str
+        The backend name and the Tesseract version and language it uses.
+    """
+    return _engine_version(
+        name or os.getenv("OCR_BACKEND", PytesseractBackend.name),
+        os.getenv("OCR_LANG", "eng"),
+    )
+
+
+@lru_cache(maxsize=None)
+def _engine_version(name, lang):
+    if name in ("auto", TesserocrBackend.name):
+        try:
+            import tesserocr
+
+            version = tesserocr.tesseract_version().splitlines()[0]
+            return f"{TesserocrBackend.name} {version} {lang}"
+        except ImportError:
+            if name != "auto":
+                raise
+    elif name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    version = pytesseract.get_tesseract_version()
+    return f"{PytesseractBackend.name} {version} {lang}"
@@ -0,0 +1,186 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from commons.clients.redis_storage import RedisStorage
+from commons.entities.bounding_box_batch import BoundingBoxBatch, as_batch
+from PerformOCR.src.backends import engine_version
+from PerformOCR.src.preprocessing import PreprocessConfig
+from PerformOCR.src.streaming import StreamingConfig
+from PerformOCR.src.tiling import TilingConfig
+
+# Bump when the cached data or the way boxes are computed changes, to ignore
+# older entries
+CACHE_FORMAT = "3"
+
+
+def ocr_fingerprint() -> str:
+    """
+    Describes everything besides the image that determines the OCR result: the
+    engine and its version and language, and the preprocessing, tiling and
+    streaming settings. Streamed images are recognized band by band, with
+    their block numbers offset per band, so their results differ from those
+    of whole images.
+
+    Returns
+    -------
+    str
+        The fingerprint of the current OCR configuration.
+    """
+    return "|".join(
+        (
+            CACHE_FORMAT,
+            engine_version(),
+            repr(PreprocessConfig.from_env()),
+            repr(TilingConfig.from_env()),
+            repr(StreamingConfig.from_env()),
+        )
+    )
+
+
+class OCRCache:
+    """
+    A content-addressed cache of OCR results, keyed by a hash of the image
+    bytes and the OCR configuration.
+
+    Lookups go through an in-process LRU tier, then through an optional shared
+    tier in Redis, so that replicas reuse each other's results. Entries found
+    in the shared tier are copied into the local one. The shared tier is best
+    effort: its errors are printed and treated as misses.
+
+    """
+
+    DATA_TYPE = "ocr_boxes"
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        storage: RedisStorage = None,
+        fingerprint: str = None,
+    ):
+        """
+        Initializes the OCRCache.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The number of results kept in process (default is 1024). 0 disables
+            the local tier.
+        storage : RedisStorage, optional
+            The storage of the shared tier, whose TTL applies to cached results
+            (default is None, no shared tier).
+        fingerprint : str, optional
+            The OCR configuration the results are computed with (default is
+            `ocr_fingerprint()`).
+        """
+        self.max_entries = max_entries
+        self.storage = storage
+        self._fingerprint = (fingerprint or ocr_fingerprint()).encode()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def key(self, image_data: bytes) -> str:
+        """
+        Computes the cache key of an image.
+
+        The pages of a multi-page document are cached under the key of the
+        document followed by ":<page>".
+
+        Parameters
+        ----------
+        image_data : bytes
+            The raw image bytes.
+
+        Returns
+        -------
+        str
+            The cache key.
+        """
+        digest = hashlib.blake2b(self._fingerprint, digest_size=20)
+        digest.update(b"\x00")
+        digest.update(image_data)
+        return f"ocr_cache:{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[BoundingBoxBatch]:
+        """
+        Looks up the OCR result of a key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key, see `key`.
+
+        Returns
+        -------
+        BoundingBoxBatch or None
+            The cached bounding boxes, or None on a miss.
+        """
+        with self._lock:
+            boxes = self._entries.get(key)
+            if boxes is not None:
+                self._entries.move_to_end(key)
+                self._stats["local_hits"] += 1
+                return boxes.copy()
+
+        boxes = None
+        if self.storage is not None:
+            try:
+                boxes = self.storage.retrieve(key, self.DATA_TYPE)
+            except Exception as e:
+                print(f"Error reading the OCR cache: {e}")
+
+        with self._lock:
+            if boxes is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["shared_hits"] += 1
+            boxes = as_batch(boxes)
+            self._remember(key, boxes)
+        return boxes.copy()
+
+    def put(self, key: str, bounding_boxes: BoundingBoxBatch):
+        """
+        Caches the OCR result of a key in both tiers.
+
+        Parameters
+        ----------
+        key : str
+            The cache key, see `key`.
+        bounding_boxes : BoundingBoxBatch or list of TextBoundingBox
+            The bounding boxes detected in the image.
+        """
+        boxes = as_batch(bounding_boxes).copy()
+        with self._lock:
+            self._remember(key, boxes)
+        if self.storage is not None:
+            try:
+                self.storage.store(key, self.DATA_TYPE, boxes)
+            except Exception as e:
+                print(f"Error writing the OCR cache: {e}")
+
+    def _remember(self, key, boxes):
+        if not self.max_entries:
+            return
+        self._entries[key] = boxes
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters of the cache since it was created.
+
+        Returns
+        -------
+        dict
+            The number of "hits", split into "local_hits" and "shared_hits",
+            the number of "misses", and the number of results currently held in
+            process ("entries").
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["hits"] = stats["local_hits"] + stats["shared_hits"]
+        return stats
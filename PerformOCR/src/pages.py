@@ -0,0 +1,165 @@
+import io
+from typing import Iterator, Optional
+
+from PIL import Image
+
+from commons.entities.bounding_box_batch import BoundingBoxBatch
+from PerformOCR.src.utils import detect_text
+
+try:
+    import pypdfium2
+except ImportError:  # pragma: no cover - depends on the environment
+    pypdfium2 = None
+
+PDF_MAGIC = b"%PDF-"
+# Little and big endian, classic and BigTIFF
+TIFF_MAGICS = (b"II*\x00", b"MM\x00*", b"II+\x00", b"MM\x00+")
+# Resolution at which PDF pages are rendered for OCR
+PDF_DPI = 300
+
+
+def is_pdf(data: bytes) -> bool:
+    """Returns whether the data is a PDF file."""
+    # The header may follow a few bytes of garbage, which readers tolerate
+    return PDF_MAGIC in data[:1024]
+
+
+def _open_pdf(data):
+    if pypdfium2 is None:
+        raise ImportError("pypdfium2 is required to OCR PDF files")
+    return pypdfium2.PdfDocument(data)
+
+
+def count_pages(data: bytes) -> int:
+    """
+    Counts the pages of a document without decoding them.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw bytes of a PDF file, a (multi-page) TIFF file, or any other
+        image, which has a single page.
+
+    Returns
+    -------
+    int
+        The number of pages.
+    """
+    if is_pdf(data):
+        pdf = _open_pdf(data)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    if data[:4] in TIFF_MAGICS:
+        with Image.open(io.BytesIO(data)) as image:
+            return getattr(image, "n_frames", 1)
+    return 1
+
+
+def document_pages(data: bytes) -> Optional[int]:
+    """
+    Tells documents to be processed page by page from plain images.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw bytes of the image or document.
+
+    Returns
+    -------
+    int or None
+        The number of pages of a PDF file or multi-page TIFF file, or None for
+        any other image, which `detect_text` processes as a whole.
+    """
+    if is_pdf(data):
+        return count_pages(data)
+    page_count = count_pages(data)
+    return page_count if page_count > 1 else None
+
+
+def load_page(data: bytes, index: int) -> Image.Image:
+    """
+    Decodes one page of a document.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw bytes of the document, see `count_pages`.
+    index : int
+        The index of the page, from 0.
+
+    Returns
+    -------
+    PIL.Image.Image
+        The page, which the caller must close.
+    """
+    if is_pdf(data):
+        pdf = _open_pdf(data)
+        try:
+            page = pdf[index]
+            try:
+                return page.render(scale=PDF_DPI / 72).to_pil()
+            finally:
+                page.close()
+        finally:
+            pdf.close()
+
+    image = Image.open(io.BytesIO(data))
+    if index:
+        image.seek(index)
+    return image
+
+
+def iter_pages(data: bytes) -> Iterator[Image.Image]:
+    """
+    Decodes the pages of a document one at a time.
+
+    Pages are decoded lazily, as the generator is advanced, and each page is
+    closed once the next one is requested, so only one page is held in memory
+    at a time.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw bytes of the document, see `count_pages`.
+
+    Yields
+    ------
+    PIL.Image.Image
+        Each page of the document, in order.
+    """
+    for index in range(count_pages(data)):
+        page = load_page(data, index)
+        try:
+            yield page
+        finally:
+            page.close()
+
+
+def detect_page(data: bytes, index: int) -> BoundingBoxBatch:
+    """
+    Detects text in one page of a document. See `detect_text`.
+
+    Only the raw document bytes and the page index are passed, so the page is
+    decoded in the process that runs OCR on it, and each OCR worker holds a
+    single page in memory.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw bytes of the document, see `count_pages`.
+    index : int
+        The index of the page, from 0.
+
+    Returns
+    -------
+    BoundingBoxBatch
+        The bounding boxes of the text detected in the page.
+    """
+    page = load_page(data, index)
+    try:
+        return detect_text(page)
+    finally:
+        page.close()
@@ -0,0 +1,221 @@
+import math
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+
+# EXIF orientation values, as handled by `ImageOps.exif_transpose`
+_EXIF_ORIENTATION = 0x0112
+
+# How to undo the transpose applied for each EXIF orientation: whether it
+# swapped the axes, then whether it flipped the x and y axes of the original
+_UNDO_ORIENTATION = {
+    1: (False, False, False),
+    2: (False, True, False),
+    3: (False, True, True),
+    4: (False, False, True),
+    5: (True, False, False),
+    6: (True, False, True),
+    7: (True, True, True),
+    8: (True, True, False),
+}
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    """
+    Settings of the preprocessing stage that runs before OCR.
+
+    exif_transpose: rotate/flip the image upright according to its EXIF
+        orientation.
+    grayscale: convert the image to 8-bit grayscale.
+    target_dpi: downscale images whose DPI metadata is higher than this.
+    max_pixels: downscale images with more pixels than this.
+    binarize_threshold: turn the (grayscale) image black and white at this
+        level, from 0 to 255.
+    """
+
+    exif_transpose: bool = True
+    grayscale: bool = True
+    target_dpi: Optional[int] = None
+    max_pixels: Optional[int] = None
+    binarize_threshold: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["PreprocessConfig"]:
+        """
+        Reads the preprocessing settings from the environment.
+
+        Preprocessing is enabled by `OCR_PREPROCESS=1`, and tuned by
+        `OCR_TARGET_DPI`, `OCR_MAX_PIXELS` and `OCR_BINARIZE_THRESHOLD`.
+
+        Returns
+        -------
+        PreprocessConfig or None
+            The settings, or None when preprocessing is disabled.
+        """
+        if os.getenv("OCR_PREPROCESS", "0").lower() not in ("1", "true"):
+            return None
+
+        def optional_int(name):
+            value = os.getenv(name)
+            return int(value) if value else None
+
+        return cls(
+            target_dpi=optional_int("OCR_TARGET_DPI"),
+            max_pixels=optional_int("OCR_MAX_PIXELS"),
+            binarize_threshold=optional_int("OCR_BINARIZE_THRESHOLD"),
+        )
+
+
+@dataclass(frozen=True)
+class Transform:
+    """
+    The geometric changes made by `preprocess`, used to map boxes back into the
+    original image.
+
+    size: the (width, height) of the original image, before any change.
+    orientation: the EXIF orientation that was undone (1 when the image was not
+        rotated or flipped).
+    scale: the factor by which the upright image was resized.
+    """
+
+    size: Tuple[int, int]
+    orientation: int = 1
+    scale: float = 1.0
+
+    def to_original(
+        self, left, top, right, bottom
+    ) -> Tuple[int, int, int, int]:
+        """
+        Maps a box of the preprocessed image back into the original image.
+
+        Parameters
+        ----------
+        left, top, right, bottom : int
+            The box coordinates in the preprocessed image.
+
+        Returns
+        -------
+        tuple of int
+            The `(left, top, right, bottom)` coordinates of the box in the
+            original image.
+        """
+        columns = self.columns_to_original([left], [top], [right], [bottom])
+        return tuple(column[0] for column in columns)
+
+    def columns_to_original(
+        self,
+        left: Sequence[int],
+        top: Sequence[int],
+        right: Sequence[int],
+        bottom: Sequence[int],
+    ) -> Tuple[List[int], List[int], List[int], List[int]]:
+        """
+        Maps many boxes of the preprocessed image back into the original
+        image, given column by column.
+
+        Parameters
+        ----------
+        left, top, right, bottom : sequence of int
+            The coordinates of the boxes in the preprocessed image.
+
+        Returns
+        -------
+        tuple of list of int
+            The `left`, `top`, `right` and `bottom` columns of the boxes in
+            the original image.
+        """
+        width, height = self.size
+        swap, flip_x, flip_y = _UNDO_ORIENTATION.get(
+            self.orientation, (False, False, False)
+        )
+        if swap:
+            left, top, right, bottom = top, left, bottom, right
+        left, right = self._axis(left, right, width, flip_x)
+        top, bottom = self._axis(top, bottom, height, flip_y)
+        return left, top, right, bottom
+
+    def _axis(self, low, high, size, flip):
+        # Scales the two edges of the boxes along an axis back, flipping it
+        # if the transpose did, then rounds and clamps them to the image
+        scale = self.scale
+        if flip:
+            low, high = (
+                [size - value / scale for value in high],
+                [size - value / scale for value in low],
+            )
+        else:
+            low = [value / scale for value in low]
+            high = [value / scale for value in high]
+        return (
+            [min(max(round(value), 0), size) for value in low],
+            [min(max(round(value), 0), size) for value in high],
+        )
+
+
+def preprocess(
+    image: Image.Image, config: PreprocessConfig
+) -> Tuple[Image.Image, Transform]:
+    """
+    Prepares an image for OCR: fixes its orientation, converts it to grayscale,
+    downscales and binarizes it.
+
+    Tesseract's run time grows with the number of pixels and channels, so
+    converting to grayscale and downscaling large photos makes OCR faster,
+    usually at little cost in accuracy while text stays legible.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The original image. It is not modified.
+    config : PreprocessConfig
+        The preprocessing settings.
+
+    Returns
+    -------
+    tuple of (PIL.Image.Image, Transform)
+        The preprocessed image, which may be `image` itself when nothing had to
+        change, and the transform to map boxes back into the original image.
+    """
+    size = image.size
+    dpi = image.info.get("dpi")
+    orientation = 1
+    if config.exif_transpose:
+        orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+        if orientation != 1:
+            image = ImageOps.exif_transpose(image)
+
+    if config.grayscale and image.mode != "L":
+        if "A" in image.getbands() or "transparency" in image.info:
+            # Flatten transparent areas onto white, as viewers show them,
+            # instead of the black of their pixels
+            background = Image.new("RGBA", image.size, "white")
+            image = Image.alpha_composite(background, image.convert("RGBA"))
+        image = image.convert("L")
+
+    scale = 1.0
+    if config.target_dpi and dpi and dpi[0] > config.target_dpi:
+        scale = config.target_dpi / float(dpi[0])
+    if config.max_pixels:
+        pixels = image.width * image.height
+        scale = min(scale, math.sqrt(config.max_pixels / pixels))
+    if scale < 1.0:
+        upright_width = image.width
+        new_size = (
+            max(1, round(image.width * scale)),
+            max(1, round(image.height * scale)),
+        )
+        image = image.resize(
+            new_size, Image.Resampling.BILINEAR, reducing_gap=2.0
+        )
+        scale = new_size[0] / upright_width
+
+    if config.binarize_threshold is not None:
+        threshold = config.binarize_threshold
+        if image.mode != "L":
+            image = image.convert("L")
+        image = image.point([255 if p > threshold else 0 for p in range(256)])
+
+    return image, Transform(size=size, orientation=orientation, scale=scale)
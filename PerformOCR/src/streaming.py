@@ -0,0 +1,173 @@
+import os
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from commons.entities.bounding_box_batch import BoundingBoxBatch, as_batch
+
+
+@dataclass(frozen=True)
+class StreamingConfig:
+    """
+    Settings of the streamed OCR of an image, band by band.
+
+    band_height: the target height of a band, in pixels.
+    min_gap: the number of consecutive blank rows a band boundary is placed in,
+        so that no text line is cut.
+    ink_threshold: pixels darker than this gray level are ink. Rows with no
+        more ink than the clearest row of the image are blank.
+    min_contrast: bands whose gray levels span less than this are blank and
+        not recognized.
+    """
+
+    band_height: int = 512
+    min_gap: int = 4
+    ink_threshold: int = 128
+    min_contrast: int = 16
+
+    @classmethod
+    def from_env(cls) -> Optional["StreamingConfig"]:
+        """
+        Reads the streaming settings from the environment.
+
+        Streaming is enabled by `OCR_STREAMING=1`, and tuned by
+        `OCR_STREAM_BAND_HEIGHT`.
+
+        Returns
+        -------
+        StreamingConfig or None
+            The settings, or None when streaming is disabled.
+        """
+        if os.getenv("OCR_STREAMING", "0").lower() not in ("1", "true"):
+            return None
+        band_height = os.getenv("OCR_STREAM_BAND_HEIGHT")
+        if band_height:
+            return cls(band_height=int(band_height))
+        return cls()
+
+
+def _ink_profile(image, ink_threshold) -> List[int]:
+    """
+    Helper to measure the share of ink (pixels darker than `ink_threshold`) of
+    every row, from 0 to 255.
+    """
+    with image.point(lambda v: 255 if v < ink_threshold else 0) as ink:
+        with ink.resize((1, image.height), Image.BOX) as profile:
+            return list(profile.tobytes())
+
+
+def _cut(profile, target, config) -> Optional[int]:
+    """
+    Helper to find the middle of the gap of blank rows closest to `target`,
+    within half a band of it.
+    """
+    top = max(0, target - config.band_height // 2)
+    bottom = min(len(profile), target + config.band_height // 2)
+    # Rows as clear as the clearest one are blank, which tolerates borders and
+    # scanner edges
+    baseline = min(profile)
+
+    best, gap_start = None, None
+    for row in range(top, bottom + 1):
+        if row < bottom and profile[row] <= baseline:
+            if gap_start is None:
+                gap_start = row
+            continue
+        if gap_start is not None and row - gap_start >= config.min_gap:
+            middle = (gap_start + row) // 2
+            if best is None or abs(middle - target) < abs(best - target):
+                best = middle
+        gap_start = None
+    return best
+
+
+def band_regions(
+    image: Image.Image, config: StreamingConfig
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Splits an image into horizontal bands of about `band_height` pixels, cut
+    across blank rows only.
+
+    A boundary that falls in text is moved to the closest gap of at least
+    `min_gap` blank rows. When there is no such gap within half a band, the
+    band is merged with the next one, so a word is never split between bands.
+    Images shorter than two bands are not split.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The image to split, in the grayscale or color mode it is recognized in.
+    config : StreamingConfig
+        The streaming settings.
+
+    Returns
+    -------
+    list of tuple of (int, int, int, int)
+        The (left, top, right, bottom) box of each band, from top to bottom.
+    """
+    if image.height < 2 * config.band_height:
+        return [(0, 0, image.width, image.height)]
+    gray = image if image.mode == "L" else image.convert("L")
+    try:
+        profile = _ink_profile(gray, config.ink_threshold)
+    finally:
+        if gray is not image:
+            gray.close()
+
+    cuts = [0]
+    target = config.band_height
+    while target < image.height - config.band_height // 2:
+        cut = _cut(profile, target, config)
+        if cut is not None and cut > cuts[-1]:
+            cuts.append(cut)
+            target = cut + config.band_height
+        else:
+            target += config.band_height
+    cuts.append(image.height)
+    return [
+        (0, top, image.width, bottom) for top, bottom in zip(cuts, cuts[1:])
+    ]
+
+
+def detect_bands(
+    image: Image.Image,
+    regions: List[Tuple[int, int, int, int]],
+    recognize: Callable[[Image.Image], BoundingBoxBatch],
+    min_contrast: int = 16,
+) -> Iterator[BoundingBoxBatch]:
+    """
+    Recognizes an image band by band, yielding the boxes of each band as soon
+    as it is recognized.
+
+    Box coordinates are offset back into the image, blank bands are not
+    recognized, and block numbers are renumbered so that blocks of different
+    bands stay apart, like in `detect_tiled`.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The image to recognize.
+    regions : list of tuple of (int, int, int, int)
+        The bands, see `band_regions`.
+    recognize : callable
+        The OCR of one band, returning its boxes in band coordinates.
+    min_contrast : int, optional
+        Bands whose gray levels span less than this are blank and not
+        recognized (default is 16).
+
+    Yields
+    ------
+    BoundingBoxBatch
+        The boxes of each band, in order. Blank bands yield an empty batch.
+    """
+    block_offset = 0
+    for left, top, right, bottom in regions:
+        band = image.crop((left, top, right, bottom))
+        try:
+            low, high = band.convert("L").getextrema()
+            boxes = recognize(band) if high - low >= min_contrast else []
+        finally:
+            band.close()
+        yield as_batch(boxes).translate(left, top, block_offset)
+        block_offset += max((box.block_num or 0 for box in boxes), default=0)
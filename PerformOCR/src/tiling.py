@@ -0,0 +1,264 @@
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from PIL import Image
+
+from commons.entities.bounding_box_batch import BoundingBoxBatch, as_batch
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class TilingConfig:
+    """
+    Settings of the tiled OCR of large images.
+
+    tile_size: the maximum width and height of a tile, in pixels.
+    overlap: the number of pixels shared by neighbouring tiles. It should
+        exceed the size of the largest word, so that every word lies whole in
+        at least one tile.
+    min_pixels: only images with more pixels than this are tiled.
+    workers: the number of tiles recognized at once (default is the number of
+        CPUs).
+    min_contrast: tiles whose gray levels span less than this are blank and
+        skipped.
+    """
+
+    tile_size: int = 2048
+    overlap: int = 256
+    min_pixels: int = 4_000_000
+    workers: Optional[int] = None
+    min_contrast: int = 16
+
+    @classmethod
+    def from_env(cls) -> Optional["TilingConfig"]:
+        """
+        Reads the tiling settings from the environment.
+
+        Tiling is enabled by `OCR_TILING=1`, and tuned by `OCR_TILE_SIZE`,
+        `OCR_TILE_OVERLAP`, `OCR_TILE_MIN_PIXELS` and `OCR_TILE_WORKERS`.
+
+        Returns
+        -------
+        TilingConfig or None
+            The settings, or None when tiling is disabled.
+        """
+        if os.getenv("OCR_TILING", "0").lower() not in ("1", "true"):
+            return None
+
+        overrides = {
+            field: int(os.getenv(name))
+            for field, name in (
+                ("tile_size", "OCR_TILE_SIZE"),
+                ("overlap", "OCR_TILE_OVERLAP"),
+                ("min_pixels", "OCR_TILE_MIN_PIXELS"),
+                ("workers", "OCR_TILE_WORKERS"),
+            )
+            if os.getenv(name)
+        }
+        return cls(**overrides)
+
+
+def _spans(length, tile_size, overlap) -> List[Tuple[int, int]]:
+    """
+    Helper to split a length into evenly spaced, overlapping spans of at most
+    `tile_size`.
+    """
+    if length <= tile_size:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (tile_size - overlap))
+    step = (length - overlap) / count
+    return [
+        (round(i * step), min(length, round((i + 1) * step + overlap)))
+        for i in range(count)
+    ]
+
+
+def tile_regions(
+    size: Tuple[int, int], tile_size: int, overlap: int
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Splits an image into overlapping tiles.
+
+    Parameters
+    ----------
+    size : tuple of int
+        The (width, height) of the image.
+    tile_size : int
+        The maximum width and height of a tile.
+    overlap : int
+        The number of pixels shared by neighbouring tiles.
+
+    Returns
+    -------
+    list of tuple of int
+        The `(left, top, right, bottom)` regions of the tiles, row by row.
+    """
+    width, height = size
+    return [
+        (left, top, right, bottom)
+        for top, bottom in _spans(height, tile_size, overlap)
+        for left, right in _spans(width, tile_size, overlap)
+    ]
+
+
+def _centrality(box, region, size):
+    """
+    Helper to measure how far the center of a box is from the edges its tile
+    shares with other tiles.
+    """
+    left, top, right, bottom = region
+    x = (box.left + box.right) / 2
+    y = (box.top + box.bottom) / 2
+    distances = [math.inf]
+    if left > 0:
+        distances.append(x - left)
+    if top > 0:
+        distances.append(y - top)
+    if right < size[0]:
+        distances.append(right - x)
+    if bottom < size[1]:
+        distances.append(bottom - y)
+    return min(distances)
+
+
+def _overlap_ratio(a, b):
+    """
+    Helper to compute the intersection of two boxes over the area of the
+    smaller one.
+    """
+    width = min(a.right, b.right) - max(a.left, b.left)
+    height = min(a.bottom, b.bottom) - max(a.top, b.top)
+    if width <= 0 or height <= 0:
+        return 0.0
+    smaller = min(
+        (a.right - a.left) * (a.bottom - a.top),
+        (b.right - b.left) * (b.bottom - b.top),
+    )
+    return width * height / max(smaller, 1)
+
+
+def _deduplicate(tiles, size, overlap, threshold=0.5):
+    """
+    Helper to drop the copies of words recognized in more than one tile.
+
+    Of overlapping boxes from different tiles, the one farthest from its tile's
+    inner edges is kept: it is the least likely to be a word cut by the tile
+    border, and all words of a text line agree on it.
+    """
+    candidates = sorted(
+        (
+            (-_centrality(box, region, size), tile, index, box)
+            for tile, (region, boxes) in enumerate(tiles)
+            for index, box in enumerate(boxes)
+        ),
+        key=lambda candidate: candidate[:3],
+    )
+
+    cell = max(overlap, 1)
+    grid = {}
+    kept = set()
+    for _, tile, index, box in candidates:
+        cells = [
+            (x, y)
+            for x in range(box.left // cell, box.right // cell + 1)
+            for y in range(box.top // cell, box.bottom // cell + 1)
+        ]
+        if any(
+            other_tile != tile and _overlap_ratio(box, other) > threshold
+            for key in cells
+            for other_tile, other in grid.get(key, ())
+        ):
+            continue
+        for key in cells:
+            grid.setdefault(key, []).append((tile, box))
+        kept.add((tile, index))
+
+    return BoundingBoxBatch.concat(
+        as_batch(boxes).compress(
+            [(tile, index) in kept for index in range(len(boxes))]
+        )
+        for tile, (_, boxes) in enumerate(tiles)
+    )
+
+
+def _get_executor(workers):
+    # Executors are kept per size, so their threads and the OCR backend each
+    # thread loads are reused
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="ocr-tile"
+            )
+        return _executors[workers]
+
+
+def detect_tiled(
+    image: Image.Image,
+    recognize: Callable[[Image.Image], BoundingBoxBatch],
+    config: TilingConfig,
+    parallel: bool = True,
+) -> BoundingBoxBatch:
+    """
+    Recognizes a large image tile by tile, in parallel, and merges the boxes.
+
+    Tesseract recognizes an image on a single core, so splitting a large page
+    lets its OCR use all of them. Blank tiles are skipped. Box coordinates are
+    offset back into the image, words found in two tiles are kept once, and
+    block numbers are renumbered so that blocks of different tiles stay apart.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The image to recognize.
+    recognize : callable
+        The OCR of one tile, returning its boxes in tile coordinates. It is
+        called from worker threads.
+    config : TilingConfig
+        The tiling settings.
+    parallel : bool, optional
+        Whether tiles are recognized in worker threads, rather than one after
+        the other (default is True).
+
+    Returns
+    -------
+    BoundingBoxBatch
+        The boxes of the whole image, tile by tile.
+    """
+
+    def recognize_region(region):
+        tile = image.crop(region)
+        try:
+            low, high = tile.convert("L").getextrema()
+            if high - low < config.min_contrast:
+                return []
+            return recognize(tile)
+        finally:
+            tile.close()
+
+    regions = tile_regions(image.size, config.tile_size, config.overlap)
+    # Load the image once, before threads crop it concurrently
+    image.load()
+    if parallel and len(regions) > 1:
+        executor = _get_executor(config.workers or os.cpu_count())
+        results = list(executor.map(recognize_region, regions))
+    else:
+        results = [recognize_region(region) for region in regions]
+
+    tiles = []
+    block_offset = 0
+    for (left, top, right, bottom), boxes in zip(regions, results):
+        tiles.append(
+            (
+                (left, top, right, bottom),
+                as_batch(boxes).translate(left, top, block_offset),
+            )
+        )
+        block_offset += max((box.block_num or 0 for box in boxes), default=0)
+
+    return _deduplicate(tiles, image.size, config.overlap)
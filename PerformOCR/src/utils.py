@@ -1,55 +1,229 @@
 import io
+from array import array
+from typing import Iterator, Tuple, Union
 
-import pytesseract
 from PIL import Image
 
-from commons.entities.text_bounding_box import TextBoundingBox
+from commons.entities.bounding_box_batch import BoundingBoxBatch
+from commons.metrics import REGISTRY
+from PerformOCR.src.backends import OCRBackend, get_backend
+from PerformOCR.src.preprocessing import PreprocessConfig, preprocess
+from PerformOCR.src.streaming import (
+    StreamingConfig,
+    band_regions,
+    detect_bands,
+)
+from PerformOCR.src.tiling import TilingConfig, detect_tiled
 
+_DEFAULT = object()
 
-def detect_text(image: bytes) -> list[TextBoundingBox]:
+# The histogram the stages of the OCR of an image are recorded in, next to the
+# stages of PerformOCRService
+STAGE_METRIC = "ocr_stage_seconds"
+
+
+def run_with_timings(fn, *args):
     """
-    Detects text in an image and returns a list of TextBoundingBox objects.
+    Runs OCR in a pool worker, returning its result along with the stage
+    timings the worker recorded.
 
-    This function takes an image as a byte array, processes it using Tesseract OCR,
-    and returns a list of bounding boxes that contain the detected text, along with
-    their coordinates (left, right, top, bottom).
+    The registry of a worker process is not exported, so its histograms are
+    sent back to be merged into the registry of the service. Timings of a
+    call that raises are sent back with the next call of the same worker.
 
     Parameters
     ----------
-    image : bytes
-        A byte representation of an image file, typically the result of reading an image file in binary mode.
+    fn : callable
+        The OCR function to run, e.g. `detect_text`.
+    *args
+        The arguments of `fn`.
 
     Returns
     -------
-    list of TextBoundingBox
-        A list of `TextBoundingBox` objects, each representing a detected text element and its bounding box coordinates
-        within the image.
+    tuple
+        The result of `fn`, and the histograms returned by
+        `REGISTRY.pop_histograms`.
     """
-    try:
-        # Convert bytes to an image
+    result = fn(*args)
+    return result, REGISTRY.pop_histograms()
+
+
+def _open(image):
+    """
+    Helper to open and decode an image given as bytes, recording the time it
+    takes.
+    """
+    with REGISTRY.time(STAGE_METRIC, stage="image_open"):
         img = Image.open(io.BytesIO(image))
+        img.load()
+    return img
 
-        # Run OCR using Tesseract
-        ocr_data = pytesseract.image_to_data(
-            img, output_type=pytesseract.Output.DICT
-        )
 
-        # List to hold TextBoundingBox instances
-        bounding_boxes = []
+def detect_text(
+    image: Union[bytes, Image.Image],
+    backend: OCRBackend = None,
+    preprocess_config: PreprocessConfig = _DEFAULT,
+    tiling_config: TilingConfig = _DEFAULT,
+) -> BoundingBoxBatch:
+    """
+    Detects text in an image and returns its bounding boxes.
 
-        # Iterate through the detected text data and extract bounding boxes
-        for i in range(len(ocr_data["text"])):
-            if ocr_data["text"][i].strip():
-                bounding_box = TextBoundingBox(
-                    text=ocr_data["text"][i],
-                    left=ocr_data["left"][i],
-                    top=ocr_data["top"][i],
-                    right=ocr_data["left"][i] + ocr_data["width"][i],
-                    bottom=ocr_data["top"][i] + ocr_data["height"][i],
-                )
-                bounding_boxes.append(bounding_box)
+    This function takes an image as a byte array, processes it using Tesseract
+    OCR, and returns a list of bounding boxes that contain the detected text,
+    along with their coordinates (left, right, top, bottom) and their block,
+    paragraph, line and word numbers.
 
-        return bounding_boxes
+    Parameters
+    ----------
+    image : bytes or PIL.Image.Image
+        A byte representation of an image file, typically the result of reading
+        an image file in binary mode, or an already opened image.
+    backend : OCRBackend, optional
+        The OCR engine to use (default is the long-lived backend of the current
+        worker, see `get_backend`).
+    preprocess_config : PreprocessConfig or None, optional
+        The preprocessing to apply before OCR (default is the configuration
+        read from the environment by `PreprocessConfig.from_env`). None
+        disables preprocessing. Box coordinates always refer to the original
+        image.
+    tiling_config : TilingConfig or None, optional
+        How to split large images into tiles recognized in parallel (default is
+        the configuration read from the environment by
+        `TilingConfig.from_env`). None disables tiling. Tiles are recognized by
+        the backend of each worker thread, or one after the other when
+        `backend` is given, since it may not be thread-safe.
+
+    Returns
+    -------
+    BoundingBoxBatch
+        The bounding boxes of the detected text elements, stored column by
+        column, each with its coordinates within the image. Its rows have the
+        attributes of `TextBoundingBox`.
+    """
+    if preprocess_config is _DEFAULT:
+        preprocess_config = PreprocessConfig.from_env()
+    if tiling_config is _DEFAULT:
+        tiling_config = TilingConfig.from_env()
+
+    # Convert bytes to an image
+    opened = not isinstance(image, Image.Image)
+    img = _open(image) if opened else image
+
+    ocr_img, transform = img, None
+    try:
+        if preprocess_config is not None:
+            with REGISTRY.time(STAGE_METRIC, stage="preprocess"):
+                ocr_img, transform = preprocess(img, preprocess_config)
+
+        if tiling_config is not None and (
+            ocr_img.width * ocr_img.height > tiling_config.min_pixels
+        ):
+            bounding_boxes = detect_tiled(
+                ocr_img,
+                lambda tile: _recognize(tile, backend or get_backend()),
+                tiling_config,
+                parallel=backend is None,
+            )
+        else:
+            bounding_boxes = _recognize(ocr_img, backend or get_backend())
+
+        return _to_original(bounding_boxes, transform)
 
     finally:
-        img.close()
+        if ocr_img is not img:
+            ocr_img.close()
+        if opened:
+            img.close()
+
+
+def detect_text_chunks(
+    image: Union[bytes, Image.Image],
+    streaming_config: StreamingConfig,
+    backend: OCRBackend = None,
+    preprocess_config: PreprocessConfig = _DEFAULT,
+) -> Iterator[Tuple[int, BoundingBoxBatch]]:
+    """
+    Detects text in an image band by band, yielding the bounding boxes of each
+    band as soon as it is recognized.
+
+    The image is split into horizontal bands across blank rows (see
+    `band_regions`), so the first boxes are available after the OCR of the
+    first band rather than of the whole image. Bands are recognized one after
+    the other, without tiling.
+
+    Parameters
+    ----------
+    image : bytes or PIL.Image.Image
+        A byte representation of an image file, or an already opened image.
+    streaming_config : StreamingConfig
+        How to split the image into bands.
+    backend : OCRBackend, optional
+        The OCR engine to use (default is the long-lived backend of the current
+        worker, see `get_backend`).
+    preprocess_config : PreprocessConfig or None, optional
+        The preprocessing to apply before OCR, see `detect_text`.
+
+    Yields
+    ------
+    tuple of (int, BoundingBoxBatch)
+        The number of bands, known before the first one is recognized, and the
+        bounding boxes of each band, in order and in the coordinates of the
+        original image.
+    """
+    if preprocess_config is _DEFAULT:
+        preprocess_config = PreprocessConfig.from_env()
+
+    opened = not isinstance(image, Image.Image)
+    img = _open(image) if opened else image
+
+    ocr_img, transform = img, None
+    try:
+        if preprocess_config is not None:
+            with REGISTRY.time(STAGE_METRIC, stage="preprocess"):
+                ocr_img, transform = preprocess(img, preprocess_config)
+
+        regions = band_regions(ocr_img, streaming_config)
+        for bounding_boxes in detect_bands(
+            ocr_img,
+            regions,
+            lambda band: _recognize(band, backend or get_backend()),
+            streaming_config.min_contrast,
+        ):
+            yield len(regions), _to_original(bounding_boxes, transform)
+
+    finally:
+        if ocr_img is not img:
+            ocr_img.close()
+        if opened:
+            img.close()
+
+
+def _to_original(bounding_boxes, transform):
+    """
+    Helper to map the bounding boxes found in a preprocessed image back to
+    the original image, a whole column of coordinates at a time.
+    """
+    if transform is not None:
+        columns = bounding_boxes.columns
+        mapped = transform.columns_to_original(
+            columns["left"],
+            columns["top"],
+            columns["right"],
+            columns["bottom"],
+        )
+        for name, column in zip(("left", "top", "right", "bottom"), mapped):
+            columns[name] = array("q", column)
+    return bounding_boxes
+
+
+def _recognize(image, backend) -> BoundingBoxBatch:
+    """
+    Helper to run OCR on an image and turn the words it finds into bounding
+    boxes.
+    """
+    # Run OCR using Tesseract
+    with REGISTRY.time(STAGE_METRIC, stage="recognize"):
+        ocr_data = backend.image_to_data(image)
+
+    # Build the boxes column by column, skipping blank words
+    return BoundingBoxBatch.from_ocr_data(ocr_data)
@@ -0,0 +1,125 @@
+"""
+Micro-benchmarks of `detect_text`, split into its stages: decoding the image,
+running the OCR engine and building the bounding boxes from its output, then
+the whole call.
+
+The OCR benchmarks run every backend installed side by side in the same group.
+Box construction is measured on the engine output recorded once, so its figures
+do not depend on the engine.
+
+Usage: python -m pytest benchmarks/micro -o python_files="bench_*.py"
+    --benchmark-only [-k detect_text]
+"""
+
+import io
+
+import pytesseract
+import pytest
+from PIL import Image
+
+from PerformOCR.src.backends import OCRBackend, get_backend
+from PerformOCR.src.utils import _open, _recognize, detect_text
+
+BACKENDS = ["pytesseract", "tesserocr"]
+
+
+class RecordedBackend(OCRBackend):
+    """
+    A backend replaying the output of a real engine, to measure what
+    `detect_text` does around it.
+    """
+
+    name = "recorded"
+
+    def __init__(self, ocr_data):
+        self.ocr_data = ocr_data
+
+    def image_to_data(self, image):
+        return self.ocr_data
+
+
+@pytest.fixture(scope="module")
+def engines():
+    """
+    Every backend by name, or the error raised setting it up: pytesseract
+    needs the `tesseract` binary, tesserocr the module and its language data.
+    """
+    engines = {}
+    for name in BACKENDS:
+        try:
+            engine = get_backend(name)
+            engine.image_to_data(Image.new("L", (32, 32), 255))
+        except (
+            ImportError,
+            RuntimeError,
+            pytesseract.TesseractNotFoundError,
+        ) as error:
+            engine = error
+        engines[name] = engine
+    return engines
+
+
+def _backend(engines, name):
+    if isinstance(engines[name], Exception):
+        pytest.skip(f"{name} is unavailable: {engines[name]!r}")
+    return engines[name]
+
+
+@pytest.fixture(scope="module")
+def ocr_data(engines, receipt_png):
+    available = [
+        engine
+        for engine in engines.values()
+        if not isinstance(engine, Exception)
+    ]
+    if not available:
+        pytest.skip("No OCR backend is available")
+    with Image.open(io.BytesIO(receipt_png)) as image:
+        return available[0].image_to_data(image)
+
+
+@pytest.mark.parametrize("image_format", ["png", "jpeg"])
+def test_decode(benchmark, request, image_format):
+    image = request.getfixturevalue(f"receipt_{image_format}")
+    benchmark.group = "detect_text decode"
+
+    benchmark(_open, image)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ocr(benchmark, engines, receipt_png, backend):
+    engine = _backend(engines, backend)
+    image = _open(receipt_png)
+    benchmark.group = "detect_text ocr"
+
+    ocr_data = benchmark.pedantic(
+        engine.image_to_data, args=(image,), rounds=5, warmup_rounds=1
+    )
+    assert any(text.strip() for text in ocr_data["text"])
+
+
+def test_boxes(benchmark, receipt_png, ocr_data):
+    image = _open(receipt_png)
+    benchmark.group = "detect_text boxes"
+
+    boxes = benchmark(_recognize, image, RecordedBackend(ocr_data))
+    assert boxes
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_detect_text(benchmark, engines, receipt_png, backend):
+    engine = _backend(engines, backend)
+    benchmark.group = "detect_text end to end"
+
+    boxes = benchmark.pedantic(
+        detect_text,
+        args=(receipt_png,),
+        kwargs={
+            "backend": engine,
+            "preprocess_config": None,
+            "tiling_config": None,
+        },
+        rounds=5,
+        warmup_rounds=1,
+    )
+    assert boxes
@@ -0,0 +1,134 @@
+"""
+Micro-benchmarks of `FilterPIIService._filter_bounding_boxes`, across a grid of
+box counts and PII list sizes.
+
+Each cell of the grid is a benchmark group in which the implementations run
+side by side on the same inputs: the original substring scan of each word
+("naive"), and the service with each match mode, and with the built-in
+detectors. Matchers are compiled before timing, as they are cached by the
+service; compiling them is benchmarked on its own. Combinations whose estimated
+cost exceeds `MAX_WORK` are skipped for the slower implementations.
+
+Exact matching of short term lists, the usual traffic, is also checked against
+the naive scan: it must stay within `MAX_SLOWDOWN` of it, although it also
+matches terms across words. Fuzzy matching of thousands of terms must likewise
+stay within `MAX_FUZZY_SLOWDOWN` of exact matching.
+
+Usage: python -m pytest benchmarks/micro -o python_files="bench_*.py"
+    --benchmark-only [-k "1000-"]
+"""
+
+import timeit
+from functools import lru_cache
+from unittest import mock
+
+import pytest
+
+from benchmarks.micro.conftest import (
+    WORDS_PER_LINE,
+    make_boxes,
+    make_terms,
+)
+from FilterPII.src.app import FilterPIIService
+from FilterPII.src.detectors import DETECTORS
+from FilterPII.src.fuzzy import matcher_factory
+
+BOX_COUNTS = [10, 100, 1000, 10000]
+TERM_COUNTS = [1, 6, 100, 5000, 50000]
+
+# Box x term comparisons beyond which the quadratic implementations are not run
+MAX_WORK = {"naive": 5_000_000}
+
+# How much slower than the naive scan exact matching may be on short term lists
+MAX_SLOWDOWN = 5
+
+# How much slower than exact matching fuzzy matching may be on long term lists
+MAX_FUZZY_SLOWDOWN = 25
+
+
+@lru_cache(maxsize=None)
+def _service(match_mode, detectors=()):
+    with mock.patch("FilterPII.src.app.RabbitMQClient"):
+        return FilterPIIService(
+            match_mode=match_mode, detectors=list(detectors)
+        )
+
+
+def _naive(boxes, terms):
+    return [
+        box for box in boxes if not any(pii in box["text"] for pii in terms)
+    ]
+
+
+IMPLEMENTATIONS = {
+    "naive": None,
+    "exact": ("exact", ()),
+    "normalized": ("normalized", ()),
+    "fuzzy": ("fuzzy", ()),
+    "exact+detectors": ("exact", tuple(DETECTORS)),
+}
+
+
+@pytest.mark.parametrize("implementation", IMPLEMENTATIONS)
+@pytest.mark.parametrize("term_count", TERM_COUNTS)
+@pytest.mark.parametrize("box_count", BOX_COUNTS)
+def test_filter_bounding_boxes(
+    benchmark, box_count, term_count, implementation
+):
+    if box_count * term_count > MAX_WORK.get(implementation, float("inf")):
+        pytest.skip(f"{implementation} is too slow for this size")
+    terms = make_terms(term_count)
+    boxes = make_boxes(box_count, terms)
+    benchmark.group = f"filter {box_count} boxes x {term_count} terms"
+
+    if implementation == "naive":
+        # Compares terms with single words, so it misses the full names
+        benchmark(_naive, boxes, terms)
+        return
+    service = _service(*IMPLEMENTATIONS[implementation])
+    matcher = service.matchers.get(terms)
+    kept = benchmark(service._filter_bounding_boxes, boxes, terms, matcher)
+    # Names are printed from the tenth line on
+    assert len(kept) < len(boxes) or box_count < 10 * WORDS_PER_LINE
+
+
+@pytest.mark.parametrize("term_count", [1, 6])
+@pytest.mark.parametrize("box_count", [1000, 10000])
+def test_short_term_lists(benchmark, box_count, term_count):
+    terms = make_terms(term_count)
+    boxes = make_boxes(box_count, terms)
+    service = _service("exact")
+    matcher = service.matchers.get(terms)
+    benchmark.group = f"short term lists, {box_count} boxes x {term_count}"
+
+    benchmark(service._filter_bounding_boxes, boxes, terms, matcher)
+    naive = min(timeit.repeat(lambda: _naive(boxes, terms), number=1))
+    assert benchmark.stats.stats.min < MAX_SLOWDOWN * naive
+
+
+@pytest.mark.parametrize("term_count", [5000])
+def test_fuzzy_long_term_lists(benchmark, term_count):
+    terms = make_terms(term_count)
+    boxes = make_boxes(1000, terms)
+    fuzzy, exact = _service("fuzzy"), _service("exact")
+    matchers = fuzzy.matchers.get(terms), exact.matchers.get(terms)
+    benchmark.group = f"fuzzy long term lists, 1000 boxes x {term_count}"
+
+    benchmark(fuzzy._filter_bounding_boxes, boxes, terms, matchers[0])
+    baseline = min(
+        timeit.repeat(
+            lambda: exact._filter_bounding_boxes(boxes, terms, matchers[1]),
+            number=1,
+        )
+    )
+    assert benchmark.stats.stats.min < MAX_FUZZY_SLOWDOWN * baseline
+
+
+@pytest.mark.parametrize("match_mode", ["exact", "normalized", "fuzzy"])
+@pytest.mark.parametrize("term_count", TERM_COUNTS)
+def test_compile_matcher(benchmark, term_count, match_mode):
+    terms = make_terms(term_count)
+    factory = matcher_factory(match_mode)
+    benchmark.group = f"compile {term_count} terms"
+
+    benchmark.pedantic(factory, args=(terms,), rounds=3, iterations=1)
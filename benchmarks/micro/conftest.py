@@ -0,0 +1,89 @@
+"""
+Generated fixtures of the micro-benchmarks: receipt images, and OCR results and
+PII lists of any size.
+
+Everything is generated from fixed seeds, so runs on different machines or
+commits measure the same inputs.
+"""
+
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from benchmarks.receipts import FIRST_NAMES, ITEMS, LAST_NAMES, make_receipt
+
+WORDS_PER_LINE = 8
+
+
+def make_boxes(count, pii_terms, seed=0):
+    """
+    Generates an OCR result of `count` words, in lines of `WORDS_PER_LINE`
+    words with Tesseract's line indices.
+
+    Every tenth line holds one of the first `pii_terms` (the ones printed on
+    the document), so that filtering finds and removes some words, like it does
+    on real receipts.
+    """
+    rng = random.Random(seed)
+    vocabulary = [word for item in ITEMS for word in item.split()] + [
+        "TOTAL",
+        "$1234",
+        "Cliente:",
+        "Gracias",
+    ]
+    boxes, line = [], 0
+    while len(boxes) < count:
+        line += 1
+        words = [rng.choice(vocabulary) for _ in range(WORDS_PER_LINE)]
+        if line % 10 == 0 and pii_terms:
+            words[2:3] = rng.choice(pii_terms).split()
+        for word_num, word in enumerate(words[: count - len(boxes)], 1):
+            left = 40 + 110 * word_num
+            boxes.append(
+                {
+                    "text": word,
+                    "left": left,
+                    "top": 30 * line,
+                    "right": left + 100,
+                    "bottom": 30 * line + 24,
+                    "block_num": 1,
+                    "par_num": 1,
+                    "line_num": line,
+                    "word_num": word_num,
+                }
+            )
+    return boxes
+
+
+def make_terms(count, seed=0):
+    """
+    Generates a PII list of `count` terms: a few names printed on the document
+    (see `make_boxes`), padded with names that are not.
+    """
+    rng = random.Random(seed)
+    printed = [
+        f"{first} {last}" for first, last in zip(FIRST_NAMES, LAST_NAMES)
+    ][: max(1, min(5, count))]
+    filler = (
+        f"{rng.choice(FIRST_NAMES)}{rng.randrange(1000, 100000)} "
+        f"{rng.choice(LAST_NAMES)}"
+        for _ in range(count - len(printed))
+    )
+    return printed + list(filler)
+
+
+@pytest.fixture(scope="session")
+def receipt_png():
+    """A receipt, as the PNG bytes a producer would send."""
+    return make_receipt(random.Random(0)).image
+
+
+@pytest.fixture(scope="session")
+def receipt_jpeg(receipt_png):
+    """The same receipt, as JPEG bytes."""
+    output = io.BytesIO()
+    with Image.open(io.BytesIO(receipt_png)) as image:
+        image.save(output, "JPEG", quality=90)
+    return output.getvalue()
@@ -0,0 +1,475 @@
+"""
+Measures the throughput and latency of the OCR -> FilterPII pipeline, run
+in-process against local stand-ins.
+
+PerformOCRService and FilterPIIService run unchanged in their own threads,
+consuming from an in-memory broker in place of RabbitMQ, and FilterPII stores
+its data in fakeredis in place of Redis. Synthetic receipts (see
+`benchmarks.receipts`) are sent with their PII list, as fast as possible or at
+a fixed rate, once per PII list size. For each size the script reports images
+per second, the end-to-end latency of an image (from sending it to its filtered
+result), the p50/p95/p99 latency of each stage recorded by the services (see
+`commons.metrics`) and the peak RSS. The results are saved as JSON, and can be
+compared with those of a previous run to catch regressions.
+
+With --ocr-workers, OCR runs in worker processes whose own stages are not
+recorded, only the "pool" stage.
+
+Usage: python -m benchmarks.pipeline [--images N] [--pii-terms 10 1000]
+    [--rate R] [--baseline results.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import queue
+import random
+import resource
+import sys
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
+from unittest import mock
+
+import FilterPII.src.app as filter_app
+import PerformOCR.src.app as ocr_app
+import PerformOCR.src.utils as ocr_utils
+from benchmarks.receipts import make_receipt, pii_list
+from commons.clients.codecs import JSONCodec, get_codec
+from commons.clients.redis_storage import RedisStorage
+from commons.metrics import Metrics
+from FilterPII.src.redaction import RedactionConfig
+from PerformOCR.src.backends import get_backend
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class InMemoryBroker:
+    """
+    A stand-in for RabbitMQ: named in-memory queues, shared by every client.
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def queue(self, queue_id):
+        with self._lock:
+            return self.queues.setdefault(queue_id, queue.Queue())
+
+    def publish(self, queue_id, body, content_type=None, headers=None):
+        properties = SimpleNamespace(
+            content_type=content_type, headers=headers
+        )
+        self.queue(queue_id).put((properties, body))
+
+
+class _Connection:
+    """
+    The part of a pika connection used by the services: callbacks scheduled on
+    the consumer thread.
+    """
+
+    def __init__(self):
+        self.callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.put(callback)
+
+
+class _Channel:
+    """
+    The part of a pika channel used by the services: acknowledgements, which
+    release prefetched messages.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def basic_ack(self, delivery_tag):
+        self.client.unacked -= 1
+
+    def basic_nack(self, delivery_tag, requeue=False):
+        self.client.unacked -= 1
+        self.client.rejected += 1
+
+
+class InMemoryClient:
+    """
+    A stand-in for `RabbitMQClient` on an `InMemoryBroker`, with the same
+    publishing and consuming methods.
+    """
+
+    def __init__(self, broker, queue_id, codec=JSONCodec.name):
+        self.broker = broker
+        self.codec = get_codec(codec)
+        self.connection = _Connection()
+        self.channel = _Channel(self)
+        self._queue_id = queue_id
+        self.unacked = 0
+        self.rejected = 0
+
+    def publish_message(self, queue_id, message):
+        content_type = (
+            None
+            if self.codec.name == JSONCodec.name
+            else self.codec.content_type
+        )
+        self.broker.publish(queue_id, self.codec.encode(message), content_type)
+
+    def publish_bytes(
+        self,
+        queue_id,
+        body,
+        headers=None,
+        content_type="application/octet-stream",
+    ):
+        self.broker.publish(queue_id, body, content_type, headers)
+
+    def start(self, process_message, prefetch_count=None):
+        """
+        Delivers messages to `process_message` until the broker is closed, at
+        most `prefetch_count` unacked.
+        """
+        messages = self.broker.queue(self._queue_id)
+        while not self.broker.closed.is_set():
+            while not self.connection.callbacks.empty():
+                self.connection.callbacks.get()()
+            if prefetch_count and self.unacked >= prefetch_count:
+                time.sleep(0.001)
+                continue
+            try:
+                properties, body = messages.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            self.unacked += 1
+            method = SimpleNamespace(delivery_tag=id(body))
+            process_message(self.channel, method, properties, body)
+
+
+class RecordingMetrics(Metrics):
+    """
+    A `Metrics` registry that also keeps every recorded duration, to compute
+    exact percentiles.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.samples = {}
+        self._samples_lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        super().observe(name, seconds, **labels)
+        key = ".".join([name.split("_")[0], *labels.values()])
+        with self._samples_lock:
+            self.samples.setdefault(key, []).append(seconds)
+
+
+def _percentiles(values):
+    """
+    Helper to summarize durations by their nearest-rank p50, p95 and p99, in
+    milliseconds.
+    """
+    ordered = sorted(values)
+    summary = {"count": len(ordered)}
+    for name, share in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        index = min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))
+        summary[f"{name}_ms"] = round(ordered[index] * 1000, 3)
+    return summary
+
+
+def _peak_rss_mb():
+    """
+    Helper to read the peak RSS of this process and of its finished children,
+    in MiB.
+    """
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        / scale,
+    }
+
+
+def run(receipts, pii_terms, args):
+    """
+    Runs the pipeline on `args.images` images, each sent with a PII list of
+    `pii_terms` terms.
+
+    Parameters
+    ----------
+    receipts : list of Receipt
+        The receipts to send, in turn.
+    pii_terms : int
+        The size of the PII list of each image.
+    args : argparse.Namespace
+        The load and service settings.
+
+    Returns
+    -------
+    dict
+        The measurements of the run.
+    """
+    broker, metrics = InMemoryBroker(), RecordingMetrics()
+    redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    rabbitmq = partial(_client, broker)
+    storage = partial(RedisStorage, client=redis_client)
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(
+            mock.patch.object(ocr_app, "RabbitMQClient", rabbitmq)
+        )
+        stack.enter_context(
+            mock.patch.object(filter_app, "RabbitMQClient", rabbitmq)
+        )
+        stack.enter_context(
+            mock.patch.object(filter_app, "RedisStorage", storage)
+        )
+        stack.enter_context(mock.patch.object(ocr_utils, "REGISTRY", metrics))
+        if not args.verbose:
+            # The services print every message they handle
+            stack.enter_context(
+                contextlib.redirect_stdout(
+                    stack.enter_context(open(os.devnull, "w"))
+                )
+            )
+
+        ocr_service = ocr_app.PerformOCRService(
+            workers=args.ocr_workers,
+            codec=args.codec,
+            metrics=metrics,
+            image_store=(
+                RedisStorage(client=redis_client, ttl=600)
+                if args.redact
+                else None
+            ),
+        )
+        filter_services = [
+            filter_app.FilterPIIService(
+                codec=args.codec,
+                match_mode=args.match_mode,
+                detectors=args.detectors,
+                redaction=RedactionConfig() if args.redact else None,
+                metrics=metrics,
+            )
+            for _ in range(args.filter_replicas)
+        ]
+        threads = [
+            threading.Thread(target=service.start, daemon=True)
+            for service in [ocr_service, *filter_services]
+        ]
+        for thread in threads:
+            thread.start()
+
+        rng = random.Random(args.seed)
+        pii_lists = [pii_list(receipt, pii_terms, rng) for receipt in receipts]
+        sent, done = {}, {}
+        results = broker.queue(filter_app.FilterPIIService.FILTERED_QUEUE)
+        sender = InMemoryClient(broker, None, args.codec)
+
+        start = time.perf_counter()
+        for index in range(args.images):
+            img_id = f"img_{index}"
+            if args.rate:
+                time.sleep(
+                    max(0.0, start + index / args.rate - time.perf_counter())
+                )
+            sender.publish_message(
+                filter_app.FilterPIIService.FILTER_PII_QUEUE,
+                {
+                    "img_id": img_id,
+                    "pii_terms": pii_lists[index % len(receipts)],
+                },
+            )
+            sent[img_id] = time.perf_counter()
+            sender.publish_bytes(
+                ocr_app.PerformOCRService.OCR_QUEUE,
+                receipts[index % len(receipts)].image,
+                headers={"img_id": img_id},
+                content_type=ocr_app.PerformOCRService.IMAGE_CONTENT_TYPE,
+            )
+
+        deadline = time.perf_counter() + args.timeout
+        while len(done) < args.images and time.perf_counter() < deadline:
+            try:
+                properties, body = results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            img_id = get_codec(args.codec).decode(body)["img_id"]
+            done[img_id] = time.perf_counter()
+        elapsed = time.perf_counter() - start
+
+        broker.closed.set()
+        for thread in threads:
+            thread.join()
+        if ocr_service._pool is not None:
+            ocr_service._pool.shutdown()
+
+    latencies = [done[img_id] - sent[img_id] for img_id in done]
+    return {
+        "pii_terms": pii_terms,
+        "images": args.images,
+        "completed": len(done),
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(len(done) / elapsed, 3),
+        "latency": _percentiles(latencies) if latencies else None,
+        "stages": {
+            stage: _percentiles(values)
+            for stage, values in sorted(metrics.samples.items())
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _client(broker, connection_params, queue_id=None, codec=JSONCodec.name):
+    return InMemoryClient(broker, queue_id, codec)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the runs of two results by PII list size, and lists the
+    regressions beyond `tolerance`.
+
+    Parameters
+    ----------
+    results, baseline : dict
+        The current results and those of a previous run.
+    tolerance : float
+        The accepted slowdown, as a share (e.g., 0.1 for 10%).
+
+    Returns
+    -------
+    list of str
+        A description of each regression.
+    """
+    previous = {run["pii_terms"]: run for run in baseline["runs"]}
+    regressions = []
+    print(
+        f"{'PII terms':>10} {'img/s':>10} {'was':>10} {'p95 ms':>10} "
+        f"{'was':>10}"
+    )
+    for current in results["runs"]:
+        before = previous.get(current["pii_terms"])
+        if before is None or not current["latency"] or not before["latency"]:
+            continue
+        throughput, was_throughput = (
+            current["images_per_second"],
+            before["images_per_second"],
+        )
+        p95, was_p95 = (
+            current["latency"]["p95_ms"],
+            before["latency"]["p95_ms"],
+        )
+        print(
+            f"{current['pii_terms']:>10} {throughput:>10.2f} "
+            f"{was_throughput:>10.2f} {p95:>10.1f} {was_p95:>10.1f}"
+        )
+        if throughput < was_throughput * (1 - tolerance):
+            regressions.append(
+                f"{current['pii_terms']} terms: {throughput:.2f} img/s, was "
+                f"{was_throughput:.2f}"
+            )
+        if p95 > was_p95 * (1 + tolerance):
+            regressions.append(
+                f"{current['pii_terms']} terms: p95 {p95:.1f} ms, was "
+                f"{was_p95:.1f}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--receipts", type=int, default=10)
+    parser.add_argument("--pii-terms", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="images sent per second (default 0, as fast as possible)",
+    )
+    parser.add_argument("--ocr-workers", type=int, default=None)
+    parser.add_argument("--filter-replicas", type=int, default=1)
+    parser.add_argument("--codec", default=JSONCodec.name)
+    parser.add_argument("--match-mode", default="exact")
+    parser.add_argument("--detectors", nargs="*", default=[])
+    parser.add_argument("--redact", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument(
+        "--output",
+        default=os.path.join(
+            "benchmarks",
+            "results",
+            f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json",
+        ),
+    )
+    parser.add_argument("--baseline", help="results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if fakeredis is None:
+        raise ImportError(
+            "fakeredis is required: pip install -r requirements-dev.txt"
+        )
+
+    # Extensions such as tesserocr can only be imported from the main thread,
+    # not from the consumer threads
+    get_backend()
+
+    rng = random.Random(args.seed)
+    receipts = [make_receipt(rng) for _ in range(args.receipts)]
+    results = {
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "verbose")
+        },
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "ocr_backend": os.getenv("OCR_BACKEND", "pytesseract"),
+        "runs": [],
+    }
+    for pii_terms in args.pii_terms:
+        result = run(receipts, pii_terms, args)
+        results["runs"].append(result)
+        latency = result["latency"] or {}
+        print(
+            f"{pii_terms} PII terms: {result['completed']}/{result['images']} "
+            f"images in {result['seconds']} s, "
+            f"{result['images_per_second']} img/s, latency p50 "
+            f"{latency.get('p50_ms')} ms, "
+            f"p95 {latency.get('p95_ms')} ms, p99 {latency.get('p99_ms')} ms"
+        )
+        for stage, summary in result["stages"].items():
+            print(
+                f"    {stage:<24} p50 {summary['p50_ms']:>9.2f} ms  p95 "
+                f"{summary['p95_ms']:>9.2f} ms  "
+                f"p99 {summary['p99_ms']:>9.2f} ms  ({summary['count']})"
+            )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Measures the speed/accuracy tradeoff of the OCR preprocessing settings.
+
+Every image is OCR'd without preprocessing, as the reference, and then with
+each preprocessing setting. For each setting the script reports the mean OCR
+time and how many of the reference words were found again at roughly the same
+place, once mapped back into the original image.
+
+Usage: python -m benchmarks.preprocessing [images ...] [--repeat N]
+    [--upscale F]
+"""
+
+import argparse
+import time
+from collections import Counter
+
+from PIL import Image
+
+from PerformOCR.src.preprocessing import PreprocessConfig
+from PerformOCR.src.utils import detect_text
+
+SETTINGS = {
+    "none": None,
+    "grayscale": PreprocessConfig(),
+    "grayscale+2MP": PreprocessConfig(max_pixels=2_000_000),
+    "grayscale+1MP": PreprocessConfig(max_pixels=1_000_000),
+    "grayscale+0.5MP": PreprocessConfig(max_pixels=500_000),
+    "grayscale+binarize": PreprocessConfig(binarize_threshold=160),
+}
+
+
+def _word_keys(boxes, tolerance):
+    """
+    Helper to key words by text and coarse position, so nearby boxes of the
+    same word compare equal.
+    """
+    return Counter(
+        (
+            box.text,
+            round(box.left / tolerance),
+            round(box.top / tolerance),
+        )
+        for box in boxes
+    )
+
+
+def run(images, repeat=3, tolerance=10):
+    results = {}
+    for name, config in SETTINGS.items():
+        seconds, found, expected = 0.0, 0, 0
+        for image in images:
+            reference = _word_keys(
+                detect_text(image, preprocess_config=None), tolerance
+            )
+            start = time.perf_counter()
+            for _ in range(repeat):
+                boxes = detect_text(image, preprocess_config=config)
+            seconds += (time.perf_counter() - start) / repeat
+            found += sum((_word_keys(boxes, tolerance) & reference).values())
+            expected += sum(reference.values())
+        results[name] = {
+            "seconds_per_image": seconds / len(images),
+            "word_recall": found / expected if expected else 1.0,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("images", nargs="*", default=["img.png"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--upscale",
+        type=float,
+        default=1.0,
+        help="Enlarge the images first, to stand in for high-resolution scans "
+        "or photos",
+    )
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        image = Image.open(path)
+        image.load()
+        if args.upscale != 1.0:
+            image = image.resize(
+                (
+                    round(image.width * args.upscale),
+                    round(image.height * args.upscale),
+                ),
+                Image.Resampling.BICUBIC,
+            )
+        images.append(image)
+
+    results = run(images, repeat=args.repeat)
+    print(f"{'setting':<20} {'s/image':>10} {'word recall':>12}")
+    for name, result in results.items():
+        print(
+            f"{name:<20} {result['seconds_per_image']:>10.3f} "
+            f"{result['word_recall']:>12.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Generates synthetic receipt images and PII term lists for the benchmarks.
+
+Each receipt holds a store header, a few items with prices and the customer's
+details: a full name, a CUIT, a CBU, a phone number and an email, all of them
+made up, with valid check digits. The PII list of a receipt holds the
+customer's terms plus filler terms, so that lists of any size can be matched
+against the same text.
+
+Usage: python -m benchmarks.receipts [directory] [--count N]
+"""
+
+import argparse
+import io
+import os
+import random
+from dataclasses import dataclass, field
+from typing import List
+
+from PIL import Image, ImageDraw, ImageFont
+
+from FilterPII.src.detectors import is_valid_cbu, is_valid_cuit
+
+FIRST_NAMES = [
+    "Jose",
+    "Antonio",
+    "Maria",
+    "Lucia",
+    "Neil",
+    "Gabriel",
+    "Sofia",
+    "Martin",
+    "Valentina",
+    "Camila",
+]
+LAST_NAMES = [
+    "Camargo",
+    "Fernandez",
+    "Gonzalez",
+    "Rodriguez",
+    "Lopez",
+    "Martinez",
+    "Perez",
+    "Romero",
+    "Sosa",
+    "Alvarez",
+]
+ITEMS = [
+    "Cafe con leche",
+    "Medialunas x3",
+    "Agua mineral",
+    "Tostado jamon queso",
+    "Jugo de naranja",
+    "Alfajor",
+    "Ensalada mixta",
+    "Empanadas x6",
+]
+
+
+@dataclass
+class Receipt:
+    """
+    A synthetic receipt.
+
+    Attributes
+    ----------
+    image : bytes
+        The receipt rendered as a PNG image.
+    pii_terms : list of str
+        The customer's PII terms printed on the receipt.
+    """
+
+    image: bytes
+    pii_terms: List[str] = field(default_factory=list)
+
+
+def _digits(rng, count):
+    return "".join(str(rng.randrange(10)) for _ in range(count))
+
+
+def _cbu(rng):
+    bank, account = _digits(rng, 7), _digits(rng, 13)
+    # Both check digits are modulo 10, so one of the 100 combinations is valid
+    return next(
+        cbu
+        for first in "0123456789"
+        for second in "0123456789"
+        if is_valid_cbu(cbu := bank + first + account + second)
+    )
+
+
+def _cuit(rng):
+    while True:
+        prefix = rng.choice(["20", "23", "27"]) + _digits(rng, 8)
+        # Prefixes whose modulo 11 check digit would be 10 have no valid digit
+        for digit in "0123456789":
+            if is_valid_cuit(prefix + digit):
+                return prefix + digit
+
+
+def make_receipt(rng: random.Random, font_size: int = 28) -> Receipt:
+    """
+    Renders a receipt with a random customer.
+
+    Parameters
+    ----------
+    rng : random.Random
+        The random generator, seeded for reproducible receipts.
+    font_size : int, optional
+        The height of the text in pixels (default is 28).
+
+    Returns
+    -------
+    Receipt
+        The receipt image and the PII terms printed on it.
+    """
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    cuit, cbu = _cuit(rng), _cbu(rng)
+    cuit = f"{cuit[:2]}-{cuit[2:10]}-{cuit[10]}"
+    phone = f"11 {_digits(rng, 4)}-{_digits(rng, 4)}"
+    email = f"{first.lower()}.{last.lower()}@example.com"
+
+    lines = ["CAFE DEL CENTRO", f"Ticket {_digits(rng, 8)}", ""]
+    total = 0
+    for item in rng.sample(ITEMS, rng.randint(2, 5)):
+        price = rng.randint(500, 9000)
+        total += price
+        lines.append(f"{item}  ${price}")
+    lines += [
+        f"TOTAL  ${total}",
+        "",
+        f"Cliente: {first} {last}",
+        f"CUIT: {cuit}",
+        f"CBU: {cbu}",
+        f"Tel: {phone}",
+        f"Email: {email}",
+        "Gracias por su compra",
+    ]
+
+    font = ImageFont.load_default(size=font_size)
+    line_height = font_size * 3 // 2
+    image = Image.new("L", (900, line_height * (len(lines) + 2)), 255)
+    draw = ImageDraw.Draw(image)
+    for row, line in enumerate(lines, start=1):
+        draw.text((40, row * line_height), line, fill=0, font=font)
+
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return Receipt(output.getvalue(), [first, last, cuit, cbu, email])
+
+
+def pii_list(receipt: Receipt, size: int, rng: random.Random) -> List[str]:
+    """
+    Builds a PII list of a given size for a receipt: its own terms, padded with
+    made-up filler terms.
+
+    Parameters
+    ----------
+    receipt : Receipt
+        The receipt whose terms the list holds.
+    size : int
+        The number of terms of the list, at least the number of terms of the
+        receipt.
+    rng : random.Random
+        The random generator of the filler terms.
+
+    Returns
+    -------
+    list of str
+        The PII terms, in random order.
+    """
+    terms = list(receipt.pii_terms)
+    while len(terms) < size:
+        terms.append(
+            f"{rng.choice(FIRST_NAMES)}{_digits(rng, 3)} "
+            f"{rng.choice(LAST_NAMES)}"
+        )
+    rng.shuffle(terms)
+    return terms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", nargs="?", default="receipts")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    rng = random.Random(args.seed)
+    for index in range(args.count):
+        receipt = make_receipt(rng)
+        path = os.path.join(args.directory, f"receipt_{index}.png")
+        with open(path, "wb") as output:
+            output.write(receipt.image)
+        print(f"{path}: {', '.join(receipt.pii_terms)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures how the OCR latency of a large page scales with the number of tile
+workers.
+
+The page is a mosaic of the given image, so it holds many text lines, and is
+OCR'd once untiled and once tiled for each worker count. The script reports the
+latency, the speedup over the untiled run, and the share of the untiled words
+found again by the tiled run.
+
+Usage: python -m benchmarks.tiling [image] [--mosaic N] [--workers 1 2 4]
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+
+from PIL import Image
+
+from PerformOCR.src.tiling import TilingConfig
+from PerformOCR.src.utils import detect_text
+
+
+def _mosaic(image, count):
+    page = Image.new(image.mode, (image.width * count, image.height * count))
+    for row in range(count):
+        for column in range(count):
+            page.paste(image, (column * image.width, row * image.height))
+    return page
+
+
+def _timed(page, tiling_config):
+    start = time.perf_counter()
+    boxes = detect_text(
+        page, preprocess_config=None, tiling_config=tiling_config
+    )
+    return time.perf_counter() - start, Counter(box.text for box in boxes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("image", nargs="?", default="img.png")
+    parser.add_argument("--mosaic", type=int, default=3)
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count()}),
+    )
+    args = parser.parse_args()
+
+    page = _mosaic(Image.open(args.image).convert("RGB"), args.mosaic)
+    print(f"Page of {page.width}x{page.height} pixels")
+
+    baseline, reference = _timed(page, None)
+    print(f"{'workers':<10} {'seconds':>8} {'speedup':>8} {'word recall':>12}")
+    print(f"{'untiled':<10} {baseline:>8.2f} {1:>8.2f} {1:>12.1%}")
+    for workers in args.workers:
+        config = TilingConfig(
+            tile_size=args.tile_size, min_pixels=0, workers=workers
+        )
+        seconds, words = _timed(page, config)
+        recall = sum((words & reference).values()) / sum(reference.values())
+        print(
+            f"{workers:<10} {seconds:>8.2f} {baseline / seconds:>8.2f} "
+            f"{recall:>12.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
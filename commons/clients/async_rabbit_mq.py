@@ -0,0 +1,213 @@
+import asyncio
+from types import SimpleNamespace
+
+from commons.clients.codecs import JSONCodec, get_codec
+
+try:
+    import aio_pika
+except ImportError:  # pragma: no cover - depends on the environment
+    aio_pika = None
+
+
+class _DeliveryChannel:
+    """
+    Stands in for the pika channel passed to message callbacks, for a single
+    aio-pika delivery.
+
+    `basic_ack` and `basic_nack` keep pika's signatures but are coroutines, and
+    settle the delivery they were created for.
+
+    """
+
+    def __init__(self, message):
+        self._message = message
+
+    async def basic_ack(self, delivery_tag=None):
+        await self._message.ack()
+
+    async def basic_nack(self, delivery_tag=None, requeue=True):
+        await self._message.nack(requeue=requeue)
+
+
+class AsyncRabbitMQClient:
+    """
+    An asyncio client to interact with RabbitMQ for consuming and publishing
+    messages.
+
+    The AsyncRabbitMQClient mirrors `RabbitMQClient` on top of aio-pika:
+    `start` consumes the queue and `publish_message` / `publish_bytes` publish
+    to it, but all of them are coroutines. Every delivery is handled in its own
+    task, so a callback waiting on I/O does not hold up heartbeats or other
+    deliveries; the number of messages in flight is bounded by the prefetch
+    count.
+
+    """
+
+    def __init__(
+        self,
+        connection_parameters: str,
+        queue_id: str = None,
+        codec: str = JSONCodec.name,
+    ):
+        """
+        Initializes the AsyncRabbitMQClient. The connection is opened by
+        `connect`, or by `start`.
+
+        Parameters
+        ----------
+        connection_parameters : str
+            The hostname of the RabbitMQ broker.
+        queue_id : str, optional
+            The ID of the queue to interact with (default is None).
+        codec : str, optional
+            The name of the codec used to serialize published messages (default
+            is "json").
+
+        Raises
+        ------
+        ImportError
+            If aio-pika is not installed.
+        """
+        if aio_pika is None:
+            raise ImportError("aio-pika is required for AsyncRabbitMQClient")
+
+        self._connection_parameters = connection_parameters
+        self._queue_id = queue_id
+        self.codec = get_codec(codec)
+        self.connection = None
+        self.channel = None
+        self.queue = None
+        self._tasks = set()
+
+    async def connect(self):
+        """
+        Connects to RabbitMQ and declares the queue.
+
+        In case of a connection failure, the client will retry up to 3 times
+        with a 5-second delay.
+
+        Raises
+        ------
+        aio_pika.exceptions.AMQPConnectionError
+            If the client fails to connect to RabbitMQ after 3 attempts.
+        """
+        for attempt in range(3):
+            try:
+                self.connection = await aio_pika.connect_robust(
+                    host=self._connection_parameters
+                )
+                self.channel = await self.connection.channel()
+                self.queue = await self.channel.declare_queue(
+                    self._queue_id, durable=True
+                )
+                return
+
+            except aio_pika.exceptions.AMQPConnectionError:
+                if attempt == 2:
+                    raise
+                print(
+                    f"Attempt {attempt + 1}: Could not connect to RabbitMQ. "
+                    "Retrying in 5 seconds..."
+                )
+                await asyncio.sleep(5)
+
+    async def start(self, process_message, prefetch_count: int = None):
+        """
+        Starts consuming messages from the queue and processes each message
+        using the provided coroutine.
+
+        The coroutine is called with the same arguments as a pika callback:
+        `ch`, `method`, `properties` and `body`, where `ch.basic_ack` and
+        `ch.basic_nack` must be awaited. This coroutine does not return, as it
+        continuously listens for messages until cancelled.
+
+        Parameters
+        ----------
+        process_message : coroutine function
+            The coroutine to process each received message.
+        prefetch_count : int, optional
+            The maximum number of unacknowledged messages, and so of concurrent
+            callbacks (default is None, which leaves the broker's default of no
+            limit).
+        """
+        if self.channel is None:
+            await self.connect()
+        if prefetch_count:
+            await self.channel.set_qos(prefetch_count=prefetch_count)
+
+        async def on_message(message):
+            task = asyncio.create_task(
+                process_message(
+                    _DeliveryChannel(message),
+                    SimpleNamespace(delivery_tag=message.delivery_tag),
+                    SimpleNamespace(
+                        content_type=message.content_type,
+                        headers=message.headers,
+                    ),
+                    message.body,
+                )
+            )
+            # Keep a reference until the task is done so it is not garbage
+            # collected
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        await self.queue.consume(on_message)
+        print("Service is running and listening for messages...")
+        await asyncio.Future()
+
+    async def publish_message(self, queue_id: str, message: dict):
+        """
+        Publishes a message to the specified RabbitMQ queue.
+
+        The message is serialized with the client's codec. As with
+        `RabbitMQClient`, only non-JSON messages carry a content type.
+
+        Parameters
+        ----------
+        queue_id : str
+            The ID of the RabbitMQ queue to which the message should be
+            published.
+        message : dict
+            The message to be published, which will be serialized with the
+            client's codec.
+        """
+        body = self.codec.encode(message)
+        if self.codec.name == JSONCodec.name:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(body=body.encode()), routing_key=queue_id
+            )
+        else:
+            await self.publish_bytes(
+                queue_id, body, content_type=self.codec.content_type
+            )
+
+    async def publish_bytes(
+        self,
+        queue_id: str,
+        body: bytes,
+        headers: dict = None,
+        content_type: str = "application/octet-stream",
+    ):
+        """
+        Publishes a binary message to the specified RabbitMQ queue.
+
+        Parameters
+        ----------
+        queue_id : str
+            The ID of the RabbitMQ queue to which the message should be
+            published.
+        body : bytes
+            The raw message body.
+        headers : dict, optional
+            The AMQP headers of the message (default is None).
+        content_type : str, optional
+            The content type of the body (default is
+            "application/octet-stream").
+        """
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                body=body, headers=headers, content_type=content_type
+            ),
+            routing_key=queue_id,
+        )
@@ -0,0 +1,298 @@
+import redis.asyncio
+
+from commons.clients.codecs import (
+    JSONCodec,
+    get_codec,
+    pack_value,
+    unpack_value,
+)
+from commons.clients.redis_storage import (
+    COLLECT_SCRIPT,
+    PART_JOIN_SCRIPT,
+    SHARED_JOIN_SCRIPT,
+    job_keys,
+    part_keys,
+    unpack_fields,
+    unpack_parts,
+)
+
+
+class AsyncRedisStorage:
+    """
+    An asyncio client to interact with Redis for storing, retrieving, and
+    deleting data.
+
+    The AsyncRedisStorage class mirrors `RedisStorage` on top of
+    `redis.asyncio`, with the same keys, codecs, expiry and atomic joins, so
+    both can serve the same deployment. Its methods are coroutines.
+
+    """
+
+    def __init__(
+        self,
+        host="localhost",
+        port=6379,
+        db=0,
+        codec=JSONCodec.name,
+        ttl=86400,
+        max_connections=None,
+        socket_timeout=None,
+    ):
+        """
+        Initializes the AsyncRedisStorage with a pool of connections to the
+        Redis database.
+
+        Parameters
+        ----------
+        host : str, optional
+            The hostname or IP address of the Redis server (default is
+            "localhost").
+        port : int, optional
+            The port number on which the Redis server is listening (default is
+            6379).
+        db : int, optional
+            The Redis database number to use (default is 0).
+        codec : str, optional
+            The name of the codec used to serialize stored data (default is
+            "json").
+        ttl : int, optional
+            The number of seconds after which stored data expires (default is
+            86400, one day). None disables expiry.
+        max_connections : int, optional
+            The maximum number of pooled connections (default is None, which
+            means no limit).
+        socket_timeout : float, optional
+            The number of seconds to wait for a connection or a reply (default
+            is None, no timeout).
+        """
+        self.client = redis.asyncio.Redis(
+            host=host,
+            port=port,
+            db=db,
+            max_connections=max_connections,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_timeout,
+            socket_keepalive=True,
+        )
+        self.codec = get_codec(codec)
+        self.ttl = ttl
+        self._part_join_script = self.client.register_script(PART_JOIN_SCRIPT)
+        self._shared_join_script = self.client.register_script(
+            SHARED_JOIN_SCRIPT
+        )
+        self._collect_script = self.client.register_script(COLLECT_SCRIPT)
+
+    async def store(self, key, data_type, data, expire=True):
+        """
+        Store data in Redis under a composite key (key:data_type). See
+        `RedisStorage.store`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., a job ID) to associate the data with.
+        data_type : str
+            A string representing the type of data (e.g., "bounding_boxes" or
+            "pii_terms").
+        data : any
+            The data to be stored, which will be serialized with the storage's
+            codec.
+        expire : bool, optional
+            Whether the data expires after `ttl` seconds (default is True).
+            Long-lived data, such as registered term lists, is stored without
+            expiry.
+
+        """
+        await self.client.set(
+            f"{key}:{data_type}",
+            pack_value(self.codec, data),
+            ex=self.ttl if expire else None,
+        )
+
+    async def store_bytes(self, key, data_type, data: bytes):
+        """
+        Store raw bytes under a composite key (key:data_type). See
+        `RedisStorage.store_bytes`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) to associate the data with.
+        data_type : str
+            A string representing the type of data (e.g., "image").
+        data : bytes
+            The bytes to store.
+        """
+        await self.client.set(f"{key}:{data_type}", data, ex=self.ttl)
+        print(
+            f"Stored {len(data)} bytes of {data_type} for job_id {key} in "
+            "Redis"
+        )
+
+    async def retrieve_bytes(self, key, data_type, delete=False):
+        """
+        Retrieve raw bytes stored with `store_bytes`. See
+        `RedisStorage.retrieve_bytes`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) to retrieve the data for.
+        data_type : str
+            A string representing the type of data (e.g., "image").
+        delete : bool, optional
+            Whether to delete the data in the same round trip (default is
+            False).
+
+        Returns
+        -------
+        bytes or None
+            The stored bytes, or None if there are none.
+        """
+        redis_key = f"{key}:{data_type}"
+        if delete:
+            return await self.client.getdel(redis_key)
+        return await self.client.get(redis_key)
+
+    async def join_part(self, key, part_type, part, data, count, shared_type):
+        """
+        Join one part of a job whose first half comes in several parts. See
+        `RedisStorage.join_part`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) of the job.
+        part_type : str
+            The type of the parts (e.g., "bounding_boxes").
+        part : int
+            The index of this part (e.g., the page number).
+        data : any
+            The data of this part, which will be serialized with the storage's
+            codec.
+        count : int
+            The total number of parts of the job.
+        shared_type : str
+            The type of the shared half (e.g., "pii_terms").
+
+        Returns
+        -------
+        any or None
+            The shared half if it was already stored, otherwise None.
+        """
+        shared = await self._part_join_script(
+            keys=part_keys(key, shared_type, part_type),
+            args=[part, pack_value(self.codec, data), count, self.ttl or ""],
+        )
+        if shared is None:
+            print(f"Stored {part_type} {part} for job_id {key} in Redis")
+            return None
+        print(f"Joined {part_type} {part} with {shared_type} for job_id {key}")
+        return unpack_value(shared)
+
+    async def join_shared(self, key, shared_type, data, part_type):
+        """
+        Join the shared half of a job whose other half comes in parts. See
+        `RedisStorage.join_shared`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) of the job.
+        shared_type : str
+            The type of the shared half (e.g., "pii_terms").
+        data : any
+            The shared half, which will be serialized with the storage's codec.
+        part_type : str
+            The type of the parts (e.g., "bounding_boxes").
+
+        Returns
+        -------
+        tuple of (dict, int or None)
+            The pending parts by index, and the total number of parts (None
+            when no part arrived yet).
+        """
+        reply = await self._shared_join_script(
+            keys=part_keys(key, shared_type, part_type),
+            args=[pack_value(self.codec, data), self.ttl or ""],
+        )
+        parts, count = unpack_parts(reply)
+        print(
+            f"Joined {shared_type} with {len(parts)} {part_type} for job_id "
+            f"{key}"
+        )
+        return parts, count
+
+    async def collect_part(self, key, data_type, part, data, count):
+        """
+        Collect one part of a result computed in parts. See
+        `RedisStorage.collect_part`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) of the result.
+        data_type : str
+            The type of the parts (e.g., "filtered_boxes").
+        part : int
+            The index of this part.
+        data : any
+            The data of this part, which will be serialized with the storage's
+            codec.
+        count : int
+            The total number of parts.
+
+        Returns
+        -------
+        dict or None
+            Every part by index once `count` parts are collected, otherwise
+            None.
+        """
+        flat = await self._collect_script(
+            keys=[f"{key}:{data_type}:collected"],
+            args=[part, pack_value(self.codec, data), count, self.ttl or ""],
+        )
+        if flat is None:
+            print(f"Collected {data_type} {part} for job_id {key} in Redis")
+            return None
+        print(f"Collected all {count} {data_type} for job_id {key}")
+        return unpack_fields(flat)
+
+    async def retrieve(self, key, data_type):
+        """
+        Retrieve data from Redis based on a composite key (key:data_type). See
+        `RedisStorage.retrieve`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., a job ID) to retrieve the data for.
+        data_type : str
+            A string representing the type of data to retrieve (e.g.,
+            "bounding_boxes" or "pii_terms").
+
+        Returns
+        -------
+        any or None
+            The data retrieved from Redis. If no data is found, `None` is
+            returned.
+        """
+        data = await self.client.get(f"{key}:{data_type}")
+        if data:
+            return unpack_value(data)
+        return None
+
+    async def delete(self, key):
+        """
+        Delete all related data (bounding boxes and PII terms) for a given
+        img_id. See `RedisStorage.delete`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) for which all related data should be
+            deleted.
+
+        """
+        await self.client.delete(*job_keys(key))
+        print(f"Deleted data for job_id {key} from Redis")
@@ -0,0 +1,354 @@
+import json
+from abc import ABC, abstractmethod
+from array import array
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+from commons.entities.bounding_box_batch import BoundingBox, BoundingBoxBatch
+
+# Payload keys holding lists of bounding boxes, which the columnar codec stores
+# column by column
+BOX_LIST_KEYS = ("bounding_boxes", "filtered_boxes")
+
+# Values stored in Redis by a non-JSON codec start with NUL, followed by the
+# content type and another NUL
+_TAG = b"\x00"
+
+
+def _serialize_boxes(value):
+    """
+    Helper to serialize the bounding box batches and rows found in a message,
+    for the JSON and MessagePack encoders.
+    """
+    if isinstance(value, BoundingBoxBatch):
+        return value.to_dicts()
+    if isinstance(value, BoundingBox):
+        return value.to_dict()
+    raise TypeError(
+        f"Object of type {type(value).__name__} is not serializable"
+    )
+
+
+class Codec(ABC):
+    """
+    Serializes messages for RabbitMQ and Redis.
+
+    Each codec is identified by a content type, which travels in the AMQP
+    `content_type` property (or in a tag prefixed to Redis values) so that
+    consumers can decode whatever format a producer used.
+
+    """
+
+    name = None
+    content_type = None
+
+    @abstractmethod
+    def encode(self, message: dict):
+        """
+        Serializes a message.
+
+        Parameters
+        ----------
+        message : dict
+            The message to serialize.
+
+        Returns
+        -------
+        bytes or str
+            The serialized message.
+        """
+
+    @abstractmethod
+    def decode(self, data) -> dict:
+        """
+        Deserializes a message.
+
+        Parameters
+        ----------
+        data : bytes or str
+            The serialized message.
+
+        Returns
+        -------
+        dict
+            The message.
+        """
+
+
+class JSONCodec(Codec):
+    """Codec for plain JSON, the format every service version understands."""
+
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, message):
+        return json.dumps(message, default=_serialize_boxes)
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """Codec for MessagePack, a compact binary equivalent of JSON."""
+
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    def encode(self, message):
+        if msgpack is None:
+            raise ImportError("msgpack is required for the msgpack codec")
+        return msgpack.packb(
+            message, use_bin_type=True, default=_serialize_boxes
+        )
+
+    def decode(self, data):
+        if msgpack is None:
+            raise ImportError("msgpack is required for the msgpack codec")
+        return msgpack.unpackb(data, raw=False)
+
+
+class ColumnarCodec(MsgpackCodec):
+    """
+    Codec that stores lists of bounding boxes column by column, on top of
+    MessagePack.
+
+    Instead of one map per box with repeated key names, each list under
+    `BOX_LIST_KEYS` (or a list of boxes given directly, as stored in Redis)
+    becomes a set of columns: numeric fields are packed as typed arrays and the
+    texts as a single UTF-8 blob with an array of lengths. A `BoundingBoxBatch`
+    is written out from its own columns. Any other value is encoded as plain
+    MessagePack.
+
+    """
+
+    name = "columnar"
+    content_type = "application/vnd.ocr-pii.columnar+msgpack"
+
+    def encode(self, message):
+        if _is_box_list(message):
+            return super().encode({"__columns__": encode_columns(message)})
+        if not isinstance(message, dict):
+            return super().encode(message)
+
+        message = dict(message)
+        for key in BOX_LIST_KEYS:
+            if _is_box_list(message.get(key)):
+                message[key] = {"__columns__": encode_columns(message[key])}
+        return super().encode(message)
+
+    def decode(self, data):
+        message = super().decode(data)
+        if not isinstance(message, dict):
+            return message
+        if "__columns__" in message:
+            return decode_columns(message["__columns__"])
+
+        for key in BOX_LIST_KEYS:
+            value = message.get(key)
+            if isinstance(value, dict) and "__columns__" in value:
+                message[key] = decode_columns(value["__columns__"])
+        return message
+
+
+def _is_box_list(value) -> bool:
+    if isinstance(value, BoundingBoxBatch):
+        return True
+    return isinstance(value, list) and all(isinstance(v, dict) for v in value)
+
+
+def encode_columns(boxes: list) -> dict:
+    """
+    Converts a list of bounding box dicts into columns.
+
+    Parameters
+    ----------
+    boxes : list of dict or BoundingBoxBatch
+        The bounding boxes. A batch is converted from its columns, see
+        `BoundingBoxBatch.to_columns`.
+
+    Returns
+    -------
+    dict
+        The number of boxes under "size", and a mapping of field name to column
+        under "columns". Integer and float columns are packed as `array` bytes
+        tagged with their type code, the "text" column as a UTF-8 blob plus the
+        byte length of each text, and any other column (e.g. one with missing
+        values) as a plain list.
+    """
+    if isinstance(boxes, BoundingBoxBatch):
+        return boxes.to_columns()
+    fields = list(dict.fromkeys(field for box in boxes for field in box))
+    columns = {}
+    for field in fields:
+        values = [box.get(field) for box in boxes]
+        if field == "text" and all(isinstance(v, str) for v in values):
+            encoded = [value.encode("utf-8") for value in values]
+            columns[field] = {
+                "type": "text",
+                "lengths": array("I", map(len, encoded)).tobytes(),
+                "blob": b"".join(encoded),
+            }
+        elif all(type(value) is int for value in values):
+            columns[field] = {
+                "type": "q",
+                "data": array("q", values).tobytes(),
+            }
+        elif all(type(value) in (int, float) for value in values):
+            columns[field] = {
+                "type": "d",
+                "data": array("d", values).tobytes(),
+            }
+        else:
+            columns[field] = {"type": "list", "data": values}
+    return {"size": len(boxes), "columns": columns}
+
+
+def decode_columns(encoded: dict) -> list:
+    """
+    Converts columns produced by `encode_columns` back into a list of bounding
+    box dicts.
+
+    Parameters
+    ----------
+    encoded : dict
+        The columns.
+
+    Returns
+    -------
+    list of dict
+        The bounding boxes.
+    """
+    columns = {}
+    for field, column in encoded["columns"].items():
+        if column["type"] == "text":
+            lengths = array("I")
+            lengths.frombytes(column["lengths"])
+            blob, texts, offset = column["blob"], [], 0
+            for length in lengths:
+                texts.append(blob[offset : offset + length].decode("utf-8"))
+                offset += length
+            columns[field] = texts
+        elif column["type"] == "list":
+            columns[field] = column["data"]
+        else:
+            values = array(column["type"])
+            values.frombytes(column["data"])
+            columns[field] = values.tolist()
+
+    return [
+        {field: values[i] for field, values in columns.items()}
+        for i in range(encoded["size"])
+    ]
+
+
+CODECS = {
+    codec.name: codec
+    for codec in (JSONCodec(), MsgpackCodec(), ColumnarCodec())
+}
+_BY_CONTENT_TYPE = {codec.content_type: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str = None) -> Codec:
+    """
+    Returns a codec by name or content type.
+
+    Parameters
+    ----------
+    name : str, optional
+        The codec name ("json", "msgpack" or "columnar") or content type
+        (default is None, which returns the JSON codec).
+
+    Returns
+    -------
+    Codec
+        The codec.
+
+    Raises
+    ------
+    ValueError
+        If no codec matches `name`.
+    """
+    if name is None:
+        return CODECS[JSONCodec.name]
+    codec = CODECS.get(name) or _BY_CONTENT_TYPE.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown codec: {name}")
+    return codec
+
+
+def decode_message(properties, body) -> dict:
+    """
+    Decodes a RabbitMQ message body using the codec named by its `content_type`
+    property.
+
+    Messages without a known content type are decoded as JSON, which is what
+    producers that predate codecs send.
+
+    Parameters
+    ----------
+    properties : object
+        The properties of the RabbitMQ message.
+    body : bytes
+        The body of the RabbitMQ message.
+
+    Returns
+    -------
+    dict
+        The decoded message.
+    """
+    content_type = getattr(properties, "content_type", None)
+    codec = (
+        _BY_CONTENT_TYPE.get(content_type)
+        if isinstance(content_type, str)
+        else None
+    )
+    return (codec or CODECS[JSONCodec.name]).decode(body)
+
+
+def pack_value(codec: Codec, data):
+    """
+    Serializes a value for storage, tagging it with the codec's content type
+    unless the codec is JSON.
+
+    Untagged JSON keeps stored values readable by service versions that predate
+    codecs.
+
+    Parameters
+    ----------
+    codec : Codec
+        The codec to serialize with.
+    data : any
+        The value to serialize.
+
+    Returns
+    -------
+    bytes or str
+        The serialized value.
+    """
+    if codec.name == JSONCodec.name:
+        return codec.encode(data)
+    return _TAG + codec.content_type.encode() + _TAG + codec.encode(data)
+
+
+def unpack_value(data):
+    """
+    Deserializes a value written by `pack_value`, whatever codec it was written
+    with.
+
+    Parameters
+    ----------
+    data : bytes or str
+        The serialized value.
+
+    Returns
+    -------
+    any
+        The value.
+    """
+    if isinstance(data, bytes) and data.startswith(_TAG):
+        content_type, _, payload = data[1:].partition(_TAG)
+        return get_codec(content_type.decode()).decode(payload)
+    return json.loads(data)
@@ -1,8 +1,9 @@
-import json
 import time
 
 import pika
 
+from commons.clients.codecs import JSONCodec, get_codec
+
 
 class RabbitMQClient:
     """
@@ -13,7 +14,12 @@ class RabbitMQClient:
     mechanism to handle connection failures.
     """
 
-    def __init__(self, connection_parameters: str, queue_id: str = None):
+    def __init__(
+        self,
+        connection_parameters: str,
+        queue_id: str = None,
+        codec: str = JSONCodec.name,
+    ):
         """
         Initializes the RabbitMQClient and establishes a connection to RabbitMQ.
 
@@ -26,12 +32,17 @@ class RabbitMQClient:
             The connection string to connect to the RabbitMQ broker.
         queue_id : str, optional
             The ID of the queue to interact with (default is None).
+        codec : str, optional
+            The name of the codec used to serialize published messages (default
+            is "json").
 
         Raises
         ------
         pika.exceptions.AMQPConnectionError
             If the client fails to connect to RabbitMQ after 3 attempts.
         """
+        self.codec = get_codec(codec)
+
         for attempt in range(3):
             try:
                 self.connection = pika.BlockingConnection(
@@ -48,7 +59,7 @@ class RabbitMQClient:
                 )
                 time.sleep(5)
 
-    def start(self, process_message):
+    def start(self, process_message, prefetch_count: int = None):
         """
         Starts consuming messages from the queue and processes each message using the provided callback.
 
@@ -61,7 +72,13 @@ class RabbitMQClient:
         process_message : function
             A callback function to process each received message. The function should accept three arguments:
             `ch` (channel), `method`, and `body` (the message content).
+        prefetch_count : int, optional
+            The maximum number of unacknowledged messages delivered to this
+            consumer at once (default is None, which leaves the broker's
+            default of no limit).
         """
+        if prefetch_count:
+            self.channel.basic_qos(prefetch_count=prefetch_count)
         self.channel.basic_consume(
             queue=self._queue_id,
             on_message_callback=process_message,
@@ -74,15 +91,60 @@ class RabbitMQClient:
         """
         Publishes a message to the specified RabbitMQ queue.
 
-        The message is serialized to JSON format and sent to the RabbitMQ queue (`queue_id`).
+        The message is serialized with the client's codec and sent to the
+        RabbitMQ queue (`queue_id`). Messages serialized by any codec other
+        than JSON carry the codec's content type, so consumers can decode them;
+        JSON messages are sent without one, exactly as producers that predate
+        codecs did.
 
         Parameters
         ----------
         queue_id : str
             The ID of the RabbitMQ queue to which the message should be published.
         message : dict
-            The message to be published, which will be serialized as a JSON string.
+            The message to be published, which will be serialized with the
+            client's codec.
+        """
+        body = self.codec.encode(message)
+        if self.codec.name == JSONCodec.name:
+            self.channel.basic_publish(
+                exchange="", routing_key=queue_id, body=body
+            )
+        else:
+            self.publish_bytes(
+                queue_id, body, content_type=self.codec.content_type
+            )
+
+    def publish_bytes(
+        self,
+        queue_id: str,
+        body: bytes,
+        headers: dict = None,
+        content_type: str = "application/octet-stream",
+    ):
+        """
+        Publishes a binary message to the specified RabbitMQ queue.
+
+        The body is sent as-is, without any serialization, and metadata travels
+        in the message headers.
+
+        Parameters
+        ----------
+        queue_id : str
+            The ID of the RabbitMQ queue to which the message should be published.
+        body : bytes
+            The raw message body.
+        headers : dict, optional
+            The AMQP headers of the message (default is None).
+        content_type : str, optional
+            The content type of the body (default is
+            "application/octet-stream").
         """
         self.channel.basic_publish(
-            exchange="", routing_key=queue_id, body=json.dumps(message)
+            exchange="",
+            routing_key=queue_id,
+            body=body,
+            properties=pika.BasicProperties(
+                content_type=content_type, headers=headers
+            ),
         )
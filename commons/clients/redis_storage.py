@@ -1,18 +1,199 @@
-import json
+import threading
+import time
+from contextlib import contextmanager
 
 import redis
 
+from commons.clients.codecs import (
+    JSONCodec,
+    get_codec,
+    pack_value,
+    unpack_value,
+)
+
+# Jobs whose first half comes in several parts (e.g., the pages of a document)
+# and whose second half is shared by all of them (e.g., the PII terms). KEYS
+# are the shared half, the hash of pending parts, the number of parts joined so
+# far and the total number of parts; see `part_keys`.
+_EXPIRE = """
+local function expire(key)
+    if ARGV[#ARGV] ~= '' then
+        redis.call('EXPIRE', key, ARGV[#ARGV])
+    end
+end
+"""
+
+# Joins one part (ARGV: part, data, count, ttl): returns the shared half if it
+# is stored, and forgets it once every part has been joined, otherwise stores
+# the part as pending.
+PART_JOIN_SCRIPT = _EXPIRE + """
+local shared = redis.call('GET', KEYS[1])
+if not shared then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    redis.call('SET', KEYS[4], ARGV[3])
+    expire(KEYS[2])
+    expire(KEYS[4])
+    return false
+end
+local done = redis.call('INCR', KEYS[3])
+if done >= tonumber(ARGV[3]) then
+    redis.call('DEL', KEYS[1], KEYS[3], KEYS[4])
+else
+    expire(KEYS[3])
+end
+return shared
+"""
+
+# Joins the shared half (ARGV: data, ttl): takes every pending part, and stores
+# the shared half for the parts still to come. Returns the total number of
+# parts (0 when unknown) and the pending parts, as a flat field/value list.
+SHARED_JOIN_SCRIPT = _EXPIRE + """
+local parts = redis.call('HGETALL', KEYS[2])
+local count = tonumber(redis.call('GET', KEYS[4]) or '0')
+redis.call('DEL', KEYS[2])
+local done = redis.call('INCRBY', KEYS[3], #parts / 2)
+if count > 0 and done >= count then
+    redis.call('DEL', KEYS[3], KEYS[4])
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+    expire(KEYS[1])
+    expire(KEYS[3])
+end
+return {count, parts}
+"""
+
+
+# Collects one part of a result (ARGV: part, data, count, ttl): returns every
+# part, as a flat field/value list, once `count` parts are collected, and
+# forgets them; otherwise returns false.
+COLLECT_SCRIPT = _EXPIRE + """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+if redis.call('HLEN', KEYS[1]) < tonumber(ARGV[3]) then
+    expire(KEYS[1])
+    return false
+end
+local parts = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return parts
+"""
+
+
+def part_keys(key, shared_type, part_type):
+    """
+    Returns the Redis keys of a job joined in parts, in the order expected by
+    `PART_JOIN_SCRIPT` and `SHARED_JOIN_SCRIPT`.
+
+    Parameters
+    ----------
+    key : str
+        The base key (e.g., an img ID) of the job.
+    shared_type : str
+        The type of the half shared by every part (e.g., "pii_terms").
+    part_type : str
+        The type of the half that comes in parts (e.g., "bounding_boxes").
+
+    Returns
+    -------
+    list of str
+        The keys of the shared half, the pending parts, the joined part count
+        and the total part count.
+    """
+    return [
+        f"{key}:{shared_type}",
+        f"{key}:{part_type}:parts",
+        f"{key}:{part_type}:done",
+        f"{key}:{part_type}:count",
+    ]
+
+
+def job_keys(key):
+    """
+    Returns every Redis key the two halves of a FilterPII job may be stored
+    under: the keys of its join (see `part_keys`) and the filtered chunks
+    collected for a streamed image (see `RedisStorage.collect_part`).
+
+    Parameters
+    ----------
+    key : str
+        The base key (e.g., an img ID) of the job.
+
+    Returns
+    -------
+    list of str
+        The keys of the job.
+    """
+    return part_keys(key, "pii_terms", "bounding_boxes") + [
+        f"{key}:filtered_boxes:collected"
+    ]
+
+
+def unpack_parts(reply):
+    """
+    Decodes the reply of `SHARED_JOIN_SCRIPT`.
+
+    Parameters
+    ----------
+    reply : list
+        The total part count and the flat field/value list of pending parts.
+
+    Returns
+    -------
+    tuple of (dict, int or None)
+        The pending parts by index, and the total number of parts (None when
+        unknown).
+    """
+    count, flat = reply
+    return unpack_fields(flat), count or None
+
+
+def unpack_fields(flat):
+    """
+    Decodes a flat field/value list of parts, as returned by `HGETALL`.
+
+    Parameters
+    ----------
+    flat : list
+        The part indices and their packed data, alternating.
+
+    Returns
+    -------
+    dict
+        The parts by index.
+    """
+    return {
+        int(flat[i]): unpack_value(flat[i + 1]) for i in range(0, len(flat), 2)
+    }
+
 
 class RedisStorage:
     """
     A client to interact with Redis for storing, retrieving, and deleting data.
 
-    The RedisStorage class provides methods for storing, retrieving, and deleting data in a Redis instance.
-    The data is stored under composite keys based on the job ID and data type.
+    The RedisStorage class provides methods for storing, retrieving, and
+    deleting data in a Redis instance. The data is stored under composite keys
+    based on the job ID and data type, and expires after `ttl` seconds so that
+    data of jobs that never complete does not stay in Redis forever.
+
+    Connections come from a pool shared by every thread using the storage,
+    batch operations are pipelined into a single round trip, and the latency of
+    each operation is recorded (see `latency_stats`).
 
     """
 
-    def __init__(self, host="localhost", port=6379, db=0):
+    def __init__(
+        self,
+        host="localhost",
+        port=6379,
+        db=0,
+        codec=JSONCodec.name,
+        ttl=86400,
+        max_connections=None,
+        socket_timeout=None,
+        socket_connect_timeout=None,
+        socket_keepalive=True,
+        health_check_interval=30,
+        client=None,
+    ):
         """
         Initializes the RedisStorage with a connection to the Redis database.
 
@@ -24,15 +205,101 @@ class RedisStorage:
             The port number on which the Redis server is listening (default is 6379).
         db : int, optional
             The Redis database number to use (default is 0).
+        codec : str, optional
+            The name of the codec used to serialize stored data (default is
+            "json"). Data is always read back with the codec it was written
+            with.
+        ttl : int, optional
+            The number of seconds after which stored data expires (default is
+            86400, one day). None disables expiry.
+        max_connections : int, optional
+            The maximum number of pooled connections (default is None, which
+            means no limit).
+        socket_timeout : float, optional
+            The number of seconds to wait for a reply before failing an
+            operation (default is None, no timeout).
+        socket_connect_timeout : float, optional
+            The number of seconds to wait for a connection to be established
+            (default is None, no timeout).
+        socket_keepalive : bool, optional
+            Whether to enable TCP keepalive on pooled connections (default is
+            True).
+        health_check_interval : int, optional
+            The number of idle seconds after which a pooled connection is
+            checked before use (default is 30).
+        client : redis.Redis, optional
+            An existing client to use instead of connecting to `host`, such as
+            an in-memory fake (default is None). The connection settings are
+            then ignored.
+        """
+        if client is None:
+            self.pool = redis.ConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                max_connections=max_connections,
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=socket_connect_timeout,
+                socket_keepalive=socket_keepalive,
+                health_check_interval=health_check_interval,
+            )
+            client = redis.Redis(connection_pool=self.pool)
+        else:
+            self.pool = client.connection_pool
+        self.client = client
+        self.codec = get_codec(codec)
+        self.ttl = ttl
+        self._part_join_script = self.client.register_script(PART_JOIN_SCRIPT)
+        self._shared_join_script = self.client.register_script(
+            SHARED_JOIN_SCRIPT
+        )
+        self._collect_script = self.client.register_script(COLLECT_SCRIPT)
+        self._latency = {}
+        self._latency_lock = threading.Lock()
+
+    @contextmanager
+    def _timed(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._latency_lock:
+                stats = self._latency.setdefault(operation, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+    def latency_stats(self):
+        """
+        Returns the latency counters of each Redis operation since the storage
+        was created.
+
+        Returns
+        -------
+        dict
+            A mapping of operation name (e.g., "join_part" or "retrieve_many")
+            to a dict with the number of calls ("count"), the total time spent
+            in them ("total_seconds") and the slowest call ("max_seconds").
         """
-        self.client = redis.Redis(host=host, port=port, db=db)
+        with self._latency_lock:
+            latency = {op: list(stats) for op, stats in self._latency.items()}
+        return {
+            operation: {
+                "count": count,
+                "total_seconds": total,
+                "max_seconds": slowest,
+            }
+            for operation, (count, total, slowest) in latency.items()
+        }
 
-    def store(self, key, data_type, data):
+    def store(self, key, data_type, data, expire=True):
         """
         Store data in Redis under a composite key (key:data_type).
 
-        The data is serialized as a JSON string and stored in Redis under a key formed by
-        concatenating the `key` and `data_type`, separated by a colon.
+        The data is serialized with the storage's codec and stored in Redis
+        under a key formed by concatenating the `key` and `data_type`,
+        separated by a colon. The key expires after `ttl` seconds.
 
         Parameters
         ----------
@@ -41,20 +308,209 @@ class RedisStorage:
         data_type : str
             A string representing the type of data (e.g., "bounding_boxes" or "pii_terms").
         data : any
-            The data to be stored, which will be serialized into JSON format.
+            The data to be stored, which will be serialized with the storage's
+            codec.
+        expire : bool, optional
+            Whether the data expires after `ttl` seconds (default is True).
+            Long-lived data, such as registered term lists, is stored without
+            expiry.
 
         """
 
         redis_key = f"{key}:{data_type}"
-        self.client.set(redis_key, json.dumps(data))
+        with self._timed("store"):
+            self.client.set(
+                redis_key,
+                pack_value(self.codec, data),
+                ex=self.ttl if expire else None,
+            )
         print(f"Stored {data_type} for job_id {key} in Redis")
 
+    def store_bytes(self, key, data_type, data: bytes):
+        """
+        Store raw bytes, such as an image, in Redis under a composite key
+        (key:data_type), as-is and without the codec. The key expires after
+        `ttl` seconds.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) to associate the data with.
+        data_type : str
+            A string representing the type of data (e.g., "image").
+        data : bytes
+            The bytes to store.
+        """
+        with self._timed("store_bytes"):
+            self.client.set(f"{key}:{data_type}", data, ex=self.ttl)
+        print(
+            f"Stored {len(data)} bytes of {data_type} for job_id {key} in "
+            "Redis"
+        )
+
+    def retrieve_bytes(self, key, data_type, delete=False):
+        """
+        Retrieve raw bytes stored with `store_bytes`.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) to retrieve the data for.
+        data_type : str
+            A string representing the type of data (e.g., "image").
+        delete : bool, optional
+            Whether to delete the data in the same round trip, once it is no
+            longer needed (default is False).
+
+        Returns
+        -------
+        bytes or None
+            The stored bytes, or None if there are none.
+        """
+        redis_key = f"{key}:{data_type}"
+        with self._timed("retrieve_bytes"):
+            if delete:
+                return self.client.getdel(redis_key)
+            return self.client.get(redis_key)
+
+    def join_part(self, key, part_type, part, data, count, shared_type):
+        """
+        Join one part of a job whose first half comes in several parts, such as
+        the pages of a document.
+
+        The shared half (e.g., the PII terms) is not consumed by the first
+        part: it is returned to every part, and only deleted once `count` parts
+        have been joined. A part arriving before the shared half is stored as
+        pending, and handed over by `join_shared`. Both steps are atomic Lua
+        scripts.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) of the job.
+        part_type : str
+            The type of the parts (e.g., "bounding_boxes").
+        part : int
+            The index of this part (e.g., the page number).
+        data : any
+            The data of this part, which will be serialized with the storage's
+            codec.
+        count : int
+            The total number of parts of the job.
+        shared_type : str
+            The type of the shared half (e.g., "pii_terms").
+
+        Returns
+        -------
+        any or None
+            The shared half if it was already stored, otherwise None.
+        """
+        with self._timed("join_part"):
+            shared = self._part_join_script(
+                keys=part_keys(key, shared_type, part_type),
+                args=[
+                    part,
+                    pack_value(self.codec, data),
+                    count,
+                    self.ttl or "",
+                ],
+            )
+        if shared is None:
+            print(f"Stored {part_type} {part} for job_id {key} in Redis")
+            return None
+        print(f"Joined {part_type} {part} with {shared_type} for job_id {key}")
+        return unpack_value(shared)
+
+    def join_shared(self, key, shared_type, data, part_type):
+        """
+        Join the shared half of a job whose other half comes in parts. See
+        `join_part`.
+
+        Every pending part is taken out of Redis and returned. The shared half
+        is stored for the parts still to come, unless every part has already
+        been joined.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) of the job.
+        shared_type : str
+            The type of the shared half (e.g., "pii_terms").
+        data : any
+            The shared half, which will be serialized with the storage's codec.
+        part_type : str
+            The type of the parts (e.g., "bounding_boxes").
+
+        Returns
+        -------
+        tuple of (dict, int or None)
+            The pending parts by index, and the total number of parts (None
+            when no part arrived yet).
+        """
+        with self._timed("join_shared"):
+            reply = self._shared_join_script(
+                keys=part_keys(key, shared_type, part_type),
+                args=[pack_value(self.codec, data), self.ttl or ""],
+            )
+        parts, count = unpack_parts(reply)
+        print(
+            f"Joined {shared_type} with {len(parts)} {part_type} for job_id "
+            f"{key}"
+        )
+        return parts, count
+
+    def collect_part(self, key, data_type, part, data, count):
+        """
+        Collect one part of a result computed in parts, such as the filtered
+        chunks of an image, until every part is there.
+
+        The parts are kept in a Redis hash. The part that completes it gets
+        every part back, in a single atomic Lua script, and the hash is
+        deleted, so exactly one replica assembles the result.
+
+        Parameters
+        ----------
+        key : str
+            The base key (e.g., an img ID) of the result.
+        data_type : str
+            The type of the parts (e.g., "filtered_boxes").
+        part : int
+            The index of this part.
+        data : any
+            The data of this part, which will be serialized with the storage's
+            codec.
+        count : int
+            The total number of parts.
+
+        Returns
+        -------
+        dict or None
+            Every part by index once `count` parts are collected, otherwise
+            None.
+        """
+        with self._timed("collect_part"):
+            flat = self._collect_script(
+                keys=[f"{key}:{data_type}:collected"],
+                args=[
+                    part,
+                    pack_value(self.codec, data),
+                    count,
+                    self.ttl or "",
+                ],
+            )
+        if flat is None:
+            print(f"Collected {data_type} {part} for job_id {key} in Redis")
+            return None
+        print(f"Collected all {count} {data_type} for job_id {key}")
+        return unpack_fields(flat)
+
     def retrieve(self, key, data_type):
         """
         Retrieve data from Redis based on a composite key (key:data_type).
 
-        The data is retrieved from Redis using a composite key formed by concatenating
-        the `key` and `data_type`. If data is found, it is deserialized from JSON format.
+        The data is retrieved from Redis using a composite key formed by
+        concatenating the `key` and `data_type`. If data is found, it is
+        deserialized with the codec it was stored with.
 
         Parameters
         ----------
@@ -66,27 +522,94 @@ class RedisStorage:
         Returns
         -------
         dict or None
-            The data retrieved from Redis, deserialized from JSON format. If no data is found, `None` is returned.
+            The data retrieved from Redis. If no data is found, `None` is
+            returned.
         """
         redis_key = f"{key}:{data_type}"
-        data_json = self.client.get(redis_key)
+        with self._timed("retrieve"):
+            data_json = self.client.get(redis_key)
         if data_json:
-            return json.loads(data_json)
+            return unpack_value(data_json)
         return None
 
     def delete(self, key):
         """
-        Delete all related data (bounding boxes and PII terms) for a given img_id.
+        Delete all related data (bounding boxes and PII terms) for a given
+        img_id.
 
-        This method deletes the keys associated with both the "bounding_boxes" and "pii_terms"
-        for the given `key` (img ID) in Redis.
+        This method deletes every key of the job in Redis (see `job_keys`):
+        the PII terms, the pending bounding boxes of its pages or chunks, the
+        counts of their join and the filtered chunks collected so far.
 
         Parameters
         ----------
         key : str
-            The base key (e.g., an img ID) for which all related data should be deleted.
+            The base key (e.g., an img ID) for which all related data should be
+            deleted.
 
         """
-        self.client.delete(f"{key}:bounding_boxes")
-        self.client.delete(f"{key}:pii_terms")
+        with self._timed("delete"):
+            self.client.delete(*job_keys(key))
         print(f"Deleted data for job_id {key} from Redis")
+
+    def store_many(self, items, expire=True):
+        """
+        Store several values in a single pipelined round trip.
+
+        Parameters
+        ----------
+        items : iterable of tuple
+            The `(key, data_type, data)` triples to store, as they would be
+            passed to `store`.
+        expire : bool, optional
+            Whether the values expire after `ttl` seconds (default is True).
+
+        """
+        with self._timed("store_many"):
+            with self.client.pipeline(transaction=False) as pipe:
+                for key, data_type, data in items:
+                    pipe.set(
+                        f"{key}:{data_type}",
+                        pack_value(self.codec, data),
+                        ex=self.ttl if expire else None,
+                    )
+                pipe.execute()
+
+    def retrieve_many(self, keys):
+        """
+        Retrieve several values in a single round trip.
+
+        Parameters
+        ----------
+        keys : iterable of tuple
+            The `(key, data_type)` pairs to retrieve, as they would be passed
+            to `retrieve`.
+
+        Returns
+        -------
+        list
+            The value of each pair, in order, or None where no data is found.
+        """
+        redis_keys = [f"{key}:{data_type}" for key, data_type in keys]
+        if not redis_keys:
+            return []
+        with self._timed("retrieve_many"):
+            values = self.client.mget(redis_keys)
+        return [unpack_value(value) if value else None for value in values]
+
+    def delete_many(self, keys):
+        """
+        Delete all related data (bounding boxes and PII terms) of several
+        img_ids in a single round trip. See `delete`.
+
+        Parameters
+        ----------
+        keys : iterable of str
+            The base keys (e.g., img IDs) for which all related data should be
+            deleted.
+
+        """
+        redis_keys = [redis_key for key in keys for redis_key in job_keys(key)]
+        if redis_keys:
+            with self._timed("delete_many"):
+                self.client.delete(*redis_keys)
@@ -0,0 +1,549 @@
+from array import array
+from collections.abc import Mapping
+from itertools import compress
+from operator import add, itemgetter
+from typing import Iterable, List, Sequence, Tuple
+
+# The integer columns of a batch; with "text", the fields of TextBoundingBox in
+# the same order, before its metadata
+COLUMNS = (
+    "left",
+    "right",
+    "top",
+    "bottom",
+    "block_num",
+    "par_num",
+    "line_num",
+    "word_num",
+)
+FIELDS = ("text",) + COLUMNS
+
+# Tesseract's layout indices, which boxes from other sources may lack
+LAYOUT_COLUMNS = ("block_num", "par_num", "line_num", "word_num")
+
+# Float columns of the Tesseract metadata a batch keeps when the OCR backend
+# reports it: the word confidence, from 0 to 100
+OPTIONAL_COLUMNS = ("conf",)
+
+# Stored in place of a missing value: Tesseract numbers blocks, paragraphs,
+# lines and words from 0, and reports a confidence of -1 for what is not a word
+_MISSING = -1
+
+
+def _field(box, name):
+    if isinstance(box, Mapping):
+        return box.get(name)
+    return getattr(box, name, None)
+
+
+def _same_metadata(value, other) -> bool:
+    # Metadata is only compared when both sides have it
+    return value is None or other is None or value == other
+
+
+def _empty_columns(optional=()) -> dict:
+    columns = {name: array("q") for name in COLUMNS}
+    columns.update((name, array("d")) for name in optional)
+    return columns
+
+
+def _gatherer(rows):
+    """
+    Helper to return a function picking the given rows of a column, as a tuple
+    built in a single call.
+    """
+    if not rows:
+        return lambda values: ()
+    if len(rows) == 1:
+        index = rows[0]
+        return lambda values: (values[index],)
+    return itemgetter(*rows)
+
+
+def _column_property(name):
+    if name in OPTIONAL_COLUMNS:
+
+        def getter(self):
+            column = self._batch.columns.get(name)
+            value = _MISSING if column is None else column[self._index]
+            return None if value == _MISSING else value
+
+    elif name in LAYOUT_COLUMNS:
+
+        def getter(self):
+            value = self._batch.columns[name][self._index]
+            return None if value == _MISSING else value
+
+    else:
+
+        def getter(self):
+            return self._batch.columns[name][self._index]
+
+    def setter(self, value):
+        self._batch.columns[name][self._index] = (
+            _MISSING if value is None else value
+        )
+
+    return property(getter, setter)
+
+
+class BoundingBox:
+    """
+    A row of a `BoundingBoxBatch`, read and written through to the columns of
+    the batch.
+
+    A row has the attributes of a `TextBoundingBox`, and also the item access
+    of the dict it is serialized to, so code written for either works on it. It
+    compares equal to a `TextBoundingBox`, a row or a dict with the same
+    fields, and the same metadata where both have it. The Tesseract metadata of
+    `OPTIONAL_COLUMNS` is read as attributes too (e.g. `conf`), None when the
+    batch does not keep it.
+
+    """
+
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "BoundingBoxBatch", index: int):
+        self._batch = batch
+        self._index = index
+
+    @property
+    def text(self) -> str:
+        return self._batch.texts[self._index]
+
+    @text.setter
+    def text(self, value: str):
+        self._batch.texts[self._index] = value
+
+    def __getitem__(self, key: str):
+        if key not in self._batch.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        """
+        Returns the value of a field, or `default` for unknown fields and
+        missing values.
+        """
+        value = getattr(self, key) if key in self._batch.fields else None
+        return default if value is None else value
+
+    def to_dict(self) -> dict:
+        """
+        Returns the row as the dict it is serialized to, with the keys of
+        `TextBoundingBox` and the metadata.
+        """
+        return {name: getattr(self, name) for name in self._batch.fields}
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            mine, theirs = self.to_dict(), dict(other)
+            for name in OPTIONAL_COLUMNS:
+                # Metadata is only compared when both sides have it
+                if mine.get(name) is None or theirs.get(name) is None:
+                    mine.pop(name, None)
+                    theirs.pop(name, None)
+            return mine == theirs
+        if not all(hasattr(other, name) for name in FIELDS):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in FIELDS
+        ) and all(
+            _same_metadata(getattr(self, name), getattr(other, name, None))
+            for name in OPTIONAL_COLUMNS
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in FIELDS
+        )
+        return f"BoundingBox({fields})"
+
+
+for _name in COLUMNS + OPTIONAL_COLUMNS:
+    setattr(BoundingBox, _name, _column_property(_name))
+
+
+class BoundingBoxBatch:
+    """
+    The bounding boxes of an image, stored column by column.
+
+    Coordinates and layout indices are kept in one `array` per field and the
+    texts in a single list, so a dense page takes a few objects rather than one
+    per word. Batches built from OCR output also keep the word confidences, in
+    a "conf" column. Indexing returns a `BoundingBox` row view, and iterating
+    yields them, so a batch can stand in for a list of `TextBoundingBox`.
+    Filtering takes a mask with one flag per box, and the batch serializes
+    straight to the wire formats: the dicts of the JSON and MessagePack codecs,
+    or the columns of the columnar codec (see `commons.clients.codecs`).
+
+    """
+
+    __slots__ = ("texts", "columns")
+
+    def __init__(self, texts: List[str] = None, columns: dict = None):
+        """
+        Initializes a batch from its columns.
+
+        Parameters
+        ----------
+        texts : list of str, optional
+            The text of each box (default is None, an empty batch).
+        columns : dict of str to array, optional
+            An `array("q")` for each of `COLUMNS`, and optionally an
+            `array("d")` for each of `OPTIONAL_COLUMNS`, as long as `texts`,
+            where missing values are stored as -1 (default is None, an empty
+            batch).
+
+        Raises
+        ------
+        ValueError
+            If a column is missing or unknown, or its length differs from the
+            number of texts.
+        """
+        self.texts = list(texts) if texts is not None else []
+        self.columns = columns if columns is not None else _empty_columns()
+        for name in COLUMNS:
+            if name not in self.columns:
+                raise ValueError(f"Column {name} is missing")
+        for name, column in self.columns.items():
+            if name not in COLUMNS + OPTIONAL_COLUMNS:
+                raise ValueError(f"Unknown column {name}")
+            if len(column) != len(self.texts):
+                raise ValueError(
+                    f"Column {name} does not hold one value per box"
+                )
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        """
+        The fields of the rows: those of `TextBoundingBox`, then the metadata
+        the batch keeps.
+        """
+        return FIELDS + tuple(
+            name for name in OPTIONAL_COLUMNS if name in self.columns
+        )
+
+    @classmethod
+    def from_ocr_data(cls, ocr_data: dict) -> "BoundingBoxBatch":
+        """
+        Builds a batch from the output of an OCR backend, keeping the words
+        that are not blank.
+
+        The words that are not blank are found in one pass over the texts, then
+        every column is gathered and the right and bottom edges are computed in
+        bulk, without a dict or an object per word.
+
+        Parameters
+        ----------
+        ocr_data : dict
+            The columns returned by `OCRBackend.image_to_data` (lists or
+            arrays, see `parse_tsv` in `PerformOCR.src.backends`), with "left",
+            "top", "width" and "height" per word. The word confidences are kept
+            when there is a "conf" column.
+
+        Returns
+        -------
+        BoundingBoxBatch
+            The boxes of the words, with "right" and "bottom" computed from the
+            width and height.
+        """
+        rows = [i for i, text in enumerate(ocr_data["text"]) if text.strip()]
+        gather = _gatherer(rows)
+        left, top = gather(ocr_data["left"]), gather(ocr_data["top"])
+        columns = {
+            "left": array("q", left),
+            "right": array("q", map(add, left, gather(ocr_data["width"]))),
+            "top": array("q", top),
+            "bottom": array("q", map(add, top, gather(ocr_data["height"]))),
+        }
+        for name in LAYOUT_COLUMNS:
+            columns[name] = array("q", gather(ocr_data[name]))
+        for name in OPTIONAL_COLUMNS:
+            if name in ocr_data:
+                columns[name] = array("d", gather(ocr_data[name]))
+        return cls(list(gather(ocr_data["text"])), columns)
+
+    @classmethod
+    def from_boxes(cls, boxes: Iterable) -> "BoundingBoxBatch":
+        """
+        Builds a batch from bounding boxes given one by one.
+
+        Parameters
+        ----------
+        boxes : iterable
+            `TextBoundingBox` objects, `BoundingBox` rows or dicts with the
+            same keys. A batch is returned as is. Metadata such as "conf" is
+            kept when every box has it.
+
+        Returns
+        -------
+        BoundingBoxBatch
+            The boxes.
+        """
+        if isinstance(boxes, cls):
+            return boxes
+        boxes = list(boxes)
+        batch = cls(
+            columns=_empty_columns(
+                name
+                for name in OPTIONAL_COLUMNS
+                if boxes
+                and all(_field(box, name) is not None for box in boxes)
+            )
+        )
+        for box in boxes:
+            batch.append(box)
+        return batch
+
+    @classmethod
+    def concat(
+        cls, batches: Iterable["BoundingBoxBatch"]
+    ) -> "BoundingBoxBatch":
+        """
+        Joins batches one after the other into a new batch, keeping the
+        metadata that all of them have.
+        """
+        batches = [cls.from_boxes(other) for other in batches]
+        batch = cls(
+            columns=_empty_columns(
+                name
+                for name in OPTIONAL_COLUMNS
+                if batches and all(name in other.columns for other in batches)
+            )
+        )
+        for other in batches:
+            batch.extend(other)
+        return batch
+
+    def append(self, box):
+        """Adds a box at the end of the batch, given like in `from_boxes`."""
+        for name, column in self.columns.items():
+            value = _field(box, name)
+            column.append(_MISSING if value is None else value)
+        self.texts.append(_field(box, "text"))
+
+    def extend(self, boxes):
+        """
+        Adds boxes at the end of the batch, given as a batch or like in
+        `from_boxes`.
+        """
+        if not isinstance(boxes, BoundingBoxBatch):
+            for box in boxes:
+                self.append(box)
+            return
+        for name, column in self.columns.items():
+            other = boxes.columns.get(name)
+            column.extend(
+                other
+                if other is not None
+                else array(column.typecode, [_MISSING]) * len(boxes)
+            )
+        self.texts.extend(boxes.texts)
+
+    def copy(self) -> "BoundingBoxBatch":
+        """
+        Returns a copy of the batch, whose rows can be changed independently.
+        """
+        return BoundingBoxBatch(
+            self.texts,
+            {
+                name: array(column.typecode, column)
+                for name, column in self.columns.items()
+            },
+        )
+
+    def compress(self, mask: Sequence) -> "BoundingBoxBatch":
+        """
+        Selects boxes with a mask.
+
+        Parameters
+        ----------
+        mask : sequence
+            One flag per box, e.g. a list of bool or a `bytearray`: the boxes
+            whose flag is true are kept.
+
+        Returns
+        -------
+        BoundingBoxBatch
+            A new batch of the selected boxes, in order.
+        """
+        return BoundingBoxBatch(
+            list(compress(self.texts, mask)),
+            {
+                name: array(column.typecode, compress(column, mask))
+                for name, column in self.columns.items()
+            },
+        )
+
+    def translate(
+        self, dx: int, dy: int, block_offset: int = 0
+    ) -> "BoundingBoxBatch":
+        """
+        Offsets the boxes of a region back into the image it was cropped from.
+
+        Parameters
+        ----------
+        dx, dy : int
+            The position of the region in the image.
+        block_offset : int, optional
+            Added to the block numbers, so that blocks of different regions
+            stay apart (default is 0).
+
+        Returns
+        -------
+        BoundingBoxBatch
+            A new batch of the moved boxes.
+        """
+        columns = {
+            name: array("q", [value + offset for value in self.columns[name]])
+            for name, offset in (
+                ("left", dx),
+                ("right", dx),
+                ("top", dy),
+                ("bottom", dy),
+            )
+        }
+        columns["block_num"] = array(
+            "q",
+            [
+                value if value == _MISSING else value + block_offset
+                for value in self.columns["block_num"]
+            ],
+        )
+        for name, column in self.columns.items():
+            if name not in columns:
+                columns[name] = array(column.typecode, column)
+        return BoundingBoxBatch(self.texts, columns)
+
+    def _has_missing(self, name):
+        return (
+            name in LAYOUT_COLUMNS + OPTIONAL_COLUMNS
+            and _MISSING in self.columns[name]
+        )
+
+    def values(self, name: str) -> list:
+        """
+        Returns the values of a field as a list, with None for missing values.
+        """
+        if name == "text":
+            return list(self.texts)
+        values = self.columns[name].tolist()
+        if self._has_missing(name):
+            return [None if value == _MISSING else value for value in values]
+        return values
+
+    def to_dicts(self) -> List[dict]:
+        """
+        Serializes the batch for the JSON and MessagePack codecs.
+
+        Returns
+        -------
+        list of dict
+            One dict per box, with the keys of `TextBoundingBox` and the
+            metadata the batch keeps.
+        """
+        fields = self.fields
+        columns = [self.values(name) for name in fields]
+        return [dict(zip(fields, row)) for row in zip(*columns)]
+
+    def to_columns(self) -> dict:
+        """
+        Serializes the batch for the columnar codec, in the format of
+        `commons.clients.codecs.encode_columns`.
+
+        The arrays are written out as they are, without going through a dict
+        per box.
+
+        Returns
+        -------
+        dict
+            The number of boxes under "size" and the column of each field under
+            "columns".
+        """
+        encoded = [text.encode("utf-8") for text in self.texts]
+        columns = {
+            "text": {
+                "type": "text",
+                "lengths": array("I", map(len, encoded)).tobytes(),
+                "blob": b"".join(encoded),
+            }
+        }
+        for name, column in self.columns.items():
+            if self._has_missing(name):
+                columns[name] = {"type": "list", "data": self.values(name)}
+            else:
+                columns[name] = {
+                    "type": column.typecode,
+                    "data": column.tobytes(),
+                }
+        return {"size": len(self), "columns": columns}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        return (BoundingBox(self, index) for index in range(len(self)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return BoundingBoxBatch(
+                self.texts[index],
+                {name: column[index] for name, column in self.columns.items()},
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("bounding box index out of range")
+        return BoundingBox(self, index)
+
+    def __add__(self, other):
+        if not isinstance(other, (BoundingBoxBatch, list)):
+            return NotImplemented
+        return BoundingBoxBatch.concat((self, other))
+
+    def __eq__(self, other):
+        if isinstance(other, BoundingBoxBatch):
+            return self.texts == other.texts and self.columns == other.columns
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            row == box for row, box in zip(self, other)
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"BoundingBoxBatch({list(self)!r})"
+
+
+def as_batch(boxes) -> BoundingBoxBatch:
+    """
+    Returns boxes as a batch, building one when they are given one by one (see
+    `BoundingBoxBatch.from_boxes`).
+    """
+    return BoundingBoxBatch.from_boxes(boxes)
+
+
+def select(boxes, mask: Sequence):
+    """
+    Selects boxes with a mask, keeping them in the form they were given.
+
+    Parameters
+    ----------
+    boxes : BoundingBoxBatch or list
+        The boxes.
+    mask : sequence
+        One flag per box: the boxes whose flag is true are kept.
+
+    Returns
+    -------
+    BoundingBoxBatch or list
+        A batch of the selected boxes if `boxes` is a batch, and a list of them
+        otherwise.
+    """
+    if isinstance(boxes, BoundingBoxBatch):
+        return boxes.compress(mask)
+    return list(compress(boxes, mask))
@@ -1,10 +1,14 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass(order=True)
 class TextBoundingBox:
     """Pillow-type Bounding Box.
-    Co-ordinates start in (0,0) in the Top Left Corner.
+    Co-ordinates start in (0,0) in the Top Left Corner. Block, paragraph, line
+    and word numbers are Tesseract's layout indices, used to rebuild text
+    lines. The confidence is Tesseract's, from 0 to 100, when the OCR backend
+    reports it.
     """
 
     text: str
@@ -12,3 +16,8 @@ class TextBoundingBox:
     right: int
     top: int
     bottom: int
+    block_num: Optional[int] = None
+    par_num: Optional[int] = None
+    line_num: Optional[int] = None
+    word_num: Optional[int] = None
+    conf: Optional[float] = None
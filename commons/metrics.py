@@ -0,0 +1,351 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+# Upper bounds of the latency histogram buckets, in seconds, from the
+# sub-millisecond Redis round trips to the OCR of large scans
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\""))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metrics:
+    """
+    A registry of counters and latency histograms, rendered in the Prometheus
+    text format.
+
+    Recording a value takes a lock and, for histograms, a binary search of the
+    buckets, so instrumentation can stay on in production. Components that
+    already count their own statistics (e.g., cache hits or Redis latencies)
+    are read through collectors when the metrics are rendered, rather than
+    updated twice.
+
+    The registry is per process: OCR worker processes record into their own
+    registry, and hand its histograms to the parent process with
+    `pop_histograms` and `merge_histograms`.
+
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initializes an empty registry.
+
+        Parameters
+        ----------
+        buckets : tuple of float, optional
+            The upper bounds of the histogram buckets, in seconds (default is
+            `DEFAULT_BUCKETS`).
+        """
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Increments a counter.
+
+        Parameters
+        ----------
+        name : str
+            The name of the counter, ending in "_total" by convention.
+        value : float, optional
+            The increment (default is 1).
+        **labels
+            The labels of the series (e.g., `outcome="error"`).
+        """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        Records a duration in a histogram.
+
+        Parameters
+        ----------
+        name : str
+            The name of the histogram, ending in "_seconds" by convention.
+        seconds : float
+            The duration to record.
+        **labels
+            The labels of the series (e.g., `stage="ocr"`).
+        """
+        key = (name, _labels_key(labels))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (the last one is +Inf), the sum and the
+                # count
+                histogram = self._histograms[key] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """
+        Records the duration of a block in a histogram, whether or not it
+        raises.
+
+        Parameters
+        ----------
+        name : str
+            The name of the histogram.
+        **labels
+            The labels of the series.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def pop_histograms(self) -> dict:
+        """
+        Returns the histograms recorded so far and clears them, so each call
+        only returns what was recorded since the previous one.
+
+        Returns
+        -------
+        dict
+            The histograms, in the picklable form `merge_histograms` accepts.
+        """
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+        return histograms
+
+    def merge_histograms(self, histograms: dict):
+        """
+        Adds histograms popped from another registry to this one.
+
+        Parameters
+        ----------
+        histograms : dict
+            The histograms, as returned by `pop_histograms` on a registry with
+            the same buckets.
+
+        Raises
+        ------
+        ValueError
+            If the histograms were recorded with other buckets.
+        """
+        if any(
+            len(buckets) != len(self.buckets) + 1
+            for buckets, _, _ in histograms.values()
+        ):
+            raise ValueError("Cannot merge histograms with different buckets")
+        with self._lock:
+            for key, (buckets, total, count) in histograms.items():
+                histogram = self._histograms.setdefault(
+                    key, [[0] * len(buckets), 0.0, 0]
+                )
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+                histogram[2] += count
+
+    def register_collector(
+        self, name: str, collect: Callable[[], dict], label: str = None
+    ):
+        """
+        Exports the statistics a component already keeps, read each time the
+        metrics are rendered.
+
+        Parameters
+        ----------
+        name : str
+            The prefix of the exported gauges.
+        collect : callable
+            Returns a dict of numbers, each exported as the gauge
+            "<name>_<key>". With a `label`, it returns a dict of such dicts
+            instead, and the outer keys become the values of the label.
+        label : str, optional
+            The label the outer keys of a nested dict are exported under
+            (default is None, a flat dict).
+        """
+        with self._lock:
+            self._collectors.append((name, collect, label))
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        Returns the current value of a counter, 0 if it was never incremented.
+        """
+        with self._lock:
+            return self._counters.get((name, _labels_key(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[dict]:
+        """
+        Returns the current state of a histogram.
+
+        Returns
+        -------
+        dict or None
+            The "count" and "sum" of the recorded durations and the per-bucket
+            counts ("buckets", not cumulative, the last one being +Inf), or
+            None if nothing was recorded.
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, _labels_key(labels)))
+            if histogram is None:
+                return None
+            buckets, total, count = histogram
+            return {"buckets": list(buckets), "sum": total, "count": count}
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            The metrics, one sample per line.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, ([*buckets], total, count))
+                for key, (buckets, total, count) in self._histograms.items()
+            )
+            collectors = list(self._collectors)
+
+        lines, typed = [], set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        for (name, labels), (buckets, total, count) in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket in zip(bounds, buckets):
+                cumulative += bucket
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, [('le', bound)])} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        # Samples of the same gauge are kept together, whichever label value
+        # they belong to
+        gauges = {}
+        for prefix, collect, label in collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {e}")
+                continue
+            series = (
+                [((), stats)]
+                if label is None
+                else [
+                    (((label, key),), values) for key, values in stats.items()
+                ]
+            )
+            for labels, values in series:
+                for key, value in values.items():
+                    if isinstance(value, (int, float)):
+                        gauges.setdefault(f"{prefix}_{key}", []).append(
+                            (labels, value)
+                        )
+        for name, samples in sorted(gauges.items()):
+            declare(name, "gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# The registry of the process, used by the services and the code they call
+# unless they are given another one
+REGISTRY = Metrics()
+
+
+def start_metrics_server(
+    port: int, registry: Metrics = REGISTRY, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """
+    Serves the metrics of a registry over HTTP on "/metrics", from a daemon
+    thread.
+
+    Parameters
+    ----------
+    port : int
+        The port to listen on. 0 picks a free port, see `server.server_port`.
+    registry : Metrics, optional
+        The registry to serve (default is `REGISTRY`).
+    host : str, optional
+        The address to listen on (default is "0.0.0.0", every interface).
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer
+        The running server, stopped with `shutdown()`.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes come every few seconds, do not log each one
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on port {server.server_port}")
+    return server
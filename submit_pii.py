@@ -1,14 +1,36 @@
-import base64
+import argparse
+import json
+import os
+import time
 import uuid
-from typing import List
+from typing import Iterator, List
 
 from commons.clients.rabbit_mq import RabbitMQClient
 
+PII_QUEUE = "filter_pii_queue"
+OCR_QUEUE = "ocr_queue"
+IMAGE_EXTENSIONS = (
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".tif",
+    ".tiff",
+    ".bmp",
+    ".webp",
+    ".pdf",
+)
 
-def send_pii_list(img_id: str, pii_list: List[str]):
-    # Initialize the RabbitMQ client
-    pii_queue = "filter_pii_queue"
-    rabbitmq_client = RabbitMQClient(connection_params, pii_queue)
+connection_params = "localhost"
+
+
+def send_pii_list(
+    img_id: str, pii_list: List[str], rabbitmq_client: RabbitMQClient = None
+):
+    # Initialize the RabbitMQ client, unless one is being reused
+    pii_queue = PII_QUEUE
+    rabbitmq_client = rabbitmq_client or RabbitMQClient(
+        connection_params, pii_queue
+    )
 
     # Prepare the payload
     payload = {"img_id": img_id, "pii_terms": pii_list}
@@ -19,25 +41,227 @@ def send_pii_list(img_id: str, pii_list: List[str]):
     print(f"Sent PII list for img_id {img_id} to {pii_queue}")
 
 
-def submit_image(image_path: str, img_id: str):
+def register_term_list(
+    term_list_id: str,
+    pii_list: List[str],
+    rabbitmq_client: RabbitMQClient = None,
+):
+    """
+    Registers a PII term list under an ID, so that jobs can refer to it by ID
+    instead of sending the terms.
+
+    Parameters
+    ----------
+    term_list_id : str
+        The ID to register the term list under. Registering an ID again
+        replaces its terms.
+    pii_list : list of str
+        The PII terms.
+    rabbitmq_client : RabbitMQClient, optional
+        The client to publish with (default is a new client).
+    """
+    rabbitmq_client = rabbitmq_client or RabbitMQClient(
+        connection_params, PII_QUEUE
+    )
+    rabbitmq_client.publish_message(
+        PII_QUEUE, {"term_list_id": term_list_id, "pii_terms": pii_list}
+    )
+
+    print(f"Registered term list {term_list_id} in {PII_QUEUE}")
+
+
+def pii_message(job: dict) -> dict:
+    """
+    Builds the PII message of a job, referring to its registered term list when
+    it has one.
+    """
+    if job.get("term_list_id"):
+        message = {
+            "img_id": job["img_id"],
+            "term_list_id": job["term_list_id"],
+        }
+    else:
+        message = {"img_id": job["img_id"], "pii_terms": job["pii_terms"]}
+    if "detectors" in job:
+        message["detectors"] = job["detectors"]
+    return message
+
+
+def submit_image(
+    image_path: str, img_id: str, rabbitmq_client: RabbitMQClient = None
+):
     with open(image_path, "rb") as image_file:
-        image_data = base64.b64encode(image_file.read()).decode("utf-8")
+        image_data = image_file.read()
 
-    # Initialize the RabbitMQ client
-    ocr_queue = "ocr_queue"
-    rabbitmq_client = RabbitMQClient(connection_params, ocr_queue)
+    # Initialize the RabbitMQ client, unless one is being reused
+    ocr_queue = OCR_QUEUE
+    rabbitmq_client = rabbitmq_client or RabbitMQClient(
+        connection_params, ocr_queue
+    )
 
-    payload = {"img_id": img_id, "image_data": image_data}
+    # Send the raw image bytes, with the img_id and metadata as headers
+    headers = {"img_id": img_id, "filename": os.path.basename(image_path)}
 
-    rabbitmq_client.publish_message(ocr_queue, payload)
+    rabbitmq_client.publish_bytes(ocr_queue, image_data, headers=headers)
 
     print(f"Submitted image for img_id {img_id}")
 
 
+def iter_jobs(
+    source: str, pii_list: List[str], term_list_id: str = None
+) -> Iterator[dict]:
+    """
+    Yields the jobs to submit from a directory of images or a JSON lines
+    manifest.
+
+    Every image file of a directory becomes a job with a new img_id and
+    `pii_list`. Each line of a manifest is a JSON object with an "image_path"
+    (relative to the manifest) and optionally an "img_id", "pii_terms" or the
+    "term_list_id" of a registered term list, and the "detectors" to run in
+    place of FilterPII's default ones.
+
+    Parameters
+    ----------
+    source : str
+        The path to a directory of images or to a manifest file.
+    pii_list : list of str
+        The PII terms of jobs that do not specify their own.
+    term_list_id : str, optional
+        The ID under which `pii_list` is registered, sent in its place (default
+        is None).
+
+    Yields
+    ------
+    dict
+        A job with "img_id", "image_path" and "pii_terms", "term_list_id" when
+        it refers to a registered term list, and "detectors" when its manifest
+        entry sets them.
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield _job(
+                    str(uuid.uuid4()),
+                    os.path.join(source, name),
+                    pii_list,
+                    term_list_id,
+                )
+        return
+
+    base_dir = os.path.dirname(source)
+    with open(source) as manifest:
+        for line in manifest:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            own_terms = "pii_terms" in entry or "term_list_id" in entry
+            job = _job(
+                entry.get("img_id") or str(uuid.uuid4()),
+                os.path.join(base_dir, entry["image_path"]),
+                entry.get("pii_terms", pii_list),
+                entry.get("term_list_id") if own_terms else term_list_id,
+            )
+            if "detectors" in entry:
+                job["detectors"] = entry["detectors"]
+            yield job
+
+
+def _job(img_id, image_path, pii_terms, term_list_id):
+    job = {"img_id": img_id, "image_path": image_path, "pii_terms": pii_terms}
+    if term_list_id:
+        job["term_list_id"] = term_list_id
+    return job
+
+
+def submit_bulk(jobs, batch_size: int = 100) -> dict:
+    """
+    Submits many jobs over a single connection, publishing them in confirmed
+    batches.
+
+    Both messages of each job are published on one channel. Each batch is
+    wrapped in an AMQP transaction, so the broker confirms the whole batch in a
+    single round trip rather than one message at a time.
+
+    Parameters
+    ----------
+    jobs : iterable of dict
+        The jobs to submit, as yielded by `iter_jobs`.
+    batch_size : int, optional
+        The number of jobs per confirmed batch (default is 100).
+
+    Returns
+    -------
+    dict
+        The number of images and bytes submitted, the elapsed seconds and the
+        throughput.
+    """
+    rabbitmq_client = RabbitMQClient(connection_params, OCR_QUEUE)
+    channel = rabbitmq_client.channel
+    channel.queue_declare(PII_QUEUE, durable=True)
+    channel.tx_select()
+
+    images = size = pending = 0
+    start = time.perf_counter()
+    for job in jobs:
+        with open(job["image_path"], "rb") as image_file:
+            image_data = image_file.read()
+
+        rabbitmq_client.publish_message(PII_QUEUE, pii_message(job))
+        rabbitmq_client.publish_bytes(
+            OCR_QUEUE,
+            image_data,
+            headers={
+                "img_id": job["img_id"],
+                "filename": os.path.basename(job["image_path"]),
+            },
+        )
+        images += 1
+        size += len(image_data)
+        pending += 1
+
+        if pending == batch_size:
+            channel.tx_commit()
+            pending = 0
+
+    if pending:
+        channel.tx_commit()
+    elapsed = time.perf_counter() - start
+    rabbitmq_client.connection.close()
+
+    return {
+        "images": images,
+        "bytes": size,
+        "seconds": elapsed,
+        "images_per_second": images / elapsed if elapsed else 0.0,
+        "megabytes_per_second": size / 1e6 / elapsed if elapsed else 0.0,
+    }
+
+
 if __name__ == "__main__":
-    connection_params = "localhost"
+    parser = argparse.ArgumentParser(
+        description="Submit images and their PII lists to the OCR pipeline."
+    )
+    parser.add_argument(
+        "source",
+        nargs="?",
+        help="A directory of images or a JSON lines manifest to submit in "
+        "bulk (default: submit img.png once).",
+    )
+    parser.add_argument("--host", default="localhost", help="RabbitMQ host")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="Jobs per confirmed batch in bulk mode",
+    )
+    parser.add_argument(
+        "--term-list-id",
+        help="Register the PII list under this ID once, and refer to it by ID "
+        "in bulk mode",
+    )
+    args = parser.parse_args()
 
-    img_id = str(uuid.uuid4())
+    connection_params = args.host
 
     pii_list = [
         "Jose",
@@ -48,8 +272,24 @@ if __name__ == "__main__":
         "0000003100077280550602",
     ]
 
-    path_to_img = "img.png"
+    if args.source:
+        if args.term_list_id:
+            register_term_list(args.term_list_id, pii_list)
+        report = submit_bulk(
+            iter_jobs(args.source, pii_list, args.term_list_id),
+            batch_size=args.batch_size,
+        )
+        print(
+            f"Submitted {report['images']} images ({report['bytes']} bytes) "
+            f"in {report['seconds']:.2f}s: "
+            f"{report['images_per_second']:.1f} images/s, "
+            f"{report['megabytes_per_second']:.2f} MB/s"
+        )
+    else:
+        img_id = str(uuid.uuid4())
+
+        path_to_img = "img.png"
 
-    # Call the function to send the PII list and image
-    send_pii_list(img_id, pii_list)
-    submit_image(path_to_img, img_id)
+        # Call the function to send the PII list and image
+        send_pii_list(img_id, pii_list)
+        submit_image(path_to_img, img_id)
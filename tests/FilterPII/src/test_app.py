@@ -1,9 +1,16 @@
+import asyncio
 import json
 from unittest import mock
 
 import pytest
 
+from commons.entities.bounding_box_batch import BoundingBoxBatch
+from commons.entities.text_bounding_box import TextBoundingBox
+from commons.metrics import Metrics
 from FilterPII.src.app import FilterPIIService
+from FilterPII.src.confidence import ConfidencePolicy
+from FilterPII.src.lines import term_set_digest
+from FilterPII.src.redaction import RedactionConfig
 
 
 # Define fixture to mock RabbitMQClient
@@ -44,8 +51,8 @@ def test_process_message_bounding_boxes(mock_redis, mock_rabbitmq, mocker):
     # Initialize the service
     service = FilterPIIService()
 
-    # Mock the Redis store and retrieve methods
-    mock_redis.return_value.retrieve.return_value = (
+    # Mock the Redis join method
+    mock_redis.return_value.join_part.return_value = (
         None  # No PII terms stored yet
     )
 
@@ -71,9 +78,14 @@ def test_process_message_bounding_boxes(mock_redis, mock_rabbitmq, mocker):
         json.dumps(message_body).encode(),
     )
 
-    # Verify Redis store was called correctly
-    mock_redis.return_value.store.assert_called_once_with(
-        "image_123", "bounding_boxes", message_body["bounding_boxes"]
+    # Verify Redis join was called correctly
+    mock_redis.return_value.join_part.assert_called_once_with(
+        "image_123",
+        "bounding_boxes",
+        0,
+        message_body["bounding_boxes"],
+        1,
+        "pii_terms",
     )
 
     # Verify that it didn't proceed to publish since PII terms are missing
@@ -85,10 +97,21 @@ def test_process_message_pii_terms(mock_redis, mock_rabbitmq, mocker):
     # Initialize the service
     service = FilterPIIService()
 
-    # Mock Redis store and retrieve methods
-    mock_redis.return_value.retrieve.return_value = [
-        {"text": "Hello", "left": 10, "right": 100, "top": 20, "bottom": 30}
-    ]  # Bounding boxes already stored
+    # Mock the Redis join method
+    mock_redis.return_value.join_shared.return_value = (
+        {
+            0: [
+                {
+                    "text": "Hello",
+                    "left": 10,
+                    "right": 100,
+                    "top": 20,
+                    "bottom": 30,
+                }
+            ]
+        },
+        1,
+    )  # Bounding boxes already stored
 
     # Mock the message body
     message_body = {"img_id": "image_123", "pii_terms": ["Hello"]}
@@ -101,9 +124,9 @@ def test_process_message_pii_terms(mock_redis, mock_rabbitmq, mocker):
         json.dumps(message_body).encode(),
     )
 
-    # Verify Redis store was called correctly
-    mock_redis.return_value.store.assert_called_once_with(
-        "image_123", "pii_terms", message_body["pii_terms"]
+    # Verify Redis join was called correctly
+    mock_redis.return_value.join_shared.assert_called_once_with(
+        "image_123", "pii_terms", message_body["pii_terms"], "bounding_boxes"
     )
 
     # Verify the filtered bounding boxes were published
@@ -132,3 +155,637 @@ def test_process_message_unknown_type(mock_redis, mock_rabbitmq, mocker):
     ch_mock.basic_ack.assert_called_once_with(
         delivery_tag=method_mock.delivery_tag
     )
+
+
+# Test _filter_bounding_boxes with a PII term spanning several words of a line
+def test_filter_bounding_boxes_multi_word_term(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+
+    bounding_boxes = [
+        {"text": "Titular", "block_num": 1, "par_num": 1, "line_num": 1},
+        {"text": "Jose", "block_num": 1, "par_num": 1, "line_num": 2},
+        {"text": "Antonio", "block_num": 1, "par_num": 1, "line_num": 2},
+    ]
+
+    result = service._filter_bounding_boxes(bounding_boxes, ["Jose Antonio"])
+
+    assert result == [bounding_boxes[0]]
+
+
+# Test that a batch of bounding boxes is filtered with a mask into a batch
+def test_filter_bounding_boxes_batch(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    batch = BoundingBoxBatch.from_boxes(
+        [
+            TextBoundingBox("Titular", 0, 10, 0, 10, 1, 1, 1, 1),
+            TextBoundingBox("Jose", 0, 10, 20, 30, 1, 1, 2, 1),
+            TextBoundingBox("Antonio", 20, 30, 20, 30, 1, 1, 2, 2),
+        ]
+    )
+
+    result = service._filter_bounding_boxes(batch, ["Jose Antonio"])
+
+    assert isinstance(result, BoundingBoxBatch)
+    assert result == batch[:1]
+
+
+# Test that a job with no bounding boxes still completes
+def test_process_message_empty_bounding_boxes(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    mock_redis.return_value.join_part.return_value = ["Hello"]
+
+    message_body = {"img_id": "image_123", "bounding_boxes": []}
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        service.FILTERED_QUEUE, {"img_id": "image_123", "filtered_boxes": []}
+    )
+
+
+# Test the asyncio message flow with the asyncio clients
+def test_process_message_async(mocker):
+    mocker.patch("FilterPII.src.app.AsyncRabbitMQClient")
+    mock_storage = mocker.patch("FilterPII.src.app.AsyncRedisStorage")
+    mock_storage.return_value.join_shared = mock.AsyncMock(
+        return_value=(
+            {
+                0: [
+                    {"text": "Hello", "left": 10, "right": 100, "top": 20},
+                    {"text": "World", "left": 50, "right": 150, "top": 70},
+                ]
+            },
+            1,
+        )
+    )
+
+    service = FilterPIIService(client="asyncio")
+    service.rabbitmq_client.publish_message = mock.AsyncMock()
+    ch = mock.AsyncMock()
+    method = mock.Mock()
+
+    message_body = {"img_id": "image_123", "pii_terms": ["Hello"]}
+    asyncio.run(
+        service._process_message_async(
+            ch, method, mock.Mock(), json.dumps(message_body).encode()
+        )
+    )
+
+    mock_storage.return_value.join_shared.assert_awaited_once_with(
+        "image_123", "pii_terms", ["Hello"], "bounding_boxes"
+    )
+    service.rabbitmq_client.publish_message.assert_awaited_once_with(
+        service.FILTERED_QUEUE,
+        {
+            "img_id": "image_123",
+            "filtered_boxes": [
+                {"text": "World", "left": 50, "right": 150, "top": 70}
+            ],
+        },
+    )
+    ch.basic_ack.assert_awaited_once_with(delivery_tag=method.delivery_tag)
+
+
+# Test that unknown clients are rejected
+def test_unknown_client(mock_redis, mock_rabbitmq):
+    with pytest.raises(ValueError):
+        FilterPIIService(client="threads")
+
+
+# Test that the PII terms of a document filter every page already stored, each
+# published with its page index
+def test_process_message_pii_terms_for_pages(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    mock_redis.return_value.join_shared.return_value = (
+        {1: [{"text": "Hello"}], 0: [{"text": "World"}]},
+        3,
+    )
+
+    message_body = {"img_id": "doc_1", "pii_terms": ["Hello"]}
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+
+    assert mock_rabbitmq.return_value.publish_message.call_args_list == [
+        mock.call(
+            service.FILTERED_QUEUE,
+            {
+                "img_id": "doc_1",
+                "filtered_boxes": [{"text": "World"}],
+                "page": 0,
+                "page_count": 3,
+            },
+        ),
+        mock.call(
+            service.FILTERED_QUEUE,
+            {
+                "img_id": "doc_1",
+                "filtered_boxes": [],
+                "page": 1,
+                "page_count": 3,
+            },
+        ),
+    ]
+
+
+# Test that a page arriving after the PII terms is joined and published on its
+# own
+def test_process_message_page(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    mock_redis.return_value.join_part.return_value = ["Hello"]
+
+    message_body = {
+        "img_id": "doc_1",
+        "bounding_boxes": [{"text": "Hello"}],
+        "page": 2,
+        "page_count": 3,
+    }
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+
+    mock_redis.return_value.join_part.assert_called_once_with(
+        "doc_1", "bounding_boxes", 2, [{"text": "Hello"}], 3, "pii_terms"
+    )
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        service.FILTERED_QUEUE,
+        {"img_id": "doc_1", "filtered_boxes": [], "page": 2, "page_count": 3},
+    )
+
+
+# Test that a term list registration is stored without expiry and compiled once
+def test_process_message_registration(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    ch, method = mock.Mock(), mock.Mock()
+
+    message_body = {"term_list_id": "staff", "pii_terms": ["Alice", "Bob"]}
+    service._process_message(
+        ch, method, mock.Mock(), json.dumps(message_body).encode()
+    )
+
+    mock_redis.return_value.store_many.assert_called_once_with(
+        [
+            ("staff", service.TERM_LIST_TYPE, ["Alice", "Bob"]),
+            (
+                "staff",
+                service.TERM_LIST_DIGEST_TYPE,
+                term_set_digest(["Alice", "Bob"]),
+            ),
+        ],
+        expire=False,
+    )
+    ch.basic_ack.assert_called_once_with(delivery_tag=method.delivery_tag)
+    mock_redis.return_value.join_shared.assert_not_called()
+    assert service.matchers.stats()["entries"] == 1
+
+
+# Test that a job referring to a registered term list is filtered with its
+# terms
+def test_process_message_term_list(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    stored = {
+        ("staff", service.TERM_LIST_DIGEST_TYPE): term_set_digest(["Alice"]),
+        ("staff", service.TERM_LIST_TYPE): ["Alice"],
+    }
+    mock_redis.return_value.retrieve.side_effect = (
+        lambda key, data_type: stored.get((key, data_type))
+    )
+    mock_redis.return_value.join_shared.return_value = (
+        {0: [{"text": "Alice"}, {"text": "World"}]},
+        1,
+    )
+
+    message_body = {"img_id": "image_123", "term_list_id": "staff"}
+    for _ in range(2):
+        service._process_message(
+            mock.Mock(),
+            mock.Mock(),
+            mock.Mock(),
+            json.dumps(message_body).encode(),
+        )
+
+    mock_redis.return_value.join_shared.assert_called_with(
+        "image_123",
+        "pii_terms",
+        {"term_list_id": "staff"},
+        "bounding_boxes",
+    )
+    mock_rabbitmq.return_value.publish_message.assert_called_with(
+        service.FILTERED_QUEUE,
+        {"img_id": "image_123", "filtered_boxes": [{"text": "World"}]},
+    )
+    # The terms are read and compiled once, later jobs only read the digest
+    assert service.matchers.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+# Test that a job referring to an unknown term list is rejected
+def test_process_message_unknown_term_list(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    mock_redis.return_value.retrieve.return_value = None
+    mock_redis.return_value.join_part.return_value = {
+        "term_list_id": "missing"
+    }
+    ch, method = mock.Mock(), mock.Mock()
+
+    message_body = {"img_id": "image_123", "bounding_boxes": []}
+    service._process_message(
+        ch, method, mock.Mock(), json.dumps(message_body).encode()
+    )
+
+    mock_rabbitmq.return_value.publish_message.assert_not_called()
+    ch.basic_nack.assert_called_once_with(
+        delivery_tag=method.delivery_tag, requeue=False
+    )
+
+
+# Test that a job referring to a term list not registered yet is requeued
+# before the join, leaving the stored bounding boxes in Redis
+def test_process_message_unregistered_term_list(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    mock_redis.return_value.retrieve.return_value = None
+    ch, method = mock.Mock(), mock.Mock()
+
+    message_body = {"img_id": "image_123", "term_list_id": "staff"}
+    service._process_message(
+        ch, method, mock.Mock(), json.dumps(message_body).encode()
+    )
+
+    mock_redis.return_value.join_shared.assert_not_called()
+    ch.basic_nack.assert_called_once_with(
+        delivery_tag=method.delivery_tag, requeue=True
+    )
+
+
+# Test that the asyncio flow requeues jobs referring to an unregistered term
+# list before the join too
+def test_process_message_async_unregistered_term_list(mocker):
+    mocker.patch("FilterPII.src.app.AsyncRabbitMQClient")
+    mock_storage = mocker.patch("FilterPII.src.app.AsyncRedisStorage")
+    mock_storage.return_value.retrieve = mock.AsyncMock(return_value=None)
+    mock_storage.return_value.join_shared = mock.AsyncMock()
+    service = FilterPIIService(client="asyncio")
+    ch, method = mock.AsyncMock(), mock.Mock()
+
+    message_body = {"img_id": "image_123", "term_list_id": "staff"}
+    asyncio.run(
+        service._process_message_async(
+            ch, method, mock.Mock(), json.dumps(message_body).encode()
+        )
+    )
+
+    mock_storage.return_value.join_shared.assert_not_awaited()
+    ch.basic_nack.assert_awaited_once_with(
+        delivery_tag=method.delivery_tag, requeue=True
+    )
+
+
+# Test that the match mode selects how PII terms are compared with the OCR text
+def test_filter_bounding_boxes_match_mode(mock_redis, mock_rabbitmq):
+    bounding_boxes = [{"text": "Operacién"}, {"text": "World"}]
+
+    exact = FilterPIIService()
+    fuzzy = FilterPIIService(match_mode="fuzzy")
+
+    assert exact._filter_bounding_boxes(bounding_boxes, ["Operación"]) == (
+        bounding_boxes
+    )
+    assert fuzzy._filter_bounding_boxes(bounding_boxes, ["Operación"]) == [
+        {"text": "World"}
+    ]
+    with pytest.raises(ValueError):
+        FilterPIIService(match_mode="phonetic")
+
+
+# Test that a job's detectors filter PII that is not among its terms, and
+# replace the service's
+def test_process_message_detectors(mock_redis, mock_rabbitmq):
+    service = FilterPIIService(detectors=["card"])
+    mock_redis.return_value.join_shared.return_value = (
+        {0: [{"text": "jp@mail.com"}, {"text": "4111111111111111"}]},
+        1,
+    )
+
+    message_body = {
+        "img_id": "image_123",
+        "pii_terms": [],
+        "detectors": ["email"],
+    }
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+
+    mock_redis.return_value.join_shared.assert_called_once_with(
+        "image_123",
+        "pii_terms",
+        {"pii_terms": [], "detectors": ["email"]},
+        "bounding_boxes",
+    )
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        service.FILTERED_QUEUE,
+        {
+            "img_id": "image_123",
+            "filtered_boxes": [{"text": "4111111111111111"}],
+        },
+    )
+
+
+# Test that the detectors of the service run on jobs that do not choose their
+# own
+def test_filter_bounding_boxes_detectors(mock_redis, mock_rabbitmq):
+    service = FilterPIIService(detectors=["card"])
+    bounding_boxes = [{"text": "Alice"}, {"text": "4111111111111111"}]
+
+    assert service._filter_bounding_boxes(bounding_boxes, ["Alice"]) == []
+    with pytest.raises(ValueError):
+        FilterPIIService(detectors=["passport"])
+
+
+# Test that noise is dropped before matching, so it does not split a name, and
+# that misread digits are filtered
+def test_filter_bounding_boxes_confidence(mock_redis, mock_rabbitmq):
+    metrics = Metrics()
+    service = FilterPIIService(
+        confidence=ConfidencePolicy(min_confidence=30, redact_digits_below=60),
+        metrics=metrics,
+    )
+    line = {"left": 0, "right": 10, "top": 0, "bottom": 10}
+    line.update(block_num=1, par_num=1)
+    batch = BoundingBoxBatch.from_boxes(
+        [
+            {**line, "text": "Titular", "line_num": 1, "conf": 96.0},
+            {**line, "text": "Jose", "line_num": 2, "conf": 91.0},
+            {**line, "text": "i", "line_num": 2, "conf": 8.0},
+            {**line, "text": "Antonio", "line_num": 2, "conf": 93.0},
+            {**line, "text": "0l5872", "line_num": 3, "conf": 42.0},
+        ]
+    )
+
+    result = service._filter_bounding_boxes(batch, ["Jose Antonio"])
+
+    assert result == batch[:1]
+    assert (
+        metrics.counter(service.LOW_CONFIDENCE_METRIC, action="dropped") == 1
+    )
+    assert (
+        metrics.counter(service.LOW_CONFIDENCE_METRIC, action="redacted") == 1
+    )
+    # Without a policy, the noise box is kept and splits the name
+    assert (
+        len(FilterPIIService()._filter_bounding_boxes(batch, ["Jose Antonio"]))
+        == 5
+    )
+
+
+# Test that chunks of a streamed image are filtered as they arrive, and
+# published whole after the last one
+def test_process_message_chunks(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    mock_redis.return_value.join_part.return_value = ["Alice"]
+    mock_redis.return_value.collect_part.side_effect = [
+        None,
+        {
+            0: {"filtered_boxes": [{"text": "Hello"}]},
+            1: {"filtered_boxes": [{"text": "World"}]},
+        },
+    ]
+
+    for chunk, texts in ((1, ["Alice", "World"]), (0, ["Hello"])):
+        message_body = {
+            "img_id": "image_123",
+            "bounding_boxes": [{"text": text} for text in texts],
+            "chunk": chunk,
+            "chunk_count": 2,
+        }
+        service._process_message(
+            mock.Mock(),
+            mock.Mock(),
+            mock.Mock(),
+            json.dumps(message_body).encode(),
+        )
+
+    join_args = mock_redis.return_value.join_part.call_args_list[0].args
+    assert join_args == (
+        "image_123",
+        "bounding_boxes",
+        1,
+        {
+            "bounding_boxes": [{"text": "Alice"}, {"text": "World"}],
+            "chunked": True,
+        },
+        2,
+        "pii_terms",
+    )
+    assert mock_redis.return_value.collect_part.call_args_list[0].args == (
+        "image_123",
+        "filtered_boxes",
+        1,
+        {"filtered_boxes": [{"text": "World"}]},
+        2,
+    )
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        service.FILTERED_QUEUE,
+        {
+            "img_id": "image_123",
+            "filtered_boxes": [{"text": "Hello"}, {"text": "World"}],
+        },
+    )
+
+
+# Test that the PII terms filter the chunks stored before them, told from pages
+# by their marker
+def test_process_message_pii_terms_for_chunks(mock_redis, mock_rabbitmq):
+    service = FilterPIIService()
+    mock_redis.return_value.join_shared.return_value = (
+        {
+            0: {"bounding_boxes": [{"text": "Alice"}], "chunked": True},
+            1: {"bounding_boxes": [{"text": "World"}], "chunked": True},
+        },
+        2,
+    )
+    mock_redis.return_value.collect_part.side_effect = [
+        None,
+        {
+            0: {"filtered_boxes": []},
+            1: {"filtered_boxes": [{"text": "World"}]},
+        },
+    ]
+
+    message_body = {"img_id": "image_123", "pii_terms": ["Alice"]}
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+
+    assert [
+        call.args[3]
+        for call in mock_redis.return_value.collect_part.call_args_list
+    ] == [{"filtered_boxes": []}, {"filtered_boxes": [{"text": "World"}]}]
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        service.FILTERED_QUEUE,
+        {"img_id": "image_123", "filtered_boxes": [{"text": "World"}]},
+    )
+
+
+# Test that the original image is redacted with the PII boxes and published
+# once
+def test_process_message_redaction(mock_redis, mock_rabbitmq, mocker):
+    mock_redact = mocker.patch(
+        "FilterPII.src.app.redact_image", return_value=b"redacted"
+    )
+    service = FilterPIIService(redaction=RedactionConfig())
+    mock_redis.return_value.join_part.return_value = ["Alice"]
+    mock_redis.return_value.retrieve_bytes.return_value = b"original"
+
+    message_body = {
+        "img_id": "image_123",
+        "bounding_boxes": [{"text": "Alice"}, {"text": "World"}],
+    }
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+
+    mock_redis.return_value.retrieve_bytes.assert_called_once_with(
+        "image_123", "image", delete=True
+    )
+    mock_redact.assert_called_once_with(
+        b"original", [{"text": "Alice"}], service.redaction
+    )
+    mock_rabbitmq.return_value.publish_bytes.assert_called_once_with(
+        service.REDACTED_QUEUE,
+        b"redacted",
+        headers={"img_id": "image_123"},
+        content_type="image/png",
+    )
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        service.FILTERED_QUEUE,
+        {
+            "img_id": "image_123",
+            "filtered_boxes": [{"text": "World"}],
+            "redacted_image": {
+                "content_type": "image/png",
+                "queue": service.REDACTED_QUEUE,
+            },
+        },
+    )
+
+
+# Test that the PII boxes of every chunk redact a streamed image stored in
+# Redis, and that pages are not redacted
+def test_process_message_redaction_chunks(mock_redis, mock_rabbitmq, mocker):
+    mock_redact = mocker.patch(
+        "FilterPII.src.app.redact_image", return_value=b"redacted"
+    )
+    service = FilterPIIService(
+        redaction=RedactionConfig(format="jpeg", output="redis")
+    )
+    mock_redis.return_value.join_part.return_value = ["Alice"]
+    mock_redis.return_value.retrieve_bytes.return_value = b"original"
+    mock_redis.return_value.collect_part.return_value = {
+        0: {"filtered_boxes": [], "pii_boxes": [{"text": "Alice"}]},
+        1: {"filtered_boxes": [{"text": "World"}], "pii_boxes": []},
+    }
+
+    for message_body in (
+        {
+            "img_id": "image_123",
+            "bounding_boxes": [{"text": "World"}],
+            "chunk": 1,
+            "chunk_count": 2,
+        },
+        {
+            "img_id": "doc_1",
+            "bounding_boxes": [{"text": "Alice"}],
+            "page": 0,
+            "page_count": 2,
+        },
+    ):
+        service._process_message(
+            mock.Mock(),
+            mock.Mock(),
+            mock.Mock(),
+            json.dumps(message_body).encode(),
+        )
+
+    assert mock_redis.return_value.collect_part.call_args.args[3] == {
+        "filtered_boxes": [{"text": "World"}],
+        "pii_boxes": [],
+    }
+    mock_redact.assert_called_once_with(
+        b"original", [{"text": "Alice"}], service.redaction
+    )
+    mock_redis.return_value.store_bytes.assert_called_once_with(
+        "image_123", "redacted", b"redacted"
+    )
+    assert mock_rabbitmq.return_value.publish_message.call_args_list[0].args[
+        1
+    ]["redacted_image"] == {
+        "content_type": "image/jpeg",
+        "key": "image_123:redacted",
+    }
+    assert (
+        "redacted_image"
+        not in mock_rabbitmq.return_value.publish_message.call_args.args[1]
+    )
+
+
+# Test that a missing original image leaves the filtered result unchanged
+def test_process_message_redaction_missing_image(mock_redis, mock_rabbitmq):
+    service = FilterPIIService(redaction=RedactionConfig())
+    mock_redis.return_value.join_part.return_value = ["Alice"]
+    mock_redis.return_value.retrieve_bytes.return_value = None
+
+    message_body = {"img_id": "image_123", "bounding_boxes": [{"text": "A"}]}
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+
+    mock_rabbitmq.return_value.publish_bytes.assert_not_called()
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        service.FILTERED_QUEUE,
+        {"img_id": "image_123", "filtered_boxes": [{"text": "A"}]},
+    )
+
+
+# Test that the stages and the outcome of each message are recorded
+def test_process_message_metrics(mock_redis, mock_rabbitmq):
+    metrics = Metrics()
+    service = FilterPIIService(metrics=metrics)
+    mock_redis.return_value.join_shared.return_value = (
+        {0: [{"text": "Hello"}]},
+        1,
+    )
+
+    message_body = {"img_id": "image_123", "pii_terms": ["Hello"]}
+    service._process_message(
+        mock.Mock(),
+        mock.Mock(),
+        mock.Mock(),
+        json.dumps(message_body).encode(),
+    )
+    service._process_message(mock.Mock(), mock.Mock(), mock.Mock(), b"{")
+
+    for stage in ("decode", "join", "matcher", "filter", "publish"):
+        assert metrics.histogram(service.STAGE_METRIC, stage=stage)
+    assert metrics.counter(service.MESSAGES_METRIC, outcome="ok") == 1
+    assert metrics.counter(service.MESSAGES_METRIC, outcome="error") == 1
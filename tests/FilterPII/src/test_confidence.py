@@ -0,0 +1,71 @@
+import pytest
+
+from commons.entities.bounding_box_batch import BoundingBoxBatch
+from FilterPII.src.confidence import (
+    KEEP,
+    NOISE,
+    PII,
+    ConfidencePolicy,
+    looks_like_digits,
+)
+
+
+# Test that words read like numbers by their digits and the letters misread for
+# digits
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("12345678", True),
+        ("l2O45", True),
+        ("27.000,00", True),
+        ("Camargo", False),
+        ("OIl", False),
+        ("A1BCDEF", False),
+        ("-", False),
+    ],
+)
+def test_looks_like_digits(text, expected):
+    assert looks_like_digits(text) is expected
+
+
+# Test that boxes are flagged by confidence, digits taking precedence over
+# noise
+def test_mask():
+    policy = ConfidencePolicy(min_confidence=30, redact_digits_below=60)
+    boxes = [
+        {"text": "Titular", "conf": 95.0},
+        {"text": "i", "conf": 12.0},
+        {"text": "0l234", "conf": 20.0},
+        {"text": "1234", "conf": 55.0},
+        {"text": "1234", "conf": 90.0},
+        {"text": "Alice", "conf": -1.0},
+        {"text": "Bob"},
+    ]
+
+    assert list(policy.mask(boxes)) == [
+        KEEP,
+        NOISE,
+        PII,
+        PII,
+        KEEP,
+        KEEP,
+        KEEP,
+    ]
+    # A batch keeps the confidences only when every box has one
+    assert policy.mask(BoundingBoxBatch.from_boxes(boxes)) == bytearray(7)
+
+
+# Test that the policy is read from the environment, and disabled without
+# thresholds
+def test_from_env(monkeypatch):
+    assert ConfidencePolicy.from_env() is None
+
+    monkeypatch.setenv("FILTER_REDACT_DIGITS_BELOW", "70")
+    monkeypatch.setenv("FILTER_DIGIT_RATIO", "0.8")
+    assert ConfidencePolicy.from_env() == ConfidencePolicy(
+        redact_digits_below=70, digit_ratio=0.8
+    )
+
+    monkeypatch.setenv("FILTER_MIN_CONFIDENCE", "101")
+    with pytest.raises(ValueError):
+        ConfidencePolicy.from_env()
@@ -0,0 +1,97 @@
+import pytest
+
+from FilterPII.src.detectors import (
+    DETECTORS,
+    Detector,
+    DetectorScanner,
+    compile_scanner,
+    is_valid_card,
+    is_valid_cbu,
+    is_valid_cuit,
+    is_valid_phone,
+)
+
+
+def _line(*texts):
+    """Helper to lay out words as the bounding boxes of a single line."""
+    return [
+        {
+            "text": text,
+            "block_num": 1,
+            "par_num": 1,
+            "line_num": 1,
+            "word_num": i + 1,
+        }
+        for i, text in enumerate(texts)
+    ]
+
+
+@pytest.mark.parametrize(
+    "validator, text, expected",
+    [
+        (is_valid_cbu, "2850590940090418135201", True),
+        (is_valid_cbu, "28505909 40090418135201", True),
+        (is_valid_cbu, "2850590940090418135202", False),
+        (is_valid_cuit, "20-12345678-6", True),
+        (is_valid_cuit, "20-12345678-5", False),
+        (is_valid_card, "4111 1111 1111 1111", True),
+        (is_valid_card, "4111 1111 1111 1112", False),
+        (is_valid_phone, "11 4567-8901", True),
+        (is_valid_phone, "+54 4567 8901", True),
+        (is_valid_phone, "2024-01-15", False),
+    ],
+)
+def test_validators(validator, text, expected):
+    assert validator(text) == expected
+
+
+# Test that every built-in detector is found in a single scan, and look-alikes
+# are not
+def test_scanner_finditer():
+    scanner = compile_scanner(list(DETECTORS))
+    text = (
+        "juan.perez@mail.com CBU 2850590940090418135201 4111 1111 1111 1111 "
+        "CUIT 20-12345678-6 tel +54 11 4567-8901 2024-01-15 "
+        "2850590940090418135202"
+    )
+
+    found = [
+        (name, text[start:end]) for name, start, end in scanner.finditer(text)
+    ]
+
+    assert found == [
+        ("email", "juan.perez@mail.com"),
+        ("cbu", "2850590940090418135201"),
+        ("card", "4111 1111 1111 1111"),
+        ("cuit", "20-12345678-6"),
+        ("phone", "+54 11 4567-8901"),
+    ]
+
+
+# Test that a candidate rejected by its validator is tried against the next
+# detectors
+def test_scanner_falls_back_to_next_detector():
+    scanner = DetectorScanner(
+        [
+            Detector("even", r"\d+", lambda text: int(text) % 2 == 0),
+            Detector("number", r"\d+"),
+        ]
+    )
+
+    assert list(scanner.finditer("a 13 b")) == [("number", 2, 4)]
+
+
+# Test that matches spanning several words exclude every box they cover, and
+# only enabled detectors run
+def test_scanner_find():
+    boxes = _line("Card:", "4111", "1111", "1111", "1111", "jp@mail.com")
+
+    assert compile_scanner(["card", "email"]).find(boxes) == {1, 2, 3, 4, 5}
+    assert compile_scanner(["email"]).find(boxes) == {5}
+    assert compile_scanner([]).find(boxes) == set()
+
+
+# Test that unknown detectors are rejected
+def test_compile_scanner_unknown():
+    with pytest.raises(ValueError):
+        compile_scanner(["email", "passport"])
@@ -0,0 +1,87 @@
+import pytest
+
+from FilterPII.src.fuzzy import (
+    FuzzyLineMatcher,
+    NormalizedLineMatcher,
+    matcher_factory,
+    normalize_text,
+    within_distance,
+)
+from FilterPII.src.lines import LineMatcher
+
+
+def _line(*texts):
+    """Helper to lay out words as the bounding boxes of a single line."""
+    return [
+        {
+            "text": text,
+            "block_num": 1,
+            "par_num": 1,
+            "line_num": 1,
+            "word_num": i + 1,
+        }
+        for i, text in enumerate(texts)
+    ]
+
+
+# Test that case, accents, ligatures and digits read as letters are folded
+def test_normalize_text():
+    assert normalize_text("OPERACIÓN  Nº") == normalize_text("operacion no")
+    assert normalize_text("ﬁrma") == "firma"
+    assert normalize_text("J0SE 5ANCHEZ") == normalize_text("Jose Sanchez")
+
+
+@pytest.mark.parametrize(
+    "a, b, max_distance, expected",
+    [
+        ("operacion", "operacion", 0, True),
+        ("operacien", "operacion", 1, True),
+        ("operaion", "operacion", 1, True),
+        ("opreacion", "operacion", 1, False),
+        ("opreacion", "operacion", 2, True),
+        ("operacion", "operacionxyz", 2, False),
+    ],
+)
+def test_within_distance(a, b, max_distance, expected):
+    assert within_distance(a, b, max_distance) == expected
+
+
+# Test that normalized matching ignores OCR confusions but still needs the
+# exact letters
+def test_normalized_line_matcher():
+    matcher = NormalizedLineMatcher(["Operación", "Jose Antonio"])
+
+    boxes = _line("N°", "0PERACION:", "J0SÉ", "antonio", "operacien")
+
+    assert matcher.find(boxes) == {1, 2, 3}
+
+
+# Test that fuzzy matching tolerates a bounded number of edits, split words and
+# punctuation
+def test_fuzzy_line_matcher():
+    matcher = FuzzyLineMatcher(
+        ["Operación", "Jose Antonio Camargo", "Ana"], max_distance=2
+    )
+
+    boxes = _line("operacién:", "Jose", "Antnio", "Cam", "argo", "Ama")
+
+    # "Ama" is one edit away from "Ana", which is too short for any edit
+    assert matcher.find(boxes) == {0, 1, 2, 3, 4}
+    assert matcher.find(_line("cooperation")) == set()
+
+
+# Test that the match distance is bounded by max_distance
+def test_fuzzy_line_matcher_max_distance():
+    boxes = _line("Camrgo", "Antono")
+
+    assert FuzzyLineMatcher(["Camargo Antonio"], 1).find(boxes) == set()
+    assert FuzzyLineMatcher(["Camargo Antonio"], 2).find(boxes) == {0, 1}
+
+
+# Test that match modes select their matcher, and unknown ones are rejected
+def test_matcher_factory():
+    assert matcher_factory("exact") is LineMatcher
+    assert matcher_factory("normalized") is NormalizedLineMatcher
+    assert matcher_factory("fuzzy", 1)(["Alice"]).max_distance == 1
+    with pytest.raises(ValueError):
+        matcher_factory("phonetic")
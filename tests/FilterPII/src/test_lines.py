@@ -0,0 +1,98 @@
+import pytest
+
+from FilterPII.src.lines import MatcherCache, group_lines, term_set_digest
+
+
+def _box(text, line_num, word_num, block_num=1, par_num=1):
+    return {
+        "text": text,
+        "left": 0,
+        "right": 10,
+        "top": 0,
+        "bottom": 10,
+        "block_num": block_num,
+        "par_num": par_num,
+        "line_num": line_num,
+        "word_num": word_num,
+    }
+
+
+# Test that lines are rebuilt from block/par/line indices and ordered by word
+def test_group_lines():
+    bounding_boxes = [
+        _box("Titular", line_num=1, word_num=1),
+        _box("Antonio", line_num=2, word_num=2),
+        _box("Jose", line_num=2, word_num=1),
+        _box("Jose", line_num=2, word_num=1, block_num=2),
+        {"text": "legacy", "left": 0, "right": 1, "top": 0, "bottom": 1},
+    ]
+
+    assert group_lines(bounding_boxes) == [[0], [2, 1], [3], [4]]
+
+
+@pytest.mark.parametrize(
+    "texts, pii_terms, expected",
+    [
+        # Phrase term spanning the whole line
+        (["Jose", "Antonio", "Camargo"], ["Jose Antonio Camargo"], {0, 1, 2}),
+        # Phrase term spanning part of the line
+        (["Sr.", "Jose", "Antonio", "Camargo"], ["Jose Antonio"], {1, 2}),
+        # Single-word substring semantics are preserved
+        (["CA$", "290-339466/6"], ["339466"], {1}),
+        # A number split into several words by Tesseract
+        (
+            ["CBU", "00000031", "00077280550602"],
+            ["0000003100077280550602"],
+            {1, 2},
+        ),
+        # Split matches must start and end on word boundaries
+        (["de", "destinatario"], ["edest"], set()),
+        # Phrase words must be consecutive
+        (["Jose", "y", "Antonio"], ["Jose Antonio"], set()),
+        # Extra whitespace in a term is normalized
+        (["Jose", "Antonio"], ["Jose   Antonio"], {0, 1}),
+    ],
+)
+def test_line_matcher_find(texts, pii_terms, expected):
+    bounding_boxes = [
+        _box(text, line_num=1, word_num=i + 1) for i, text in enumerate(texts)
+    ]
+    cache = MatcherCache()
+
+    assert cache.get(pii_terms).find(bounding_boxes) == expected
+
+
+# Test that phrase terms never match across two different lines
+def test_line_matcher_does_not_cross_lines():
+    bounding_boxes = [
+        _box("Jose", line_num=1, word_num=1),
+        _box("Antonio", line_num=2, word_num=1),
+    ]
+    cache = MatcherCache()
+
+    assert cache.get(["Jose Antonio"]).find(bounding_boxes) == set()
+    assert cache.get(["JoseAntonio"]).find(bounding_boxes) == set()
+
+
+# Test that term lists differing only in order, duplicates or whitespace share
+# a digest
+def test_term_set_digest():
+    digest = term_set_digest(["Jose Antonio", "Alice"])
+
+    assert term_set_digest(["Alice", "Jose   Antonio", "Alice"]) == digest
+    assert term_set_digest(["Alice"]) != digest
+
+
+# Test that equivalent term lists are compiled once, and the least recently
+# used matcher is evicted
+def test_matcher_cache():
+    cache = MatcherCache(max_entries=2)
+
+    matcher = cache.get(["Jose", "Alice"])
+    assert cache.get(["Alice", "Jose", "Jose"]) is matcher
+    cache.get(["Bob"])
+    assert cache.get_by_digest(term_set_digest(["Jose", "Alice"])) is matcher
+    cache.get(["Carol"])
+
+    assert cache.get_by_digest(term_set_digest(["Bob"])) is None
+    assert cache.stats() == {"hits": 2, "misses": 3, "entries": 2}
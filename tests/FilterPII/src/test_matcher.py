@@ -0,0 +1,61 @@
+import pytest
+
+from FilterPII.src import matcher as matcher_module
+from FilterPII.src.matcher import (
+    AhoCorasickMatcher,
+    RegexMatcher,
+    compile_matcher,
+)
+
+MATCHERS = [AhoCorasickMatcher, RegexMatcher]
+
+
+# Test that search follows the same semantics as the `in` operator
+@pytest.mark.parametrize(
+    "terms, text",
+    [
+        (["Alice"], "Alice"),
+        (["Alice"], "Hello Alice!"),
+        (["Alice"], "alice"),
+        (["he", "she", "his", "hers"], "ushers"),
+        (["abcd", "bc"], "abce"),
+        (["0000003100077280550602"], "CBU:0000003100077280550602"),
+        (["aab"], "aaab"),
+        ([], "anything"),
+        ([""], ""),
+        (["x", ""], "abc"),
+    ],
+)
+@pytest.mark.parametrize("matcher_class", MATCHERS)
+def test_search_matches_substring_semantics(matcher_class, terms, text):
+    matcher = matcher_class(terms)
+
+    assert matcher.search(text) == any(term in text for term in terms)
+
+
+# Test that finditer reports every occurrence, overlapping ones included
+@pytest.mark.parametrize("matcher_class", MATCHERS)
+def test_finditer_reports_all_spans(matcher_class):
+    matcher = matcher_class(["he", "she", "his", "hers", "h", "a.b"])
+
+    spans = sorted(matcher.finditer("ushers a.b axb"))
+
+    assert spans == [(1, 4), (2, 3), (2, 4), (2, 6), (7, 10)]
+
+
+# Test that compiling a term list returns a new matcher, leaving caching to
+# MatcherCache
+def test_compile_matcher():
+    first = compile_matcher(["Jose", "Antonio"])
+
+    assert first.search("Antonio")
+    assert compile_matcher(["Jose", "Antonio"]) is not first
+
+
+# Test that long term lists are compiled into an automaton instead of a regular
+# expression
+def test_compile_matcher_engine(monkeypatch):
+    monkeypatch.setattr(matcher_module, "REGEX_MAX_CHARS", 10)
+
+    assert isinstance(compile_matcher(["Jose", "Alice"]), RegexMatcher)
+    assert isinstance(compile_matcher(["Jose", "Antonio"]), AhoCorasickMatcher)
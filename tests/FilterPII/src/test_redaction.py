@@ -0,0 +1,54 @@
+import io
+
+import pytest
+from PIL import Image
+
+from FilterPII.src.redaction import RedactionConfig, redact_image
+
+BOX = {"text": "Alice", "left": 10, "top": 5, "right": 20, "bottom": 15}
+
+
+def _image_bytes(mode="RGB", image_format="PNG"):
+    output = io.BytesIO()
+    Image.new(mode, (40, 30), "white").save(output, image_format)
+    return output.getvalue()
+
+
+# Test that the boxes are blacked out, and nothing else
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "1", "P"])
+def test_redact_image(mode):
+    redacted = redact_image(_image_bytes(mode), [BOX], RedactionConfig())
+
+    with Image.open(io.BytesIO(redacted)) as image:
+        assert image.format == "PNG"
+        gray = image.convert("L")
+        assert gray.getpixel((10, 5)) == 0
+        assert gray.getpixel((19, 14)) == 0
+        assert gray.getpixel((20, 15)) == 255
+        assert gray.getpixel((9, 5)) == 255
+
+
+# Test the lossy formats, including images with transparency saved as JPEG
+@pytest.mark.parametrize("image_format", ["jpeg", "webp"])
+def test_redact_image_lossy(image_format):
+    config = RedactionConfig(format=image_format, quality=90)
+
+    redacted = redact_image(_image_bytes("RGBA"), [BOX], config)
+
+    with Image.open(io.BytesIO(redacted)) as image:
+        assert image.format == image_format.upper()
+        assert image.convert("L").getpixel((15, 10)) < 16
+
+
+# Test that unknown settings are rejected, and that redaction is off by default
+def test_redaction_config(monkeypatch):
+    with pytest.raises(ValueError):
+        RedactionConfig(format="gif")
+    with pytest.raises(ValueError):
+        RedactionConfig(output="s3")
+
+    assert RedactionConfig.from_env() is None
+    monkeypatch.setenv("FILTER_REDACT", "1")
+    monkeypatch.setenv("FILTER_REDACT_FORMAT", "WEBP")
+    assert RedactionConfig.from_env() == RedactionConfig(format="webp")
+    assert RedactionConfig(format="webp").content_type == "image/webp"
@@ -1,11 +1,19 @@
 import base64
+import io
 import json
+from concurrent.futures import Future
 from unittest import mock
 
 import pytest
+from PIL import Image
 
+from commons.entities.text_bounding_box import TextBoundingBox
+from commons.metrics import Metrics
 from PerformOCR.src.app import PerformOCRService
-from PerformOCR.src.utils import TextBoundingBox
+from PerformOCR.src.cache import OCRCache
+from PerformOCR.src.pages import detect_page
+from PerformOCR.src.streaming import StreamingConfig
+from PerformOCR.src.utils import STAGE_METRIC, detect_text, run_with_timings
 
 
 @pytest.fixture
@@ -114,3 +122,432 @@ def test_process_image_message_error(mocker, mock_rabbitmq_client):
 
     # Assert publish_message was not called because of the exception
     mock_publish_message.assert_not_called()
+
+
+# Test that the pooled path runs OCR on the pool, then publishes and acks on
+# the connection thread
+def test_submit_image_message_success(mocker, mock_rabbitmq_client):
+    bounding_boxes = [
+        TextBoundingBox(text="Hello", left=10, right=100, top=20, bottom=30),
+    ]
+
+    ocr_service = PerformOCRService(connection_params="localhost", workers=2)
+
+    # Mock the pool to run detect_text synchronously
+    future = Future()
+    future.set_result((bounding_boxes, {}))
+    ocr_service._pool = mock.Mock()
+    ocr_service._pool.submit.return_value = future
+
+    # Run thread-safe callbacks right away
+    connection = mock_rabbitmq_client.return_value.connection
+    connection.add_callback_threadsafe.side_effect = (
+        lambda callback: callback()
+    )
+
+    mock_channel = mock.Mock()
+    mock_method = mock.Mock()
+    message_body = json.dumps(
+        {
+            "img_id": "image_123",
+            "image_data": base64.b64encode(b"fake_image_data").decode(),
+        }
+    )
+
+    ocr_service.submit_image_message(
+        mock_channel, mock_method, mock.Mock(), message_body
+    )
+
+    ocr_service._pool.submit.assert_called_once_with(
+        run_with_timings, detect_text, b"fake_image_data"
+    )
+    connection.add_callback_threadsafe.assert_called_once()
+    mock_rabbitmq_client.return_value.publish_message.assert_called_once_with(
+        ocr_service.FILTER_PII_QUEUE,
+        {
+            "img_id": "image_123",
+            "bounding_boxes": [box.__dict__ for box in bounding_boxes],
+        },
+    )
+    mock_channel.basic_ack.assert_called_once_with(
+        delivery_tag=mock_method.delivery_tag
+    )
+
+
+# Test that a failed pooled OCR is rejected instead of acknowledged
+def test_submit_image_message_error(mocker, mock_rabbitmq_client):
+    ocr_service = PerformOCRService(connection_params="localhost", workers=2)
+
+    future = Future()
+    future.set_exception(Exception("OCR failed"))
+    ocr_service._pool = mock.Mock()
+    ocr_service._pool.submit.return_value = future
+
+    connection = mock_rabbitmq_client.return_value.connection
+    connection.add_callback_threadsafe.side_effect = (
+        lambda callback: callback()
+    )
+
+    mock_channel = mock.Mock()
+    mock_method = mock.Mock()
+    message_body = json.dumps(
+        {"img_id": "image_123", "image_data": base64.b64encode(b"x").decode()}
+    )
+
+    ocr_service.submit_image_message(
+        mock_channel, mock_method, mock.Mock(), message_body
+    )
+
+    mock_rabbitmq_client.return_value.publish_message.assert_not_called()
+    mock_channel.basic_nack.assert_called_once_with(
+        delivery_tag=mock_method.delivery_tag, requeue=False
+    )
+
+
+# Test that the stages timed by a pool worker are recorded by the service
+def test_submit_image_message_worker_metrics(mock_rabbitmq_client):
+    worker_metrics = Metrics()
+    worker_metrics.observe(STAGE_METRIC, 0.5, stage="recognize")
+    metrics = Metrics()
+    ocr_service = PerformOCRService(
+        connection_params="localhost", workers=2, metrics=metrics
+    )
+
+    future = Future()
+    future.set_result(([], worker_metrics.pop_histograms()))
+    ocr_service._pool = mock.Mock()
+    ocr_service._pool.submit.return_value = future
+    connection = mock_rabbitmq_client.return_value.connection
+    connection.add_callback_threadsafe.side_effect = (
+        lambda callback: callback()
+    )
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "image_1"},
+    )
+
+    ocr_service.submit_image_message(
+        mock.Mock(), mock.Mock(), properties, b"image"
+    )
+
+    histogram = metrics.histogram(STAGE_METRIC, stage="recognize")
+    assert histogram["count"] == 1
+    assert histogram["sum"] == 0.5
+    assert metrics.histogram(STAGE_METRIC, stage="pool")["count"] == 1
+
+
+# Test that start uses the pool and prefetches messages for it
+def test_start_with_workers(mocker, mock_rabbitmq_client):
+    mocker.patch("PerformOCR.src.app.ProcessPoolExecutor")
+    ocr_service = PerformOCRService(connection_params="localhost", workers=4)
+
+    ocr_service.start()
+
+    mock_rabbitmq_client.return_value.start.assert_called_once_with(
+        ocr_service.submit_image_message, prefetch_count=8
+    )
+
+
+# Test process_image_message with a binary message carrying the img_id in its
+# headers
+def test_process_image_message_binary(mocker, mock_rabbitmq_client):
+    mock_detect_text = mocker.patch("PerformOCR.src.app.detect_text")
+    mock_detect_text.return_value = []
+
+    ocr_service = PerformOCRService(connection_params="localhost")
+
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "image_123", "filename": "img.png"},
+    )
+    body = b"\x89PNG fake_image_data"
+
+    ocr_service.process_image_message(
+        mock.Mock(), mock.Mock(), properties, body
+    )
+
+    # The raw body reaches detect_text without being decoded or copied
+    assert mock_detect_text.call_args.args[0] is body
+    mock_rabbitmq_client.return_value.publish_message.assert_called_once_with(
+        ocr_service.FILTER_PII_QUEUE,
+        {"img_id": "image_123", "bounding_boxes": []},
+    )
+
+
+@pytest.fixture
+def tiff_document():
+    """Fixture to encode a three-page TIFF document."""
+    pages = [Image.new("L", (10 + index, 10)) for index in range(3)]
+    buffer = io.BytesIO()
+    pages[0].save(
+        buffer, format="TIFF", save_all=True, append_images=pages[1:]
+    )
+    return buffer.getvalue()
+
+
+# Test that the pages of a document are recognized and published one by one
+def test_process_image_message_pages(
+    mocker, mock_rabbitmq_client, tiff_document
+):
+    mock_detect_text = mocker.patch("PerformOCR.src.app.detect_text")
+    mock_detect_text.side_effect = lambda page: [
+        TextBoundingBox(text=str(page.width), left=0, right=1, top=0, bottom=1)
+    ]
+
+    ocr_service = PerformOCRService(connection_params="localhost")
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "doc_1"},
+    )
+    mock_channel = mock.Mock()
+
+    ocr_service.process_image_message(
+        mock_channel, mock.Mock(), properties, tiff_document
+    )
+
+    publish_message = mock_rabbitmq_client.return_value.publish_message
+    published = [call.args[1] for call in publish_message.call_args_list]
+    assert [(p["page"], p["page_count"]) for p in published] == [
+        (0, 3),
+        (1, 3),
+        (2, 3),
+    ]
+    assert [p["bounding_boxes"][0]["text"] for p in published] == [
+        "10",
+        "11",
+        "12",
+    ]
+    mock_channel.basic_ack.assert_called_once()
+
+
+# Test that the pooled pages of a document are recognized in parallel, and the
+# message settled after the last one
+def test_submit_image_message_pages(mock_rabbitmq_client, tiff_document):
+    ocr_service = PerformOCRService(connection_params="localhost", workers=2)
+
+    futures = [Future() for _ in range(3)]
+    ocr_service._pool = mock.Mock()
+    ocr_service._pool.submit.side_effect = futures
+
+    connection = mock_rabbitmq_client.return_value.connection
+    connection.add_callback_threadsafe.side_effect = (
+        lambda callback: callback()
+    )
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "doc_1"},
+    )
+    mock_channel = mock.Mock()
+
+    ocr_service.submit_image_message(
+        mock_channel, mock.Mock(), properties, tiff_document
+    )
+
+    assert ocr_service._pool.submit.call_args_list == [
+        mock.call(run_with_timings, detect_page, tiff_document, page)
+        for page in range(3)
+    ]
+
+    futures[2].set_result(([], {}))
+    futures[0].set_result(([], {}))
+    mock_channel.basic_ack.assert_not_called()
+
+    futures[1].set_exception(Exception("OCR failed"))
+    assert mock_rabbitmq_client.return_value.publish_message.call_count == 2
+    mock_channel.basic_ack.assert_not_called()
+    mock_channel.basic_nack.assert_called_once()
+
+
+# Test that a resubmitted image is published from the cache without running OCR
+# again
+def test_process_image_message_cache_hit(mocker, mock_rabbitmq_client):
+    mock_detect_text = mocker.patch("PerformOCR.src.app.detect_text")
+    mock_detect_text.return_value = [
+        TextBoundingBox(text="Hello", left=10, right=100, top=20, bottom=30)
+    ]
+    cache = OCRCache(fingerprint="test")
+    ocr_service = PerformOCRService(connection_params="localhost", cache=cache)
+
+    for img_id in ("image_1", "image_2"):
+        properties = mock.Mock(
+            content_type=ocr_service.IMAGE_CONTENT_TYPE,
+            headers={"img_id": img_id},
+        )
+        ocr_service.process_image_message(
+            mock.Mock(), mock.Mock(), properties, b"same image"
+        )
+
+    mock_detect_text.assert_called_once()
+    published = (
+        mock_rabbitmq_client.return_value.publish_message.call_args_list
+    )
+    assert published[0].args[1]["bounding_boxes"] == (
+        published[1].args[1]["bounding_boxes"]
+    )
+    assert published[1].args[1]["img_id"] == "image_2"
+    assert cache.stats()["hits"] == 1
+
+
+# Test that words below the minimum confidence are not published, but cached
+def test_process_image_message_min_confidence(mocker, mock_rabbitmq_client):
+    mocker.patch(
+        "PerformOCR.src.app.detect_text",
+        return_value=[
+            TextBoundingBox("Hello", 10, 100, 20, 30, conf=96.0),
+            TextBoundingBox(".", 110, 115, 20, 30, conf=12.5),
+            TextBoundingBox("World", 120, 200, 20, 30, conf=-1.0),
+        ],
+    )
+    cache = OCRCache(fingerprint="test")
+    ocr_service = PerformOCRService(
+        connection_params="localhost", cache=cache, min_confidence=60
+    )
+
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "image_1"},
+    )
+    ocr_service.process_image_message(
+        mock.Mock(), mock.Mock(), properties, b"image"
+    )
+
+    published = mock_rabbitmq_client.return_value.publish_message.call_args
+    assert published.args[1]["bounding_boxes"].texts == ["Hello", "World"]
+    assert len(cache.get(cache.key(b"image"))) == 3
+    with pytest.raises(ValueError):
+        PerformOCRService(connection_params="localhost", min_confidence=101)
+
+
+# Test that the pooled path caches results and skips the pool on a hit
+def test_submit_image_message_cache_hit(mock_rabbitmq_client):
+    cache = OCRCache(fingerprint="test")
+    ocr_service = PerformOCRService(
+        connection_params="localhost", workers=2, cache=cache
+    )
+
+    future = Future()
+    future.set_result(([], {}))
+    ocr_service._pool = mock.Mock()
+    ocr_service._pool.submit.return_value = future
+    connection = mock_rabbitmq_client.return_value.connection
+    connection.add_callback_threadsafe.side_effect = (
+        lambda callback: callback()
+    )
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "image_1"},
+    )
+
+    for _ in range(2):
+        mock_channel = mock.Mock()
+        ocr_service.submit_image_message(
+            mock_channel, mock.Mock(), properties, b"same image"
+        )
+        mock_channel.basic_ack.assert_called_once()
+
+    ocr_service._pool.submit.assert_called_once()
+    assert mock_rabbitmq_client.return_value.publish_message.call_count == 2
+
+
+# Test that streamed images are published band by band, and cached whole
+def test_process_image_message_streaming(mocker, mock_rabbitmq_client):
+    bands = [
+        [TextBoundingBox(text="Hello", left=10, right=100, top=20, bottom=30)],
+        [],
+        [
+            TextBoundingBox(
+                text="World", left=10, right=90, top=700, bottom=730
+            )
+        ],
+    ]
+    mock_detect_text_chunks = mocker.patch(
+        "PerformOCR.src.app.detect_text_chunks",
+        return_value=((3, boxes) for boxes in bands),
+    )
+    streaming = StreamingConfig()
+    cache = OCRCache(fingerprint="test")
+    ocr_service = PerformOCRService(
+        connection_params="localhost", cache=cache, streaming=streaming
+    )
+    mock_channel, mock_method = mock.Mock(), mock.Mock()
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "image_123"},
+    )
+
+    ocr_service.process_image_message(
+        mock_channel, mock_method, properties, b"image"
+    )
+
+    mock_detect_text_chunks.assert_called_once_with(b"image", streaming)
+    publish_message = mock_rabbitmq_client.return_value.publish_message
+    published = [call.args[1] for call in publish_message.call_args_list]
+    assert published == [
+        {
+            "img_id": "image_123",
+            "bounding_boxes": [box.__dict__ for box in boxes],
+            "chunk": chunk,
+            "chunk_count": 3,
+        }
+        for chunk, boxes in enumerate(bands)
+    ]
+    assert cache.get(cache.key(b"image")) == bands[0] + bands[2]
+    mock_channel.basic_ack.assert_called_once_with(
+        delivery_tag=mock_method.delivery_tag
+    )
+
+
+# Test that single images are kept for redaction before their boxes are
+# published, unless they are too large
+def test_process_image_message_image_store(mocker, mock_rabbitmq_client):
+    mocker.patch("PerformOCR.src.app.detect_text", return_value=[])
+    image_store = mock.Mock()
+    ocr_service = PerformOCRService(
+        connection_params="localhost",
+        image_store=image_store,
+        image_store_max_bytes=5,
+    )
+
+    for img_id, image_data in (("small", b"image"), ("large", b"images")):
+        properties = mock.Mock(
+            content_type=ocr_service.IMAGE_CONTENT_TYPE,
+            headers={"img_id": img_id},
+        )
+        ocr_service.process_image_message(
+            mock.Mock(), mock.Mock(), properties, image_data
+        )
+
+    image_store.store_bytes.assert_called_once_with("small", "image", b"image")
+    assert mock_rabbitmq_client.return_value.publish_message.call_count == 2
+
+
+# Test that the stages and the outcome of each message are recorded, and the
+# cache statistics exported
+def test_process_image_message_metrics(mocker, mock_rabbitmq_client):
+    mocker.patch("PerformOCR.src.app.detect_text", return_value=[])
+    metrics = Metrics()
+    ocr_service = PerformOCRService(
+        connection_params="localhost",
+        cache=OCRCache(fingerprint="test"),
+        metrics=metrics,
+    )
+    properties = mock.Mock(
+        content_type=ocr_service.IMAGE_CONTENT_TYPE,
+        headers={"img_id": "image_123"},
+    )
+
+    for _ in range(2):
+        ocr_service.process_image_message(
+            mock.Mock(), mock.Mock(), properties, b"image"
+        )
+    ocr_service.start()
+
+    assert (
+        metrics.histogram(ocr_service.STAGE_METRIC, stage="ocr")["count"] == 1
+    )
+    assert (
+        metrics.histogram(ocr_service.STAGE_METRIC, stage="cache")["count"]
+        == 2
+    )
+    assert metrics.counter(ocr_service.MESSAGES_METRIC, outcome="ok") == 2
+    assert "ocr_cache_hits 1" in metrics.render()
@@ -0,0 +1,193 @@
+import sys
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from PerformOCR.src import backends
+from PerformOCR.src.backends import (
+    OCRBackend,
+    PytesseractBackend,
+    TesserocrBackend,
+    engine_version,
+    get_backend,
+    parse_tsv,
+)
+
+TSV = (
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\t"
+    "left\ttop\twidth\theight\tconf\ttext\n"
+    "1\t1\t0\t0\t0\t0\t0\t0\t640\t480\t-1\t\n"
+    "5\t1\t1\t1\t1\t1\t10\t40\t100\t10\t96.5\tHello\n"
+    "5\t1\t1\t1\t2\t1\t30\t60\t300\t30\t88\tWorld\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_backends():
+    """Fixture to start every test without cached backends."""
+    backends._local.__dict__.pop("backends", None)
+    backends._engine_version.cache_clear()
+    yield
+    backends._local.__dict__.pop("backends", None)
+    backends._engine_version.cache_clear()
+
+
+@pytest.fixture
+def fake_tesserocr(mocker):
+    """
+    Fixture to install a fake tesserocr module with two words on two lines.
+    """
+    RIL = SimpleNamespace(BLOCK=0, PARA=1, TEXTLINE=2, WORD=3)
+
+    def make_word(text, box, starts):
+        word = mock.Mock()
+        word.IsAtBeginningOf.side_effect = lambda level: level in starts
+        word.BoundingBox.return_value = box
+        word.Confidence.return_value = 91.5
+        word.GetUTF8Text.return_value = text
+        return word
+
+    words = [
+        make_word("Hello", (10, 40, 110, 50), {0, 1, 2, 3}),
+        make_word("World", (30, 60, 330, 90), {2, 3}),
+    ]
+    module = SimpleNamespace(
+        RIL=RIL,
+        PyTessBaseAPI=mock.Mock(),
+        iterate_level=lambda iterator, level: iter(words),
+    )
+    mocker.patch.dict(sys.modules, {"tesserocr": module})
+    return module
+
+
+# Test that the pytesseract backend is the default and is reused
+def test_get_backend_default_is_cached(monkeypatch):
+    monkeypatch.delenv("OCR_BACKEND", raising=False)
+
+    backend = get_backend()
+
+    assert isinstance(backend, PytesseractBackend)
+    assert get_backend() is backend
+
+
+# Test that each thread gets its own backend instance
+def test_get_backend_is_per_thread():
+    backend = get_backend("pytesseract")
+    other = []
+
+    thread = threading.Thread(target=lambda: other.append(get_backend()))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not backend
+
+
+# Test that "auto" falls back to pytesseract when tesserocr is missing
+def test_get_backend_auto_fallback(mocker):
+    mocker.patch.dict(sys.modules, {"tesserocr": None})
+
+    assert isinstance(get_backend("auto"), PytesseractBackend)
+
+
+# Test that "auto" falls back to pytesseract when Tesseract fails to start
+def test_get_backend_auto_engine_error(fake_tesserocr):
+    fake_tesserocr.PyTessBaseAPI.side_effect = RuntimeError(
+        "Failed to init API, possibly an invalid tessdata path: ./"
+    )
+
+    assert isinstance(get_backend("auto"), PytesseractBackend)
+
+
+# Test that an explicit tesserocr backend does not hide engine errors
+def test_get_backend_tesserocr_engine_error(fake_tesserocr):
+    fake_tesserocr.PyTessBaseAPI.side_effect = RuntimeError("no tessdata")
+
+    with pytest.raises(RuntimeError):
+        get_backend("tesserocr")
+
+
+# Test that "auto" prefers tesserocr when it is installed
+def test_get_backend_auto_tesserocr(fake_tesserocr):
+    backend = get_backend("auto")
+
+    assert isinstance(backend, TesserocrBackend)
+    fake_tesserocr.PyTessBaseAPI.assert_called_once_with(lang="eng")
+
+
+# Test that a backend without `image_to_data` cannot be created
+def test_backend_is_abstract():
+    class IncompleteBackend(OCRBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+
+# Test that unknown backends are rejected
+def test_get_backend_unknown():
+    with pytest.raises(ValueError):
+        get_backend("unknown")
+
+
+# Test that tesserocr results are laid out like pytesseract's DICT output
+def test_tesserocr_image_to_data(fake_tesserocr):
+    backend = TesserocrBackend()
+    image = mock.Mock()
+
+    ocr_data = backend.image_to_data(image)
+
+    backend._api.SetImage.assert_called_once_with(image)
+    assert ocr_data["text"] == ["Hello", "World"]
+    assert ocr_data["left"] == [10, 30]
+    assert ocr_data["top"] == [40, 60]
+    assert ocr_data["width"] == [100, 300]
+    assert ocr_data["height"] == [10, 30]
+    assert ocr_data["block_num"] == [1, 1]
+    assert ocr_data["par_num"] == [1, 1]
+    assert ocr_data["line_num"] == [1, 2]
+    assert ocr_data["word_num"] == [1, 1]
+    assert ocr_data["conf"] == [91.5, 91.5]
+
+
+# Test that Tesseract's TSV output is parsed into typed columns
+def test_parse_tsv():
+    ocr_data = parse_tsv(TSV)
+
+    assert list(ocr_data) == list(backends.OCR_DATA_KEYS)
+    assert ocr_data["text"] == ["", "Hello", "World"]
+    assert ocr_data["left"].tolist() == [0, 10, 30]
+    assert ocr_data["line_num"].tolist() == [0, 1, 2]
+    assert ocr_data["conf"].tolist() == [-1.0, 96.5, 88.0]
+    assert parse_tsv("") == {}
+
+    # The last row may lose its empty text along with its tab
+    assert parse_tsv(TSV.split("\n")[0] + "\n" + TSV.split("\n")[1][:-1])[
+        "text"
+    ] == [""]
+
+
+# Test that the pytesseract backend parses the TSV output of Tesseract
+def test_pytesseract_image_to_data(mocker):
+    image_to_data = mocker.patch("pytesseract.image_to_data", return_value=TSV)
+    image = mock.Mock()
+
+    ocr_data = PytesseractBackend(lang="spa").image_to_data(image)
+
+    assert image_to_data.call_args[0] == (image,)
+    assert image_to_data.call_args[1]["lang"] == "spa"
+    assert ocr_data["text"] == ["", "Hello", "World"]
+
+
+# Test that the engine version names the engine, its Tesseract version and
+# language
+def test_engine_version(fake_tesserocr, mocker, monkeypatch):
+    fake_tesserocr.tesseract_version = lambda: "tesseract 5.3.0\n leptonica"
+    mocker.patch("pytesseract.get_tesseract_version", return_value="5.1.0")
+    monkeypatch.setenv("OCR_LANG", "spa")
+
+    assert engine_version("tesserocr") == "tesserocr tesseract 5.3.0 spa"
+    assert engine_version("pytesseract") == "pytesseract 5.1.0 spa"
+    with pytest.raises(ValueError):
+        engine_version("unknown")
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from commons.entities.bounding_box_batch import FIELDS
+from commons.entities.text_bounding_box import TextBoundingBox
+from PerformOCR.src.cache import OCRCache, ocr_fingerprint
+
+BOXES = [TextBoundingBox("Hello", 1, 2, 3, 4, 1, 1, 1, 1)]
+
+
+# Test that keys depend on the image bytes and on the OCR configuration
+def test_key():
+    cache = OCRCache(fingerprint="tesserocr 5 eng")
+
+    assert cache.key(b"image") == cache.key(b"image")
+    assert cache.key(b"image") != cache.key(b"other image")
+    assert cache.key(b"image") != OCRCache(fingerprint="tesserocr 5 spa").key(
+        b"image"
+    )
+
+
+# Test that the streaming settings are part of the OCR fingerprint, so that
+# streamed and whole-image results are cached apart
+def test_fingerprint_streaming(monkeypatch, mocker):
+    mocker.patch(
+        "PerformOCR.src.cache.engine_version", return_value="tesserocr 5 eng"
+    )
+    monkeypatch.delenv("OCR_STREAMING", raising=False)
+    monkeypatch.delenv("OCR_STREAM_BAND_HEIGHT", raising=False)
+    whole = ocr_fingerprint()
+
+    monkeypatch.setenv("OCR_STREAMING", "1")
+    streamed = ocr_fingerprint()
+    monkeypatch.setenv("OCR_STREAM_BAND_HEIGHT", "1234")
+
+    assert len({whole, streamed, ocr_fingerprint()}) == 3
+
+
+# Test the in-process LRU tier, its eviction and its counters
+def test_local_tier():
+    cache = OCRCache(max_entries=2, fingerprint="test")
+
+    assert cache.get("a") is None
+    cache.put("a", BOXES)
+    cache.put("b", [])
+    assert cache.get("a") == BOXES
+    cache.put("c", [])
+
+    # "b" was the least recently used entry
+    assert cache.get("b") is None
+    assert cache.get("a") == BOXES
+    assert cache.stats() == {
+        "local_hits": 2,
+        "shared_hits": 0,
+        "misses": 2,
+        "entries": 2,
+        "hits": 2,
+    }
+
+
+# Test that cached boxes are copies, unaffected by changes to the published
+# ones
+def test_entries_are_copies():
+    cache = OCRCache(fingerprint="test")
+    boxes = [TextBoundingBox("Hello", 1, 2, 3, 4)]
+
+    cache.put("a", boxes)
+    boxes[0].left = 100
+    cache.get("a")[0].top = 100
+
+    assert cache.get("a") == [TextBoundingBox("Hello", 1, 2, 3, 4)]
+
+
+# Test that the shared tier is written through, and its hits are copied into
+# the local tier
+def test_shared_tier():
+    storage = mock.Mock()
+    storage.retrieve.return_value = [BOXES[0].__dict__]
+    cache = OCRCache(storage=storage, fingerprint="test")
+
+    cache.put("a", BOXES)
+    storage.store.assert_called_once_with(
+        "a",
+        OCRCache.DATA_TYPE,
+        [{name: getattr(BOXES[0], name) for name in FIELDS}],
+    )
+
+    assert cache.get("b") == BOXES
+    assert cache.get("b") == BOXES
+    storage.retrieve.assert_called_once_with("b", OCRCache.DATA_TYPE)
+    assert cache.stats()["shared_hits"] == 1
+    assert cache.stats()["local_hits"] == 1
+
+
+# Test that errors of the shared tier are misses rather than failures
+def test_shared_tier_errors():
+    storage = mock.Mock()
+    storage.retrieve.side_effect = ConnectionError("down")
+    storage.store.side_effect = ConnectionError("down")
+    cache = OCRCache(max_entries=0, storage=storage, fingerprint="test")
+
+    cache.put("a", BOXES)
+
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
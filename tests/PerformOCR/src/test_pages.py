@@ -0,0 +1,89 @@
+import io
+
+import pytest
+from PIL import Image
+
+from PerformOCR.src.pages import (
+    count_pages,
+    detect_page,
+    document_pages,
+    iter_pages,
+)
+
+
+def _document(format, sizes):
+    """
+    Helper to save one page per size, each of its own gray level, as a single
+    document.
+    """
+    pages = [
+        Image.new("L", size, 10 * index) for index, size in enumerate(sizes)
+    ]
+    buffer = io.BytesIO()
+    pages[0].save(
+        buffer, format=format, save_all=True, append_images=pages[1:]
+    )
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def png():
+    """Fixture to encode a plain single-page image."""
+    buffer = io.BytesIO()
+    Image.new("L", (10, 10)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Test page counting of TIFF files, PDF files and plain images
+def test_count_pages(png):
+    tiff = _document("TIFF", [(10, 10), (20, 10), (30, 10)])
+    pdf = _document("PDF", [(72, 72), (144, 72)])
+
+    assert count_pages(tiff) == 3
+    assert count_pages(pdf) == 2
+    assert count_pages(png) == 1
+
+    assert document_pages(tiff) == 3
+    assert document_pages(_document("TIFF", [(10, 10)])) is None
+    assert document_pages(_document("PDF", [(72, 72)])) == 1
+    assert document_pages(png) is None
+
+
+# Test that pages are decoded one at a time and closed once the next one is
+# requested
+def test_iter_pages():
+    tiff = _document("TIFF", [(10, 10), (20, 10), (30, 10)])
+
+    pages = iter_pages(tiff)
+    first = next(pages)
+    assert first.size == (10, 10)
+    assert first.getpixel((0, 0)) == 0
+
+    second = next(pages)
+    assert second.size == (20, 10)
+    assert second.getpixel((0, 0)) == 10
+    with pytest.raises(ValueError):
+        first.load()
+
+    assert [page.size for page in pages] == [(30, 10)]
+
+
+# Test that PDF pages are rendered for OCR
+def test_iter_pages_pdf():
+    pdf = _document("PDF", [(72, 72), (144, 72)])
+
+    sizes = [page.size for page in iter_pages(pdf)]
+
+    assert sizes == [(300, 300), (600, 300)]
+
+
+# Test that detect_page runs OCR on the requested page only
+def test_detect_page(mocker):
+    mock_detect_text = mocker.patch("PerformOCR.src.pages.detect_text")
+    tiff = _document("TIFF", [(10, 10), (20, 10)])
+
+    result = detect_page(tiff, 1)
+
+    (page,) = mock_detect_text.call_args[0]
+    assert page.size == (20, 10)
+    assert result is mock_detect_text.return_value
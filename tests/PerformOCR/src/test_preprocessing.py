@@ -0,0 +1,131 @@
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from PerformOCR.src.preprocessing import (
+    PreprocessConfig,
+    Transform,
+    preprocess,
+)
+from PerformOCR.src.utils import detect_text
+
+
+def _with_orientation(image, orientation):
+    """Helper to set the EXIF orientation of an in-memory image."""
+    exif = image.getexif()
+    exif[0x0112] = orientation
+    image.info["exif"] = exif.tobytes()
+    return image
+
+
+# Test that a box found in the upright image maps back onto the original pixel,
+# for every orientation
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_orientation_maps_back(orientation):
+    image = Image.new("L", (40, 20), 0)
+    image.putpixel((7, 3), 255)
+    _with_orientation(image, orientation)
+
+    upright, transform = preprocess(image, PreprocessConfig())
+    left, top, right, bottom = upright.getbbox()
+
+    assert transform.orientation == orientation
+    assert transform.to_original(left, top, right, bottom) == (7, 3, 8, 4)
+
+
+# Test that the boxes of a rotated and downscaled image are mapped back
+# column by column, and clamped to the original image
+def test_columns_to_original():
+    transform = Transform((90, 60), orientation=6, scale=0.5)
+    boxes = [(0, 0, 10, 5), (3, 7, 11, 29), (-2, 40, 45, 61)]
+
+    columns = transform.columns_to_original(*zip(*boxes))
+
+    assert list(zip(*columns)) == [
+        (0, 40, 10, 60),
+        (14, 38, 58, 54),
+        (80, 0, 90, 60),
+    ]
+
+
+# Test that large images are downscaled and their boxes scaled back up
+def test_downscale_to_max_pixels():
+    image = Image.new("RGB", (400, 200), "white")
+
+    result, transform = preprocess(image, PreprocessConfig(max_pixels=20000))
+
+    assert result.size == (200, 100)
+    assert result.mode == "L"
+    assert transform.to_original(10, 20, 30, 40) == (20, 40, 60, 80)
+
+
+# Test that images scanned above the target DPI are downscaled to it
+def test_downscale_to_target_dpi():
+    image = Image.new("L", (600, 300))
+    image.info["dpi"] = (600, 600)
+
+    result, transform = preprocess(image, PreprocessConfig(target_dpi=300))
+
+    assert result.size == (300, 150)
+    assert transform.scale == 0.5
+
+
+# Test that transparent areas become white and binarization leaves only black
+# and white
+def test_grayscale_and_binarize():
+    image = Image.new("RGBA", (10, 10), (0, 0, 0, 0))
+    image.putpixel((0, 0), (100, 100, 100, 255))
+
+    result, _ = preprocess(image, PreprocessConfig(binarize_threshold=128))
+
+    assert result.mode == "L"
+    assert result.getpixel((0, 0)) == 0
+    assert result.getpixel((5, 5)) == 255
+    assert {value for _, value in result.getcolors()} == {0, 255}
+
+
+# Test that preprocessing is only enabled through the environment
+def test_from_env(monkeypatch):
+    monkeypatch.delenv("OCR_PREPROCESS", raising=False)
+    assert PreprocessConfig.from_env() is None
+
+    monkeypatch.setenv("OCR_PREPROCESS", "1")
+    monkeypatch.setenv("OCR_MAX_PIXELS", "1000000")
+    assert PreprocessConfig.from_env() == PreprocessConfig(max_pixels=1000000)
+
+
+# Test that detect_text runs OCR on the preprocessed image and reports original
+# coordinates
+def test_detect_text_with_preprocessing():
+    image = Image.new("RGB", (400, 200), "white")
+    backend = mock.Mock()
+    backend.image_to_data.return_value = {
+        "text": ["Hello"],
+        "left": [10],
+        "top": [20],
+        "width": [20],
+        "height": [20],
+        "block_num": [1],
+        "par_num": [1],
+        "line_num": [1],
+        "word_num": [1],
+    }
+
+    result = detect_text(
+        image,
+        backend=backend,
+        preprocess_config=PreprocessConfig(max_pixels=20000),
+    )
+
+    (ocr_image,) = backend.image_to_data.call_args[0]
+    assert ocr_image.size == (200, 100)
+    assert (result[0].left, result[0].top) == (20, 40)
+    assert (result[0].right, result[0].bottom) == (60, 80)
+
+
+# Test that boxes are clamped to the original image
+def test_transform_clamps():
+    transform = Transform(size=(100, 50), scale=0.5)
+
+    assert transform.to_original(-1, -1, 60, 30) == (0, 0, 100, 50)
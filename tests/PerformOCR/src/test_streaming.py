@@ -0,0 +1,113 @@
+from unittest import mock
+
+import pytest
+from PIL import Image, ImageDraw
+
+from commons.entities.text_bounding_box import TextBoundingBox
+from PerformOCR.src.streaming import (
+    StreamingConfig,
+    band_regions,
+    detect_bands,
+)
+from PerformOCR.src.utils import detect_text_chunks
+
+# Text lines of a fake page, as (top, bottom) rows, each with a border on the
+# left edge
+LINES = [(10, 40), (60, 90), (95, 130), (200, 230), (260, 290)]
+
+
+@pytest.fixture
+def page():
+    """
+    Fixture to draw every line of LINES as a dark bar on a white page with a
+    dark left border.
+    """
+    image = Image.new("L", (100, 300), 255)
+    draw = ImageDraw.Draw(image)
+    draw.line((0, 0, 0, 299), fill=0)
+    for top, bottom in LINES:
+        draw.rectangle((10, top, 90, bottom - 1), fill=0)
+    return image
+
+
+# Test that bands are cut in the middle of the gap closest to the band height,
+# never across a line
+def test_band_regions(page):
+    regions = band_regions(page, StreamingConfig(band_height=100))
+
+    # The 5-row gap at rows 90-95 is the closest to row 100
+    assert regions == [(0, 0, 100, 92), (0, 92, 100, 171), (0, 171, 100, 300)]
+    for top, bottom in LINES:
+        assert any(t <= top and bottom <= b for _, t, _, b in regions)
+
+
+# Test that boundaries without a wide enough gap move to the next one, and
+# short images are not split
+def test_band_regions_without_gaps(page):
+    config = StreamingConfig(band_height=100, min_gap=40)
+
+    assert band_regions(page, config) == [(0, 0, 100, 175), (0, 175, 100, 300)]
+    assert band_regions(page, StreamingConfig(band_height=160)) == [
+        (0, 0, 100, 300)
+    ]
+
+
+# Test that band boxes are offset into the image, blocks renumbered and blank
+# bands not recognized
+def test_detect_bands(page):
+    page.paste(255, (0, 165, 100, 245))
+    recognize = mock.Mock(
+        side_effect=lambda band: [
+            TextBoundingBox("word", 1, 2, 3, 4, 1, 1, 1, 1),
+            TextBoundingBox("word", 1, 2, 3, 4, 2, 1, 1, 1),
+        ]
+    )
+    regions = [(0, 0, 100, 50), (0, 50, 100, 165), (0, 165, 100, 245)]
+
+    bands = list(detect_bands(page, regions, recognize))
+
+    assert recognize.call_count == 2
+    assert [[box.top for box in boxes] for boxes in bands] == [
+        [3, 3],
+        [53, 53],
+        [],
+    ]
+    assert [box.block_num for box in bands[0] + bands[1]] == [1, 2, 3, 4]
+
+
+# Test that detect_text_chunks yields the band count with the boxes of each
+# band
+def test_detect_text_chunks(page):
+    backend = mock.Mock()
+    backend.image_to_data.return_value = {
+        "text": ["word"],
+        "left": [5],
+        "top": [5],
+        "width": [10],
+        "height": [10],
+        "block_num": [1],
+        "par_num": [1],
+        "line_num": [1],
+        "word_num": [1],
+    }
+
+    chunks = list(
+        detect_text_chunks(
+            page,
+            StreamingConfig(band_height=100),
+            backend,
+            preprocess_config=None,
+        )
+    )
+
+    assert [count for count, _ in chunks] == [3, 3, 3]
+    assert [boxes[0].top for _, boxes in chunks] == [5, 97, 176]
+
+
+# Test that streaming is only enabled from the environment on request
+def test_streaming_config_from_env(monkeypatch):
+    assert StreamingConfig.from_env() is None
+
+    monkeypatch.setenv("OCR_STREAMING", "1")
+    monkeypatch.setenv("OCR_STREAM_BAND_HEIGHT", "256")
+    assert StreamingConfig.from_env() == StreamingConfig(band_height=256)
@@ -0,0 +1,112 @@
+from unittest import mock
+
+import pytest
+from PIL import Image, ImageDraw
+
+from commons.entities.text_bounding_box import TextBoundingBox
+from PerformOCR.src.tiling import TilingConfig, detect_tiled, tile_regions
+from PerformOCR.src.utils import detect_text
+
+# Words of a fake page: gray level -> (left, top, right, bottom)
+WORDS = {
+    10: (5, 5, 60, 20),
+    20: (90, 5, 130, 20),  # crosses the vertical tile border
+    30: (20, 95, 70, 110),  # crosses the horizontal tile border
+    40: (140, 140, 190, 160),
+}
+
+
+@pytest.fixture
+def page():
+    """
+    Fixture to draw every word of WORDS as a rectangle of its own gray level on
+    a white page.
+    """
+    image = Image.new("L", (200, 200), 255)
+    draw = ImageDraw.Draw(image)
+    for level, (left, top, right, bottom) in WORDS.items():
+        draw.rectangle((left, top, right - 1, bottom - 1), fill=level)
+    return image
+
+
+def fake_recognize(tile):
+    """
+    Fake OCR that reports one word per gray level, cut to the part of it
+    visible in the tile.
+    """
+    boxes = []
+    for level in WORDS:
+        mask = tile.point(lambda p, level=level: 255 if p == level else 0)
+        bbox = mask.getbbox()
+        if bbox:
+            boxes.append(
+                TextBoundingBox(
+                    str(level), bbox[0], bbox[2], bbox[1], bbox[3], 1, 1, 1, 1
+                )
+            )
+    return boxes
+
+
+# Test that tiles cover the image, overlap and respect the tile size
+def test_tile_regions():
+    regions = tile_regions((250, 100), tile_size=100, overlap=20)
+
+    assert regions == [
+        (0, 0, 97, 100),
+        (77, 0, 173, 100),
+        (153, 0, 250, 100),
+    ]
+    assert tile_regions((50, 50), 100, 20) == [(0, 0, 50, 50)]
+
+
+# Test that tiled OCR finds every word once, whole, in image coordinates
+@pytest.mark.parametrize("parallel", [True, False])
+def test_detect_tiled(page, parallel):
+    config = TilingConfig(tile_size=120, overlap=60, workers=2)
+
+    boxes = detect_tiled(page, fake_recognize, config, parallel=parallel)
+
+    found = {
+        int(box.text): (box.left, box.top, box.right, box.bottom)
+        for box in boxes
+    }
+    assert len(boxes) == len(WORDS)
+    assert found == WORDS
+
+
+# Test that blocks of different tiles get different block numbers, and blank
+# tiles are skipped
+def test_detect_tiled_blocks_and_blank_tiles(page):
+    calls = []
+
+    def recognize(tile):
+        calls.append(tile.size)
+        return fake_recognize(tile)
+
+    page.paste(255, (0, 120, 200, 200))
+    boxes = detect_tiled(
+        page, recognize, TilingConfig(tile_size=80, overlap=40), False
+    )
+
+    assert len(calls) < len(tile_regions(page.size, 80, 40))
+    assert len({box.block_num for box in boxes}) == len(boxes)
+
+
+# Test that detect_text only tiles images above the size threshold, and runs
+# the given backend per tile
+def test_detect_text_tiles_large_images(page):
+    backend = mock.Mock()
+    backend.image_to_data.return_value = {
+        key: []
+        for key in ("text", "left", "top", "width", "height")
+        + ("block_num", "par_num", "line_num", "word_num")
+    }
+    config = TilingConfig(tile_size=120, overlap=60, min_pixels=10000)
+
+    detect_text(page, backend, preprocess_config=None, tiling_config=config)
+    assert backend.image_to_data.call_count == 9
+
+    backend.reset_mock()
+    small = page.resize((50, 50))
+    detect_text(small, backend, preprocess_config=None, tiling_config=config)
+    backend.image_to_data.assert_called_once_with(small)
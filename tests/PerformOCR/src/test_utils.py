@@ -9,6 +9,15 @@ from commons.entities.text_bounding_box import TextBoundingBox
 from PerformOCR.src.utils import detect_text
 
 
+def to_tsv(ocr_data):
+    """Formats OCR data like the TSV output of Tesseract."""
+    rows = zip(*ocr_data.values())
+    return "\n".join(
+        ["\t".join(ocr_data)]
+        + ["\t".join(str(value) for value in row) for row in rows]
+    )
+
+
 @pytest.mark.parametrize(
     "ocr_data, expected_result",
     [
@@ -20,13 +29,33 @@ from PerformOCR.src.utils import detect_text
                 "top": [40, 50, 60],
                 "width": [100, 200, 300],
                 "height": [10, 20, 30],
+                "block_num": [1, 1, 1],
+                "par_num": [1, 1, 1],
+                "line_num": [1, 1, 2],
+                "word_num": [1, 2, 1],
             },
             [
                 TextBoundingBox(
-                    text="Hello", left=10, right=110, top=40, bottom=50
+                    text="Hello",
+                    left=10,
+                    right=110,
+                    top=40,
+                    bottom=50,
+                    block_num=1,
+                    par_num=1,
+                    line_num=1,
+                    word_num=1,
                 ),
                 TextBoundingBox(
-                    text="World", left=30, right=330, top=60, bottom=90
+                    text="World",
+                    left=30,
+                    right=330,
+                    top=60,
+                    bottom=90,
+                    block_num=1,
+                    par_num=1,
+                    line_num=2,
+                    word_num=1,
                 ),
             ],
         ),
@@ -38,6 +67,10 @@ from PerformOCR.src.utils import detect_text
                 "top": [40, 50, 60],
                 "width": [100, 200, 300],
                 "height": [10, 20, 30],
+                "block_num": [1, 1, 1],
+                "par_num": [1, 1, 1],
+                "line_num": [1, 1, 1],
+                "word_num": [1, 2, 3],
             },
             [],  # Expected result is an empty list
         ),
@@ -53,7 +86,7 @@ def test_detect_text(mocker, ocr_data, expected_result):
 
     # Mock the pytesseract output
     mock_pytesseract = mocker.patch("pytesseract.image_to_data")
-    mock_pytesseract.return_value = ocr_data
+    mock_pytesseract.return_value = to_tsv(ocr_data)
 
     # Mock image bytes input
     mock_image_bytes = b"fake_image_data"
@@ -72,8 +105,34 @@ def test_detect_text(mocker, ocr_data, expected_result):
 
     # Assert that pytesseract.image_to_data was called with the mock image
     mock_pytesseract.assert_called_once_with(
-        mock_image, output_type=pytesseract.Output.DICT
+        mock_image, lang="eng", output_type=pytesseract.Output.STRING
     )
 
     # Assert that the image was closed after processing
     mock_image.close.assert_called_once()
+
+
+# Test detect_text with an opened image and an explicit backend
+def test_detect_text_with_image_and_backend():
+    image = Image.new("RGB", (10, 10))
+    backend = mock.Mock()
+    backend.image_to_data.return_value = {
+        "text": ["Hello"],
+        "left": [1],
+        "top": [2],
+        "width": [3],
+        "height": [4],
+        "block_num": [1],
+        "par_num": [1],
+        "line_num": [1],
+        "word_num": [1],
+    }
+
+    result = detect_text(image, backend=backend)
+
+    backend.image_to_data.assert_called_once_with(image)
+    assert [box.text for box in result] == ["Hello"]
+    assert (result[0].right, result[0].bottom) == (4, 6)
+
+    # The caller's image is left open
+    image.load()
@@ -0,0 +1,77 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from commons.clients.async_rabbit_mq import AsyncRabbitMQClient
+
+
+@pytest.fixture
+def mock_aio_pika(mocker):
+    """Fixture to mock aio-pika with an async connection and channel."""
+    aio_pika = mocker.patch("commons.clients.async_rabbit_mq.aio_pika")
+    channel = mock.AsyncMock()
+    channel.default_exchange = mock.AsyncMock()
+    connection = mock.AsyncMock()
+    connection.channel.return_value = channel
+    aio_pika.connect_robust = mock.AsyncMock(return_value=connection)
+    return aio_pika
+
+
+# Test that connect opens a channel and declares the queue
+def test_connect(mock_aio_pika):
+    client = AsyncRabbitMQClient("localhost", "test_queue")
+
+    asyncio.run(client.connect())
+
+    mock_aio_pika.connect_robust.assert_awaited_once_with(host="localhost")
+    client.channel.declare_queue.assert_awaited_once_with(
+        "test_queue", durable=True
+    )
+
+
+# Test that JSON messages are published without a content type
+def test_publish_message(mock_aio_pika):
+    client = AsyncRabbitMQClient("localhost", "test_queue")
+    asyncio.run(client.connect())
+
+    asyncio.run(client.publish_message("test_queue", {"msg": "test"}))
+
+    mock_aio_pika.Message.assert_called_once_with(body=b'{"msg": "test"}')
+    client.channel.default_exchange.publish.assert_awaited_once_with(
+        mock_aio_pika.Message.return_value, routing_key="test_queue"
+    )
+
+
+# Test that deliveries are handed to the callback with pika-style arguments
+def test_start_dispatches_deliveries(mock_aio_pika):
+    client = AsyncRabbitMQClient("localhost", "test_queue")
+    received = []
+
+    async def process_message(ch, method, properties, body):
+        received.append((method.delivery_tag, properties.content_type, body))
+        await ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    message = mock.AsyncMock(
+        delivery_tag=7, content_type=None, headers={}, body=b"{}"
+    )
+
+    async def run():
+        await client.connect()
+        queue = client.channel.declare_queue.return_value
+        consumer = asyncio.create_task(
+            client.start(process_message, prefetch_count=5)
+        )
+        while not queue.consume.await_count:
+            await asyncio.sleep(0)
+        on_message = queue.consume.call_args.args[0]
+        await on_message(message)
+        await asyncio.gather(*client._tasks)
+        consumer.cancel()
+
+    asyncio.run(run())
+
+    client.channel.set_qos.assert_awaited_once_with(prefetch_count=5)
+    client.channel.declare_queue.assert_awaited_once()
+    assert received == [(7, None, b"{}")]
+    message.ack.assert_awaited_once()
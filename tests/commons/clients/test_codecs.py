@@ -0,0 +1,111 @@
+import json
+from unittest import mock
+
+import pytest
+
+from commons.clients.codecs import (
+    Codec,
+    ColumnarCodec,
+    decode_message,
+    get_codec,
+    pack_value,
+    unpack_value,
+)
+from commons.entities.bounding_box_batch import BoundingBoxBatch
+
+BOUNDING_BOXES = [
+    {
+        "text": "operación",
+        "left": 188,
+        "right": 269,
+        "top": 836,
+        "bottom": 854,
+        "block_num": 1,
+    },
+    {
+        "text": "BBVA",
+        "left": 384,
+        "right": 431,
+        "top": 836,
+        "bottom": 850,
+        "block_num": None,
+    },
+]
+
+
+# Test that every codec round-trips a bounding box payload
+@pytest.mark.parametrize("name", ["json", "msgpack", "columnar"])
+def test_codec_round_trip(name):
+    codec = get_codec(name)
+    message = {"img_id": "image_123", "bounding_boxes": BOUNDING_BOXES}
+
+    assert codec.decode(codec.encode(message)) == message
+
+
+# Test that the columnar codec stores boxes as columns and is smaller than JSON
+def test_columnar_codec_is_compact():
+    boxes = BOUNDING_BOXES * 500
+    message = {"img_id": "image_123", "filtered_boxes": boxes}
+
+    encoded = ColumnarCodec().encode(message)
+
+    assert b'"left"' not in encoded
+    assert len(encoded) < len(json.dumps(message)) / 2
+    assert ColumnarCodec().decode(encoded) == message
+
+
+# Test that codecs can be looked up by name or content type
+def test_get_codec():
+    assert get_codec() is get_codec("json")
+    assert get_codec("application/msgpack") is get_codec("msgpack")
+    with pytest.raises(ValueError):
+        get_codec("xml")
+
+
+# Test that a codec without `decode` cannot be created
+def test_codec_is_abstract():
+    class EncodeOnlyCodec(Codec):
+        name = "encode-only"
+
+        def encode(self, message):
+            return b""
+
+    with pytest.raises(TypeError):
+        EncodeOnlyCodec()
+
+
+# Test that messages are decoded by content type, defaulting to JSON
+def test_decode_message():
+    codec = get_codec("msgpack")
+    message = {"img_id": "image_123", "pii_terms": ["Jose"]}
+
+    properties = mock.Mock(content_type=codec.content_type)
+    assert decode_message(properties, codec.encode(message)) == message
+
+    assert decode_message(None, json.dumps(message)) == message
+    assert decode_message(mock.Mock(), json.dumps(message)) == message
+
+
+# Test that stored values are tagged with their codec, except JSON
+@pytest.mark.parametrize("name", ["json", "msgpack", "columnar"])
+def test_pack_value_round_trip(name):
+    packed = pack_value(get_codec(name), BOUNDING_BOXES)
+
+    if name == "json":
+        assert packed == json.dumps(BOUNDING_BOXES)
+    assert unpack_value(packed) == BOUNDING_BOXES
+    assert unpack_value(pack_value(get_codec(name), ["Jose"])) == ["Jose"]
+
+
+# Test that bounding box batches are encoded like the list of dicts they hold
+@pytest.mark.parametrize("name", ["json", "msgpack", "columnar"])
+def test_codec_encodes_batches(name):
+    codec = get_codec(name)
+    batch = BoundingBoxBatch.from_boxes(BOUNDING_BOXES)
+    message = {"img_id": "image_123", "bounding_boxes": batch}
+
+    assert codec.decode(codec.encode(message)) == {
+        "img_id": "image_123",
+        "bounding_boxes": batch.to_dicts(),
+    }
+    assert codec.decode(codec.encode(batch)) == batch.to_dicts()
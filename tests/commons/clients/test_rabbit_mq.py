@@ -97,3 +97,62 @@ def test_start_consuming(mocker):
 
     # Assert that start_consuming was called
     mock_channel.start_consuming.assert_called_once()
+
+
+# Test that start limits unacknowledged deliveries when a prefetch count is
+# given
+def test_start_consuming_with_prefetch(mocker):
+    mock_pika = mocker.patch("pika.BlockingConnection")
+    mock_channel = mock.Mock()
+    mock_pika.return_value.channel.return_value = mock_channel
+
+    client = RabbitMQClient(
+        connection_parameters="localhost", queue_id="test_queue"
+    )
+
+    client.start(process_message=mock.Mock(), prefetch_count=8)
+
+    mock_channel.basic_qos.assert_called_once_with(prefetch_count=8)
+    mock_channel.start_consuming.assert_called_once()
+
+
+# Test that publish_bytes sends the raw body with its headers
+def test_publish_bytes(mocker):
+    mock_pika = mocker.patch("pika.BlockingConnection")
+    mock_channel = mock.Mock()
+    mock_pika.return_value.channel.return_value = mock_channel
+
+    client = RabbitMQClient(
+        connection_parameters="localhost", queue_id="test_queue"
+    )
+
+    client.publish_bytes(
+        queue_id="test_queue", body=b"\x00\x01", headers={"img_id": "1"}
+    )
+
+    _, kwargs = mock_channel.basic_publish.call_args
+    assert kwargs["routing_key"] == "test_queue"
+    assert kwargs["body"] == b"\x00\x01"
+    assert kwargs["properties"].content_type == "application/octet-stream"
+    assert kwargs["properties"].headers == {"img_id": "1"}
+
+
+# Test that messages serialized by a non-JSON codec carry its content type
+def test_publish_message_with_codec(mocker):
+    mock_pika = mocker.patch("pika.BlockingConnection")
+    mock_channel = mock.Mock()
+    mock_pika.return_value.channel.return_value = mock_channel
+
+    client = RabbitMQClient(
+        connection_parameters="localhost",
+        queue_id="test_queue",
+        codec="msgpack",
+    )
+
+    client.publish_message(
+        queue_id="test_queue", message={"msg": "test_message"}
+    )
+
+    _, kwargs = mock_channel.basic_publish.call_args
+    assert kwargs["properties"].content_type == "application/msgpack"
+    assert client.codec.decode(kwargs["body"]) == {"msg": "test_message"}
@@ -1,9 +1,10 @@
 import json
 from unittest import mock
 
+import fakeredis
 import pytest
 
-from commons.clients.redis_storage import RedisStorage
+from commons.clients.redis_storage import RedisStorage, job_keys
 
 
 # Test the `store` method
@@ -21,7 +22,7 @@ def test_store_method(mocker):
 
     # Assert that Redis `set` was called with the correct arguments
     mock_redis().set.assert_called_once_with(
-        "img_id:bounding_boxes", json.dumps({"box": "data"})
+        "img_id:bounding_boxes", json.dumps({"box": "data"}), ex=86400
     )
 
 
@@ -74,7 +75,172 @@ def test_delete_method(mocker):
     # Call the `delete` method
     storage.delete(key="img_id")
 
-    # Assert that Redis `delete` was called twice with the correct arguments
-    mock_redis().delete.assert_any_call("img_id:bounding_boxes")
-    mock_redis().delete.assert_any_call("img_id:pii_terms")
-    assert mock_redis().delete.call_count == 2
+    # Assert that Redis `delete` was called once with every key of the job
+    mock_redis().delete.assert_called_once_with(
+        "img_id:pii_terms",
+        "img_id:bounding_boxes:parts",
+        "img_id:bounding_boxes:done",
+        "img_id:bounding_boxes:count",
+        "img_id:filtered_boxes:collected",
+    )
+
+
+# Test that deleting a job leaves none of the keys of its join and of its
+# collected chunks behind
+def test_delete_job_keys():
+    storage = RedisStorage(client=fakeredis.FakeRedis())
+    storage.join_part("img_id", "bounding_boxes", 0, [], 3, "pii_terms")
+    storage.join_shared("img_id", "pii_terms", ["Jose"], "bounding_boxes")
+    storage.join_part("img_id", "bounding_boxes", 1, [], 3, "pii_terms")
+    storage.collect_part("img_id", "filtered_boxes", 0, [], 3)
+    assert storage.client.keys()
+
+    storage.delete("img_id")
+
+    assert storage.client.keys() == []
+
+
+# Test that data stored with a non-JSON codec is read back with it
+def test_store_and_retrieve_with_codec(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+
+    storage = RedisStorage(host="localhost", port=6379, db=0, codec="msgpack")
+    storage.store(key="img_id", data_type="pii_terms", data=["Jose"])
+
+    stored = mock_redis().set.call_args.args[1]
+    mock_redis().get.return_value = stored
+
+    assert stored.startswith(b"\x00application/msgpack\x00")
+    assert storage.retrieve(key="img_id", data_type="pii_terms") == ["Jose"]
+
+
+# Test that join_part stores a page until the PII terms arrive
+def test_join_part(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+    script = mock_redis().register_script.return_value
+    script.return_value = None
+
+    storage = RedisStorage(host="localhost", port=6379, db=0, ttl=60)
+    result = storage.join_part(
+        "img_id", "bounding_boxes", 2, [{"text": "Jose"}], 3, "pii_terms"
+    )
+
+    script.assert_called_once_with(
+        keys=[
+            "img_id:pii_terms",
+            "img_id:bounding_boxes:parts",
+            "img_id:bounding_boxes:done",
+            "img_id:bounding_boxes:count",
+        ],
+        args=[2, json.dumps([{"text": "Jose"}]), 3, 60],
+    )
+    assert result is None
+
+
+# Test that join_shared returns the pending pages by index, with the page count
+def test_join_shared(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+    script = mock_redis().register_script.return_value
+    script.return_value = [
+        3,
+        [b"2", json.dumps([{"text": "Jose"}]).encode(), b"0", b"[]"],
+    ]
+
+    storage = RedisStorage(host="localhost", port=6379, db=0, ttl=None)
+    parts, count = storage.join_shared(
+        "img_id", "pii_terms", ["Jose"], "bounding_boxes"
+    )
+
+    assert script.call_args.kwargs["args"] == [json.dumps(["Jose"]), ""]
+    assert parts == {2: [{"text": "Jose"}], 0: []}
+    assert count == 3
+
+
+# Test that store_many pipelines every value into one round trip
+def test_store_many(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+    pipe = mock_redis().pipeline.return_value.__enter__.return_value
+
+    storage = RedisStorage(host="localhost", port=6379, db=0, ttl=60)
+    storage.store_many(
+        [("a", "pii_terms", ["Jose"]), ("b", "pii_terms", ["Neil"])]
+    )
+
+    mock_redis().pipeline.assert_called_once_with(transaction=False)
+    pipe.set.assert_any_call("a:pii_terms", json.dumps(["Jose"]), ex=60)
+    pipe.set.assert_any_call("b:pii_terms", json.dumps(["Neil"]), ex=60)
+    pipe.execute.assert_called_once()
+
+
+# Test that retrieve_many reads every value with a single MGET
+def test_retrieve_many(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+    mock_redis().mget.return_value = [json.dumps(["Jose"]), None]
+
+    storage = RedisStorage(host="localhost", port=6379, db=0)
+    result = storage.retrieve_many([("a", "pii_terms"), ("b", "pii_terms")])
+
+    mock_redis().mget.assert_called_once_with(["a:pii_terms", "b:pii_terms"])
+    assert result == [["Jose"], None]
+
+
+# Test that delete_many removes every key with a single DEL
+def test_delete_many(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+
+    storage = RedisStorage(host="localhost", port=6379, db=0)
+    storage.delete_many(["a", "b"])
+
+    mock_redis().delete.assert_called_once_with(*job_keys("a"), *job_keys("b"))
+
+
+# Test that the latency of each operation is counted
+def test_latency_stats(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+    mock_redis().get.return_value = None
+
+    storage = RedisStorage(host="localhost", port=6379, db=0)
+    storage.store("a", "pii_terms", ["Jose"])
+    storage.store("b", "pii_terms", ["Jose"])
+    storage.retrieve("a", "pii_terms")
+
+    stats = storage.latency_stats()
+    assert stats["store"]["count"] == 2
+    assert stats["retrieve"]["count"] == 1
+    assert stats["store"]["total_seconds"] >= stats["store"]["max_seconds"]
+
+
+# Test that collect_part returns every part once the last one is collected
+def test_collect_part(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+    script = mock_redis().register_script.return_value
+    script.side_effect = [
+        None,
+        [b"1", json.dumps([{"text": "b"}]).encode(), b"0", b"[]"],
+    ]
+
+    storage = RedisStorage(host="localhost", port=6379, db=0, ttl=60)
+
+    assert storage.collect_part("img_id", "filtered_boxes", 1, [], 2) is None
+    parts = storage.collect_part(
+        "img_id", "filtered_boxes", 0, [{"text": "b"}], 2
+    )
+
+    script.assert_called_with(
+        keys=["img_id:filtered_boxes:collected"],
+        args=[0, json.dumps([{"text": "b"}]), 2, 60],
+    )
+    assert parts == {0: [], 1: [{"text": "b"}]}
+
+
+# Test that raw bytes bypass the codec, and can be taken out in one round trip
+def test_store_and_retrieve_bytes(mocker):
+    mock_redis = mocker.patch("redis.Redis")
+    mock_redis().getdel.return_value = b"\x89PNG"
+
+    storage = RedisStorage(host="localhost", port=6379, db=0, ttl=60)
+    storage.store_bytes("img_id", "image", b"\x89PNG")
+
+    mock_redis().set.assert_called_once_with("img_id:image", b"\x89PNG", ex=60)
+    assert storage.retrieve_bytes("img_id", "image", delete=True) == b"\x89PNG"
+    mock_redis().getdel.assert_called_once_with("img_id:image")
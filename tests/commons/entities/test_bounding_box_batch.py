@@ -0,0 +1,122 @@
+import pickle
+from array import array
+from dataclasses import replace
+
+import pytest
+
+from commons.entities.bounding_box_batch import (
+    FIELDS,
+    BoundingBoxBatch,
+    select,
+)
+from commons.entities.text_bounding_box import TextBoundingBox
+
+OCR_DATA = {
+    "text": ["Hello", " ", "World"],
+    "left": [10, 20, 30],
+    "top": [40, 50, 60],
+    "width": [100, 200, 300],
+    "height": [10, 20, 30],
+    "block_num": [1, 1, 1],
+    "par_num": [1, 1, 1],
+    "line_num": [1, 1, 2],
+    "word_num": [1, 2, 1],
+}
+
+BOXES = [
+    TextBoundingBox("Hello", 10, 110, 40, 50, 1, 1, 1, 1),
+    TextBoundingBox("World", 30, 330, 60, 90, 1, 1, 2, 1),
+]
+
+
+# Test that a batch is built from the OCR columns, skipping blank words
+def test_from_ocr_data():
+    batch = BoundingBoxBatch.from_ocr_data(OCR_DATA)
+
+    assert len(batch) == 2
+    assert batch == BOXES
+    assert batch[1].right == 330
+    assert batch[-1]["text"] == "World"
+    with pytest.raises(IndexError):
+        batch[2]
+
+
+# Test that the word confidences are kept, and serialized with the boxes
+def test_confidences():
+    batch = BoundingBoxBatch.from_ocr_data(
+        {**OCR_DATA, "conf": array("d", [96.5, -1, 88])}
+    )
+
+    assert [box.conf for box in batch] == [96.5, 88.0]
+    assert batch == BOXES
+    assert batch.to_dicts()[0]["conf"] == 96.5
+    assert batch.to_columns()["columns"]["conf"]["type"] == "d"
+    assert batch.compress([False, True])[0]["conf"] == 88.0
+    assert BoundingBoxBatch.from_boxes(batch.to_dicts()) == batch
+
+    # Metadata missing from some of the boxes is dropped
+    assert "conf" not in (batch + BOXES).fields
+    assert BoundingBoxBatch.from_boxes(BOXES)[0].conf is None
+
+    # Boxes built one by one keep their confidence, and compare by it
+    box = TextBoundingBox("Hello", 10, 110, 40, 50, 1, 1, 1, 1, conf=96.5)
+    assert BoundingBoxBatch.from_boxes([box]).to_dicts()[0]["conf"] == 96.5
+    assert batch[0] == box
+    assert batch[1] != replace(BOXES[1], conf=50.0)
+
+
+# Test that rows read and write through to the columns, and map missing layout
+# indices to None
+def test_rows():
+    batch = BoundingBoxBatch.from_boxes(
+        [{"text": "BBVA", "left": 1, "right": 2, "top": 3, "bottom": 4}]
+    )
+    row = batch[0]
+
+    assert row.block_num is None
+    assert row.get("line_num") is None
+    assert row.get("line_num", 0) == 0
+    row.left, row.block_num = 5, 7
+
+    assert batch.columns["left"][0] == 5
+    assert row.to_dict() == {
+        "text": "BBVA",
+        "left": 5,
+        "right": 2,
+        "top": 3,
+        "bottom": 4,
+        "block_num": 7,
+        "par_num": None,
+        "line_num": None,
+        "word_num": None,
+    }
+    with pytest.raises(KeyError):
+        row["confidence"]
+
+
+# Test that masks and translations return new batches
+def test_compress_and_translate():
+    batch = BoundingBoxBatch.from_boxes(BOXES)
+
+    assert batch.compress(bytearray(b"\x00\x01")) == BOXES[1:]
+    assert select(BOXES, [True, False]) == BOXES[:1]
+
+    moved = batch.translate(100, 200, block_offset=3)
+    assert [box.left for box in moved] == [110, 130]
+    assert [box.bottom for box in moved] == [250, 290]
+    assert [box.block_num for box in moved] == [4, 4]
+    assert batch == BOXES
+
+
+# Test that a batch joins others and serializes to dicts and columns
+def test_serialization():
+    batch = BoundingBoxBatch.concat(
+        [BoundingBoxBatch.from_boxes(BOXES[:1]), BOXES[1:]]
+    )
+
+    assert batch.to_dicts() == [
+        {name: getattr(box, name) for name in FIELDS} for box in BOXES
+    ]
+    assert batch.to_columns()["size"] == 2
+    assert set(batch.to_columns()["columns"]) == set(FIELDS)
+    assert pickle.loads(pickle.dumps(batch)) == batch
@@ -0,0 +1,104 @@
+import urllib.request
+
+import pytest
+
+from commons.metrics import Metrics, start_metrics_server
+
+
+# Test that counters add up per label set
+def test_counters():
+    metrics = Metrics()
+
+    metrics.inc("messages_total", outcome="ok")
+    metrics.inc("messages_total", 2, outcome="ok")
+    metrics.inc("messages_total", outcome="error")
+
+    assert metrics.counter("messages_total", outcome="ok") == 3
+    assert metrics.counter("messages_total", outcome="error") == 1
+    assert metrics.counter("messages_total") == 0
+
+
+# Test that durations land in the first bucket that bounds them, including
+# blocks that raise
+def test_histograms():
+    metrics = Metrics(buckets=(0.1, 1.0))
+
+    metrics.observe("stage_seconds", 0.05, stage="ocr")
+    metrics.observe("stage_seconds", 0.1, stage="ocr")
+    metrics.observe("stage_seconds", 5.0, stage="ocr")
+    with pytest.raises(ValueError):
+        with metrics.time("stage_seconds", stage="decode"):
+            raise ValueError("bad image")
+
+    histogram = metrics.histogram("stage_seconds", stage="ocr")
+    assert histogram["buckets"] == [2, 0, 1]
+    assert histogram["count"] == 3
+    assert histogram["sum"] == pytest.approx(5.15)
+    assert metrics.histogram("stage_seconds", stage="decode")["count"] == 1
+    assert metrics.histogram("stage_seconds", stage="publish") is None
+
+
+# Test that histograms popped from one registry add up in another
+def test_merge_histograms():
+    worker = Metrics(buckets=(0.1, 1.0))
+    worker.observe("stage_seconds", 0.05, stage="ocr")
+    worker.observe("stage_seconds", 5.0, stage="ocr")
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe("stage_seconds", 0.5, stage="ocr")
+
+    metrics.merge_histograms(worker.pop_histograms())
+
+    assert worker.histogram("stage_seconds", stage="ocr") is None
+    histogram = metrics.histogram("stage_seconds", stage="ocr")
+    assert histogram["buckets"] == [1, 1, 1]
+    assert histogram["sum"] == pytest.approx(5.55)
+    with pytest.raises(ValueError):
+        Metrics(buckets=(1.0,)).merge_histograms(
+            {("stage_seconds", ()): ([1, 0, 0], 0.05, 1)}
+        )
+
+
+# Test the text format, with cumulative buckets and the gauges of collectors
+def test_render():
+    metrics = Metrics(buckets=(0.1,))
+    metrics.inc("messages_total", outcome="ok")
+    metrics.observe("stage_seconds", 0.05, stage="ocr")
+    metrics.register_collector("cache", lambda: {"hits": 3, "name": "lru"})
+    metrics.register_collector(
+        "redis",
+        lambda: {"join": {"count": 2}, "retrieve": {"count": 1}},
+        label="operation",
+    )
+    metrics.register_collector("broken", lambda: 1 / 0)
+
+    assert metrics.render().splitlines() == [
+        "# TYPE messages_total counter",
+        'messages_total{outcome="ok"} 1',
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="ocr",le="0.1"} 1',
+        'stage_seconds_bucket{stage="ocr",le="+Inf"} 1',
+        'stage_seconds_sum{stage="ocr"} 0.05',
+        'stage_seconds_count{stage="ocr"} 1',
+        "# TYPE cache_hits gauge",
+        "cache_hits 3",
+        "# TYPE redis_count gauge",
+        'redis_count{operation="join"} 2',
+        'redis_count{operation="retrieve"} 1',
+    ]
+
+
+# Test that the metrics are served over HTTP on /metrics only
+def test_start_metrics_server():
+    metrics = Metrics()
+    metrics.inc("messages_total")
+    server = start_metrics_server(0, metrics, host="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert b"messages_total 1" in response.read()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
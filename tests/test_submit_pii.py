@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import submit_pii
+
+
+@pytest.fixture
+def mock_rabbitmq(mocker):
+    """Fixture to mock the RabbitMQClient used by submit_pii."""
+    return mocker.patch("submit_pii.RabbitMQClient")
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Fixture to create a directory with two images and a text file."""
+    (tmp_path / "a.png").write_bytes(b"image_a")
+    (tmp_path / "b.jpg").write_bytes(b"image_bb")
+    (tmp_path / "notes.txt").write_text("not an image")
+    return tmp_path
+
+
+# Test that every image of a directory becomes a job
+def test_iter_jobs_directory(images):
+    jobs = list(submit_pii.iter_jobs(str(images), ["Jose"]))
+
+    assert [job["image_path"] for job in jobs] == [
+        str(images / "a.png"),
+        str(images / "b.jpg"),
+    ]
+    assert all(job["pii_terms"] == ["Jose"] for job in jobs)
+    assert len({job["img_id"] for job in jobs}) == 2
+
+
+# Test that manifest entries keep their own img_id and PII terms
+def test_iter_jobs_manifest(images):
+    manifest = images / "manifest.jsonl"
+    manifest.write_text(
+        json.dumps({"image_path": "a.png", "img_id": "1", "pii_terms": []})
+        + "\n\n"
+        + json.dumps({"image_path": "b.jpg", "detectors": ["email"]})
+        + "\n"
+        + json.dumps({"image_path": "b.jpg"})
+        + "\n"
+    )
+
+    jobs = list(submit_pii.iter_jobs(str(manifest), ["Jose"]))
+
+    assert jobs[0] == {
+        "img_id": "1",
+        "image_path": str(images / "a.png"),
+        "pii_terms": [],
+    }
+    assert jobs[1]["detectors"] == ["email"]
+    assert submit_pii.pii_message(jobs[1])["detectors"] == ["email"]
+    assert jobs[2]["pii_terms"] == ["Jose"]
+
+
+# Test that bulk submission reuses one client and commits per batch
+def test_submit_bulk(images, mock_rabbitmq):
+    jobs = list(submit_pii.iter_jobs(str(images), ["Jose"])) * 3
+
+    report = submit_pii.submit_bulk(jobs, batch_size=4)
+
+    client = mock_rabbitmq.return_value
+    mock_rabbitmq.assert_called_once()
+    client.channel.tx_select.assert_called_once()
+    assert client.channel.tx_commit.call_count == 2
+    assert client.publish_message.call_count == 6
+    assert client.publish_bytes.call_count == 6
+    assert report["images"] == 6
+    assert report["bytes"] == 3 * (len(b"image_a") + len(b"image_bb"))
+
+
+# Test that jobs with a registered term list refer to it instead of sending the
+# terms
+def test_term_list(images, mock_rabbitmq):
+    submit_pii.register_term_list("staff", ["Jose"])
+    jobs = list(submit_pii.iter_jobs(str(images), ["Jose"], "staff"))
+
+    mock_rabbitmq.return_value.publish_message.assert_called_once_with(
+        submit_pii.PII_QUEUE, {"term_list_id": "staff", "pii_terms": ["Jose"]}
+    )
+    assert submit_pii.pii_message(jobs[0]) == {
+        "img_id": jobs[0]["img_id"],
+        "term_list_id": "staff",
+    }